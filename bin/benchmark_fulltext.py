@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+
+"""benchmark_fulltext CLI command"""
+
+import os
+import click
+from libfulltext_testing.benchmark import run_benchmark, run_startup_benchmark
+
+# Settings for click
+CLICK_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+def parse_int_list(ctx, param, value):  # pylint: disable=unused-argument
+    """Parse a comma-separated list of positive integers for click"""
+    try:
+        values = [int(item) for item in value.split(',')]
+    except ValueError:
+        raise click.BadParameter('expected comma-separated integers')
+    if min(values) < 1:
+        raise click.BadParameter('values must be at least 1')
+    return values
+
+
+@click.command(context_settings=CLICK_SETTINGS)
+@click.option("-n", "--batch-sizes", default="10,100", callback=parse_int_list,
+              help="Comma-separated numbers of DOIs per batch (default: 10,100).")
+@click.option("-j", "--jobs", default="1,4,16", callback=parse_int_list,
+              help="Comma-separated numbers of concurrent downloads (default: 1,4,16).")
+@click.option("--latency", default=0.0, type=click.FloatRange(min=0),
+              help="Seconds the mock server waits before each response (default: 0).")
+@click.option("--payload-size", default=1024 * 1024, type=click.IntRange(min=4),
+              help="Size of each full text in bytes (default: 1048576).")
+@click.option("--error-rate", default=0.0, type=click.FloatRange(min=0, max=1),
+              help="Fraction of full text requests failing (default: 0).")
+@click.option("--lookups/--no-lookups", default=True,
+              help="Include the registration agency and CrossRef lookups "
+              "or route DOIs by their prefix.")
+@click.option("--startup", default=None, metavar="RUNS", type=click.IntRange(min=1),
+              help="Instead, measure the startup time of get_fulltext invocations "
+              "over the given number of runs each.")
+def benchmark_fulltext(batch_sizes, jobs, latency,  # pylint: disable=R0913
+                       payload_size, error_rate, lookups, startup):
+    """
+    Benchmark the full text retrieval against a local mock server
+    for all combinations of batch sizes and numbers of concurrent downloads,
+    or the startup time of the get_fulltext command.
+    """
+    # These comments are not part of the docstring such that click does not
+    # pick them up in the help message
+    #
+    # Args:
+    #     batch_sizes:  numbers of DOIs per batch (list of ints)
+    #     jobs:         numbers of concurrent downloads (list of ints)
+    #     latency:      response latency of the mock server in seconds
+    #     payload_size: size of each full text in bytes
+    #     error_rate:   fraction of failing full text requests
+    #     lookups:      include registration agency and CrossRef lookups (bool)
+    #     startup:      number of runs of the startup benchmark (or None)
+    if startup is not None:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "get_fulltext.py")
+        row = "{0:<36} {1:>5} {2:>9} {3:>9}"
+        print(row.format("invocation", "runs", "p50 [s]", "p99 [s]"))
+        for result in run_startup_benchmark(script, startup):
+            print(row.format(result.case, result.runs, "{0:.4f}".format(result.p50),
+                             "{0:.4f}".format(result.p99)))
+        return
+
+    print("Peak memory: Python allocations traced with tracemalloc in a separate "
+          "untimed pass;\nthe mock server runs in a separate process.\n")
+    row = "{0:>7} {1:>5} {2:>7} {3:>10} {4:>9} {5:>9} {6:>12}"
+    print(row.format("dois", "jobs", "failed", "dois/s", "p50 [s]", "p99 [s]",
+                     "peak mem [B]"))
+    for n_dois in batch_sizes:
+        for workers in jobs:
+            result = run_benchmark(n_dois, workers, latency=latency,
+                                   payload_size=payload_size,
+                                   error_rate=error_rate, lookups=lookups)
+            print(row.format(result.dois, result.workers, result.failed,
+                             "{0:.1f}".format(result.dois_per_second),
+                             "{0:.4f}".format(result.p50),
+                             "{0:.4f}".format(result.p99),
+                             result.peak_memory))
+
+
+if __name__ == '__main__':
+    # Click automatically inserts the arguments here, so pylint should be quiet.
+    benchmark_fulltext()  # pylint: disable=bad-option-value,no-value-for-parameter
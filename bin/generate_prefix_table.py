@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+
+"""generate_prefix_table CLI command"""
+
+import click
+from libfulltext_testing.prefix_table import (PREFIX_MODULE_PATH, PREFIX_TABLE_PATH,
+                                              read_prefix_table, render_prefix_module)
+
+# Settings for click
+CLICK_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@click.command(context_settings=CLICK_SETTINGS)
+@click.option("--table", default=PREFIX_TABLE_PATH, type=click.Path(exists=True),
+              help="Tab-separated prefix table "
+              "(default: doi2test/DOI-info_publisher_CRmemberID_prefixes.txt).")
+@click.option("--output", default=PREFIX_MODULE_PATH, type=click.Path(),
+              help="Generated module "
+              "(default: libfulltext/doi/crossref/prefix_table.py).")
+def generate_prefix_table(table, output):
+    """
+    Generate the DOI prefixes of the CrossRef members used for prefix
+    routing from the prefix table.
+    """
+    # These comments are not part of the docstring such that click does not
+    # pick them up in the help message
+    #
+    # Args:
+    #     table:  path of the prefix table
+    #     output: path of the generated module
+    with open(output, 'w', encoding='utf-8') as module:
+        module.write(render_prefix_module(read_prefix_table(table)))
+
+
+if __name__ == '__main__':
+    # Click automatically inserts the arguments here, so pylint should be quiet.
+    generate_prefix_table()  # pylint: disable=bad-option-value,no-value-for-parameter
@@ -1,20 +1,41 @@
 #!/usr/bin/env python3
 # copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
 
-"""get_fulltext CLI command"""
+"""get_fulltext CLI command
 
+Only light modules are imported at start, the retrieval machinery (and
+requests) is imported once needed, which e.g. --connect never does.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import collections
+import contextlib
+import json
 import select
+import signal
+import sys
 import click
-import libfulltext
 import libfulltext.config
+import libfulltext.daemon
 
 # Settings for click
 CLICK_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+# Messages printed for the statuses of documents which did not fail
+# (libfulltext.STATUS_*, whose modules --connect does not import)
+STATUS_MESSAGES = {
+    "complete": "Downloaded",
+    "skipped": "Skipped",
+    "deferred": "Deferred",
+}
+
 
 @click.command(context_settings=CLICK_SETTINGS)
 @click.option("-c", "--config", default=libfulltext.config.DEFAULT_CONFIG_PATH,
-              type=click.File(), help="Path to the configuration file to use.")
+              type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+              help="Path to the configuration file to use ('-': stdin). Its parsed "
+              "content is cached until the file changes.")
 @click.argument("prefixed_ids", nargs=-1, default=None)
 @click.option("-f", "--prefixed-id-file", default="-", type=click.File(),
               help="File with list of prefixed document identifiers, one per line. "
@@ -23,11 +44,73 @@ CLICK_SETTINGS = dict(help_option_names=['-h', '--help'])
               type=click.Path(exists=False, file_okay=False, resolve_path=True),
               help="Directory where downloaded full texts are stored. "
               "Overwrites the config value.")
-def get_fulltext(config, prefixed_ids, prefixed_id_file, directory):
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1),
+              help="Number of full texts to download concurrently (default: 1).")
+@click.option("--metadata-cache/--no-metadata-cache", default=None,
+              help="Enable or disable the persistent cache for registration "
+              "agencies and publisher metadata. Overwrites the config value.")
+@click.option("--refresh-metadata", is_flag=True,
+              help="Ignore cached metadata and fetch it again.")
+@click.option("--skip-existing", "--resume", "skip_existing", is_flag=True,
+              help="Skip documents which the download manifest lists as complete, "
+              "e.g. to resume an interrupted run.")
+@click.option("-s", "--status-log", default=None, type=click.File("w"),
+              help="File to which the status of every document is written "
+              "as soon as it is finished, one JSON object per line.")
+@click.option("--metrics-log", default=None, type=click.File("w"),
+              help="File to which latency, bytes, HTTP status and outcome of every "
+              "retrieval stage are written, one JSON object per line.")
+@click.option("--prometheus", default=None,
+              type=click.Path(dir_okay=False, writable=True),
+              help="File to which metrics are written in the Prometheus text format "
+              "at the end of the run.")
+@click.option("-q", "--queue", default=None,
+              type=click.Path(dir_okay=False, resolve_path=True),
+              help="Shared work queue (SQLite file, e.g. on a network file system). "
+              "Given prefixed IDs are added to it, then the documents of the queue "
+              "are downloaded. Several processes or machines can work on one queue "
+              "without downloading any document twice.")
+@click.option("--lease", default=None, type=click.IntRange(min=1),
+              help="Seconds after which documents claimed from the queue by a "
+              "crashed process are downloaded by others (default: 600), running "
+              "processes renew their claims.")
+@click.option("--extract-text/--no-extract-text", default=None,
+              help="Enable or disable extracting the text of downloaded PDFs into "
+              "fulltext.txt on a pool of processes. Overwrites the config value.")
+@click.option("--circuit-breaker/--no-circuit-breaker", default=None,
+              help="Enable or disable deferring the documents of publishers after "
+              "repeated failures, until the publisher is probed successfully. "
+              "Overwrites the config value.")
+@click.option("--serve", default=None, metavar="SOCKET",
+              type=click.Path(dir_okay=False, resolve_path=True),
+              help="Run as daemon retrieving batches of prefixed IDs sent to the "
+              "given Unix domain socket (e.g. with --connect) until interrupted, "
+              "such that batches do not pay the startup of a process.")
+@click.option("--connect", default=None, metavar="SOCKET",
+              type=click.Path(dir_okay=False, resolve_path=True),
+              help="Let the daemon serving the given socket (see --serve) retrieve "
+              "the documents instead of retrieving them in this process.")
+@click.option("-n", "--dry-run", is_flag=True,
+              help="Only find out which documents are available: resolve their "
+              "publishers and probe the fulltexts with HEAD requests, without "
+              "downloading anything. Prints a table of the availability.")
+@click.option("--list-handlers", is_flag=True,
+              help="List the handlers for identifier prefixes and publishers "
+              "(CrossRef members) with their capabilities and exit.")
+def get_fulltext(config, prefixed_ids,  # pylint: disable=R0912,R0913,R0914,R0915
+                 prefixed_id_file, directory, jobs, metadata_cache, refresh_metadata,
+                 skip_existing, status_log, metrics_log, prometheus, queue, lease,
+                 extract_text, circuit_breaker, serve, connect, dry_run,
+                 list_handlers):
     """
     Obtain the fulltext pdfs for a number of documents,
     which are identified by so-called prefixed document identifiers.
 
+    Identifiers are read and processed as a stream, duplicates
+    (e.g. DOIs differing in case) are dropped among the last 100000
+    distinct identifiers; with --skip-existing, duplicates further
+    apart are skipped as well.
+
     Examples for prefixed document identifiers:
         doi:10.1016/j.cortex.2015.10.021
     """
@@ -35,16 +118,72 @@ def get_fulltext(config, prefixed_ids, prefixed_id_file, directory):
     # pick them up in the help message
     #
     # Args:
-    #     config:            path to configuration file (string)
+    #     config:            path to configuration file (string, "-": stdin)
     #     prefixed_ids:      list of prefixed document identifiers (list of strings)
     #     prefixed_id_file:  plain text file with prefixed document identifiers (stream)
+    #     directory:         directory overwriting the configured fulltext storage
+    #     jobs:              number of concurrent downloads
+    #     metadata_cache:    enable the persistent metadata cache (None: config value)
+    #     refresh_metadata:  ignore cached metadata (bool)
+    #     skip_existing:     skip complete documents according to the manifest (bool)
+    #     status_log:        stream for the JSON lines status log (or None)
+    #     metrics_log:       stream for the JSON lines metrics log (or None)
+    #     prometheus:        path of the Prometheus metrics file (or None)
+    #     queue:             path of the shared work queue (or None)
+    #     lease:             seconds for which queued documents are claimed
+    #                        (None: DEFAULT_LEASE_SECONDS)
+    #     extract_text:      enable the text extraction (None: config value)
+    #     circuit_breaker:   enable the circuit breakers (None: config value)
+    #     serve:             socket on which to serve as daemon (or None)
+    #     connect:           socket of the daemon retrieving the documents (or None)
+    #     dry_run:           only resolve the documents and print their availability
+    #     list_handlers:     only list the available handlers (bool)
     # Raises:
-    #     SystemExit: incompatible inputs (identifiers from multiple inputs)
+    #     SystemExit: incompatible inputs (identifiers from multiple inputs,
+    #                 or options not working together) or some downloads failed
 
     # Setup the config dictionary:
-    cfg = libfulltext.config.parse(config)
+    # A configuration from stdin is parsed as a stream, bypassing the cache
+    cfg = libfulltext.config.parse(sys.stdin if config == "-" else config)
     if directory is not None:
         cfg["storage"]["fulltext"] = directory
+    if metadata_cache is not None:
+        cfg.setdefault("cache", dict())["enabled"] = metadata_cache
+    if refresh_metadata:
+        cfg.setdefault("cache", dict())["refresh"] = True
+    if extract_text is not None:
+        cfg.setdefault("extraction", dict())["enabled"] = extract_text
+    if circuit_breaker is not None:
+        cfg.setdefault("circuit_breaker", dict())["enabled"] = circuit_breaker
+
+    if list_handlers:
+        from libfulltext.registry import describe_handlers
+        for handler in describe_handlers(cfg):
+            print("{0} {1}: {2} ({3}) - {4}".format(
+                handler["kind"], handler["key"], handler["name"],
+                ", ".join(handler["capabilities"]), handler["description"]))
+        return
+
+    if serve is not None:
+        if prefixed_ids or queue is not None or connect is not None or dry_run:
+            raise SystemExit("A daemon takes no prefixed IDs and does not work on a "
+                             "queue, as client or as dry run.")
+        # Clean up (e.g. remove the socket) when terminated
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        counters, metrics = create_metrics(metrics_log)
+        try:
+            libfulltext.daemon.serve(serve, cfg, workers=jobs,
+                                     skip_existing=skip_existing, metrics=metrics)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(counters.summary(), file=sys.stderr)
+            if prometheus is not None:
+                counters.write_prometheus(prometheus)
+        return
+    if connect is not None and (queue is not None or dry_run):
+        raise SystemExit("A client of a daemon does not work on a queue "
+                         "or as dry run.")
 
     if prefixed_ids:
         # If we have IDs on the command line, we do not want
@@ -64,15 +203,187 @@ def get_fulltext(config, prefixed_ids, prefixed_id_file, directory):
         # If the prefixed_id_file is a TTY, then the script waits for
         # interactive user input on STDIN. This typically indicates a forgotten
         # flag or commandline option and hence we bail out with an error.
-        raise SystemExit("Please provide prefixed IDs on STDIN, a file "
-                         "via --prefixed-id-file or alternatively directly "
-                         "on the commandline.")
+        # With a queue, the process just works on the queued documents.
+        if queue is None:
+            raise SystemExit("Please provide prefixed IDs on STDIN, a file "
+                             "via --prefixed-id-file or alternatively directly "
+                             "on the commandline.")
+        prefixed_id_file.close()
+        prefixed_ids = []
     else:
-        prefixed_ids = [line.strip() for line in prefixed_id_file.readlines()]
+        # Read lazily, such that downloads start before the whole file is read
+        prefixed_ids = prefixed_id_file
+
+    if connect is not None:
+        try:
+            statuses = report_results(libfulltext.daemon.submit(connect, prefixed_ids),
+                                      status_log)
+        except OSError as error:
+            raise SystemExit("No daemon serves {0}: {1}"
+                             .format(connect, error)) from error
+        report_deferred(statuses, "")
+        if statuses["failed"]:
+            raise SystemExit("{0} of {1} downloads failed."
+                             .format(statuses["failed"], sum(statuses.values())))
+        return
+
+    counters, metrics = create_metrics(metrics_log)
+
+    identifiers = libfulltext.unique_identifiers(prefixed_ids)
+    if dry_run:
+        if queue is not None:
+            raise SystemExit("A dry run does not work on a queue.")
+        print_availability(libfulltext.resolve_fulltexts(identifiers, cfg, workers=jobs))
+        return
+
+    from libfulltext import breaker, extract, workqueue
+
+    work_queue = None
+    if queue is not None:
+        work_queue = workqueue.WorkQueue(
+            queue, lease_seconds=lease or workqueue.DEFAULT_LEASE_SECONDS)
+        work_queue.add(identifiers)
+        # Claim documents one by one as get_fulltexts queues them: reading ahead
+        # to prefetch their metadata would hold leases for documents waiting here
+        cfg.setdefault("routing", dict())["prefetch"] = 0
+        identifiers = work_queue.claimed(batch_size=1)
+
+    extraction = extract.open_extraction_pool(cfg)
+    breakers = breaker.open_circuit_breakers(cfg)
+
+    def retrieved():
+        """Retrieve the documents, recording their outcome in the queue"""
+        for result in libfulltext.get_fulltexts(identifiers, cfg, workers=jobs,
+                                                skip_existing=skip_existing,
+                                                metrics=metrics, extraction=extraction,
+                                                breakers=breakers):
+            if work_queue is not None:
+                if result.status == libfulltext.STATUS_DEFERRED:
+                    recorded = work_queue.defer(result.prefixed_identifier,
+                                                breakers.cooldown)
+                else:
+                    recorded = work_queue.finish(
+                        result.prefixed_identifier,
+                        libfulltext.STATUS_FAILED if result.error
+                        else libfulltext.STATUS_COMPLETE,
+                        None if result.error is None else str(result.error))
+                if not recorded:
+                    print("Lease lost", result.prefixed_identifier + ": expired and "
+                          "claimed by another process, which records its outcome.",
+                          file=sys.stderr)
+            yield libfulltext.daemon.batch_result(result)
+
+    with contextlib.ExitStack() as stack:
+        if work_queue is not None:
+            # Keep the leases of documents taking longer than --lease
+            stack.enter_context(work_queue.renewing())
+        statuses = report_results(retrieved(), status_log)
+
+    print(counters.summary(), file=sys.stderr)
+    if extraction is not None:
+        extraction.close()
+        for filename, error in extraction.failed.items():
+            print("Extraction failed", filename + ":", error, file=sys.stderr)
+        print("Extraction: {0} extracted, {1} failed".format(
+            extraction.extracted, len(extraction.failed)), file=sys.stderr)
+    if breakers is not None:
+        for publisher, state in sorted(breakers.states().items()):
+            if state != breaker.CIRCUIT_CLOSED:
+                print("Circuit breaker", publisher + ":", state, file=sys.stderr)
+    report_deferred(statuses, "" if work_queue is not None else " with --skip-existing")
+    if work_queue is not None:
+        print("Queue:", work_queue.counts(), file=sys.stderr)
+        work_queue.close()
+    if prometheus is not None:
+        counters.write_prometheus(prometheus)
+
+    if statuses["failed"]:
+        raise SystemExit("{0} of {1} downloads failed."
+                         .format(statuses["failed"], sum(statuses.values())))
 
-    for prfid in prefixed_ids:
-        print("Downloading", prfid)
-        libfulltext.get_fulltext(prfid, cfg)
+
+def create_metrics(metrics_log):
+    """Create the metrics collector of a run
+
+    Args:
+        metrics_log: stream for the JSON lines metrics log (or None)
+
+    Returns:
+        libfulltext.metrics.Counters and the libfulltext.metrics.Metrics
+        passing the events to them (and to the metrics log)
+    """
+    from libfulltext.metrics import Counters, JsonLinesSink, Metrics
+    counters = Counters()
+    sinks = [counters]
+    if metrics_log is not None:
+        sinks.append(JsonLinesSink(metrics_log))
+    return counters, Metrics(sinks)
+
+
+def report_results(results, status_log):
+    """Print the outcome of every document and write it to the status log
+
+    Args:
+        results:    iterable of libfulltext.daemon.BatchResult
+        status_log: stream for the JSON lines status log (or None)
+
+    Returns:
+        collections.Counter of the statuses
+    """
+    statuses = collections.Counter()
+    for result in results:
+        statuses[result.status] += 1
+        if status_log is not None:
+            status_log.write(json.dumps({
+                "id": result.prefixed_identifier,
+                "status": result.status,
+                "error": result.error,
+                "failure": result.failure,
+                "reason": result.reason,
+            }) + "\n")
+            status_log.flush()
+        if result.error is None:
+            print(STATUS_MESSAGES[result.status], result.prefixed_identifier)
+        else:
+            print("Failed", result.prefixed_identifier + ":", result.error,
+                  file=sys.stderr)
+    return statuses
+
+
+def report_deferred(statuses, how):
+    """Print how to retrieve the deferred documents, if any
+
+    Args:
+        statuses: collections.Counter of the statuses (see report_results)
+        how:      how to run again, appended to "run again"
+    """
+    if statuses["deferred"]:
+        print("{0} documents deferred, run again{1} to retrieve them.".format(
+            statuses["deferred"], how), file=sys.stderr)
+
+
+def print_availability(results):
+    """Print the availability of resolved documents as a table
+
+    Args:
+        results: iterable of libfulltext.Availability
+    """
+    row = "{0:<40} {1:<12} {2:<10} {3:>6} {4:<10} {5:>4} {6:>10} {7}"
+    print(row.format("ID", "AVAILABILITY", "AGENCY", "MEMBER", "HANDLER", "HTTP",
+                     "SIZE", "ERROR"))
+    availabilities = collections.Counter()
+    for result in results:
+        availabilities[result.availability] += 1
+        print(row.format(
+            result.prefixed_identifier, result.availability,
+            *[result.route.get(field) or "-"
+              for field in ("registration_agency", "member", "handler")],
+            result.http_status or "-", result.size or "-",
+            "" if result.error is None else result.error))
+    print("Availability:", ", ".join("{0} {1}".format(count, availability)
+                                     for availability, count
+                                     in sorted(availabilities.items())),
+          file=sys.stderr)
 
 
 if __name__ == '__main__':
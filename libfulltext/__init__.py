@@ -1,5 +1,49 @@
 # copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
-"""libfulltext module"""
+"""libfulltext module
 
-from .fulltext import get_fulltext
-__all__ = ["get_fulltext"]
+The exported names are imported from their modules when first accessed
+(with Python 3.7 and later), such that importing a light module like
+libfulltext.config does not import requests and the retrieval machinery.
+"""
+
+import importlib
+import sys
+
+# Exported names by the module defining them
+_EXPORTS = {
+    "get_fulltext": "fulltext",
+    "get_fulltext_async": "fulltext",
+    "get_fulltexts": "fulltext",
+    "FulltextResult": "fulltext",
+    "STATUS_DEFERRED": "fulltext",
+    "STATUS_SKIPPED": "fulltext",
+    "unique_identifiers": "fulltext",
+    "STATUS_COMPLETE": "manifest",
+    "STATUS_FAILED": "manifest",
+    "resolve_fulltext": "resolve",
+    "resolve_fulltexts": "resolve",
+    "Availability": "resolve",
+}
+
+__all__ = ["get_fulltext", "get_fulltext_async", "get_fulltexts", "FulltextResult",
+           "STATUS_COMPLETE", "STATUS_FAILED", "STATUS_SKIPPED", "STATUS_DEFERRED",
+           "unique_identifiers", "resolve_fulltext", "resolve_fulltexts", "Availability"]
+
+
+def _export(name):
+    """Import an exported name from its module"""
+    return getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _EXPORTS:
+            raise AttributeError("module {0!r} has no attribute {1!r}"
+                                 .format(__name__, name))
+        return _export(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:
+    # Module attributes cannot be looked up lazily
+    globals().update((name, _export(name)) for name in _EXPORTS)
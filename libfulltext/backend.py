@@ -0,0 +1,270 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Storage backend module
+
+Saved files are written through a storage backend, selected by
+storage.backend in the configuration (see doc/config.md). The local backend
+writes them below the fulltext storage directory, the S3 backend streams
+them into S3-compatible object storage with multipart uploads, such that
+at most one part of a file is held in memory and nothing is staged on
+local disk. Both use the same <prefix>/<identifier>/<path> layout.
+
+The S3 backend requires boto3, which is only imported when it is used.
+"""
+
+import os
+
+from .response import AtomicFileWriter, HashingWriter
+
+# Defaults for the "s3" subsection of the "storage" configuration
+# (see doc/config.md)
+DEFAULT_S3_CONFIG = {
+    # Bucket receiving the files (required)
+    "bucket": None,
+    # Prefix of the keys of all files
+    "prefix": "",
+    # URL of an S3-compatible service (None: AWS)
+    "endpoint_url": None,
+    # Region of the bucket (None: from the AWS configuration)
+    "region": None,
+    # Credentials (None: from the environment or the AWS configuration)
+    "access_key_id": None,
+    "secret_access_key": None,
+    # Bytes uploaded per part, at least 5 MiB for AWS
+    "part_size": 8 * 1024 * 1024,
+}
+
+
+class LocalBackend:
+    """Backend writing files below a local directory"""
+
+    # Files are local, e.g. for the content-addressed store and the extraction
+    local = True
+
+    def __init__(self, root):
+        """Create backend
+
+        Args:
+            root: directory to which the paths of the files are relative
+        """
+        self.root = root
+
+    def path(self, path):
+        """Local filename of a file"""
+        return os.path.join(self.root, path)
+
+    def writer(self, path, resume=False, validator=None):
+        """Start writing a file (see AtomicFileWriter)
+
+        Args:
+            path:      path of the file relative to root
+            resume:    continue the partial file kept by an earlier writer
+            validator: see HashingWriter
+
+        Returns:
+            AtomicFileWriter
+        """
+        filename = self.path(path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        return AtomicFileWriter(filename, resume, validator)
+
+    def size(self, path):
+        """Size of a file in bytes or None if it does not exist"""
+        try:
+            return os.path.getsize(self.path(path))
+        except OSError:
+            return None
+
+
+class S3Backend:
+    """Backend streaming files into an S3 bucket"""
+
+    # Files are not local
+    local = False
+
+    def __init__(self, client, bucket, prefix="",
+                 part_size=DEFAULT_S3_CONFIG["part_size"]):
+        """Create backend
+
+        Args:
+            client:    boto3 S3 client
+            bucket:    name of the bucket
+            prefix:    prefix of the keys, to which the paths of the files are
+                       appended
+            part_size: bytes uploaded per part of a multipart upload
+        """
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+
+    def key(self, path):
+        """Key of a file"""
+        return self.prefix + path
+
+    def writer(self, path, resume=False, validator=None):
+        """Start uploading a file (see MultipartUploadWriter)
+
+        Args:
+            path:      path of the file relative to the prefix
+            resume:    not supported, must be False
+            validator: see HashingWriter
+
+        Raises:
+            ValueError: resuming was requested
+        Returns:
+            MultipartUploadWriter
+        """
+        if resume:
+            raise ValueError('Uploads to S3 cannot be resumed.')
+        return MultipartUploadWriter(self.client, self.bucket, self.key(path),
+                                     self.part_size, validator)
+
+    def size(self, path):
+        """Size of a file in bytes or None if it does not exist"""
+        try:
+            return self.client.head_object(Bucket=self.bucket,
+                                           Key=self.key(path))['ContentLength']
+        except self.client.exceptions.ClientError:
+            return None
+
+
+class MultipartUploadWriter(HashingWriter):
+    """Writer uploading a file in parts, completed once all data is written
+
+    Data is buffered until a part is full, hence at most one part is held
+    in memory. Files smaller than a part are uploaded with a single request.
+    The object only appears once committed, if the writer is closed without
+    commit the upload is aborted.
+    """
+
+    def __init__(self, client, bucket, key, part_size, validator=None):
+        """Start uploading a file
+
+        Args:
+            client:    boto3 S3 client
+            bucket:    name of the bucket
+            key:       key of the file
+            part_size: bytes uploaded per part
+            validator: see HashingWriter
+        """
+        super().__init__(validator)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._closed:
+            self.abort()
+
+    def write(self, chunk):
+        """Write a chunk of data, uploading the parts which are full
+
+        Args:
+            chunk: bytes to be written
+
+        Raises:
+            ValueError: the validator rejected the data
+        """
+        self._update(chunk)
+        self._buffer += chunk
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    def commit(self):
+        """Upload the rest of the file and complete the upload
+
+        Raises:
+            ValueError: the validator rejected the file
+        Returns:
+            dict with size, sha1 and sha256 of the written file,
+            updated by the result of the validator
+        """
+        saved = self._saved()
+        if self._upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key,
+                                   Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts})
+        self._buffer = bytearray()
+        self._closed = True
+        return saved
+
+    def keep(self):
+        """Stop writing, uploads cannot be resumed and are aborted"""
+        self.abort()
+
+    def abort(self):
+        """Discard the written data"""
+        self._closed = True
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                               UploadId=self._upload_id)
+
+    def _upload_part(self, part):
+        """Upload the next part, starting the multipart upload if needed"""
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key)['UploadId']
+        number = len(self._parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key,
+                                           UploadId=self._upload_id,
+                                           PartNumber=number, Body=part)
+        self._parts.append({'PartNumber': number, 'ETag': response['ETag']})
+
+
+def open_storage_backend(config):
+    """Create the storage backend configured in the "storage" section
+
+    Args:
+        config: configuration dictionary (see config.py), storage.backend
+                is "local" (default) or "s3" with the settings in storage.s3
+                (see DEFAULT_S3_CONFIG)
+
+    Raises:
+        ValueError: unknown backend or no bucket configured
+    Returns:
+        LocalBackend or S3Backend
+    """
+    storage = config["storage"]
+    backend = storage.get("backend", "local")
+    if backend == "local":
+        return LocalBackend(os.path.abspath(storage["fulltext"]))
+    if backend != "s3":
+        raise ValueError('Storage backend {0} unknown.'.format(backend))
+
+    settings = dict(DEFAULT_S3_CONFIG, **storage.get("s3", {}))
+    if not settings["bucket"]:
+        raise ValueError('No bucket configured for the S3 storage backend.')
+
+    import boto3  # pylint: disable=import-outside-toplevel
+    import botocore.config  # pylint: disable=import-outside-toplevel
+
+    # Checksums only where required, as not all S3-compatible services support
+    # the ones botocore 1.36 added by default (older versions do not know these
+    # options, and only compute checksums where required anyway)
+    options = {}
+    if 'request_checksum_calculation' in botocore.config.Config.OPTION_DEFAULTS:
+        options = {'request_checksum_calculation': 'when_required',
+                   'response_checksum_validation': 'when_required'}
+    client = boto3.client(
+        's3', endpoint_url=settings["endpoint_url"], region_name=settings["region"],
+        aws_access_key_id=settings["access_key_id"],
+        aws_secret_access_key=settings["secret_access_key"],
+        config=botocore.config.Config(**options))
+    return S3Backend(client, settings["bucket"], settings["prefix"],
+                     settings["part_size"])
@@ -0,0 +1,256 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Circuit breaker module
+
+Failures are classified as permanent (the document cannot be retrieved,
+e.g. 404, no access or no handler), transient (the publisher is having
+trouble, e.g. 5xx or timeouts) or quota (the publisher refuses further
+requests, e.g. 429 or an Elsevier quota warning).
+
+With the "circuit_breaker" configuration, get_fulltexts keeps a circuit
+breaker per publisher: after repeated transient failures or a single quota
+failure, the breaker opens and identifiers of the publisher are deferred
+instead of retrieved, sparing the metadata and publisher requests which
+would fail anyway. Once the cooldown passed, a single retrieval probes the
+publisher again and closes the breaker if the publisher answers.
+"""
+
+import threading
+import time
+
+import requests
+
+from .registry import get_prefix_handler, load
+from .response import QuotaExceededError
+
+# Defaults for the "circuit_breaker" section of the configuration
+# (see doc/config.md)
+DEFAULT_CIRCUIT_BREAKER_CONFIG = {
+    # false retrieves every identifier regardless of earlier failures
+    "enabled": False,
+    # Number of consecutive transient failures of a publisher opening its breaker
+    "threshold": 5,
+    # Seconds before a publisher with an open breaker is probed again
+    "cooldown": 300,
+}
+
+# Classes of failures
+# the document cannot be retrieved, retrying does not help
+FAILURE_PERMANENT = 'permanent'
+# the publisher failed to answer, retrying later may help
+FAILURE_TRANSIENT = 'transient'
+# the publisher refuses further requests for now
+FAILURE_QUOTA = 'quota'
+
+# States of a circuit breaker
+# identifiers are retrieved
+CIRCUIT_CLOSED = 'closed'
+# identifiers are deferred until the cooldown passed
+CIRCUIT_OPEN = 'open'
+# a single retrieval probes whether the publisher recovered
+CIRCUIT_HALF_OPEN = 'half-open'
+
+# Status code with which servers signal that the quota is exhausted
+TOO_MANY_REQUESTS = 429
+
+# Exceptions of failed requests which may succeed later
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout)
+
+# Classes of failures by the raised exceptions, the first matching entry
+# applies (other HTTP errors are classified by their status code)
+FAILURE_CLASSES = (
+    (QuotaExceededError, FAILURE_QUOTA),
+    (TRANSIENT_ERRORS, FAILURE_TRANSIENT),
+    # e.g. unexpected content (no access), rejected PDFs, unknown DOIs
+    # and missing handlers
+    ((ValueError, NotImplementedError), FAILURE_PERMANENT),
+)
+
+
+def classify_failure(error):
+    """Classify the exception raised by a failed retrieval
+
+    Args:
+        error: the raised exception
+
+    Returns:
+        FAILURE_PERMANENT, FAILURE_TRANSIENT or FAILURE_QUOTA
+    """
+    for exceptions, failure in FAILURE_CLASSES:
+        if isinstance(error, exceptions):
+            return failure
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return _classify_status(error.response.status_code)
+    return FAILURE_TRANSIENT
+
+
+def _classify_status(status_code):
+    """Classify the HTTP status code of a failed request (see classify_failure)"""
+    if status_code == TOO_MANY_REQUESTS:
+        return FAILURE_QUOTA
+    return FAILURE_TRANSIENT if status_code >= 500 else FAILURE_PERMANENT
+
+
+def publisher_of(prefixed_identifier, config, cache):
+    """Name of the handler of the publisher of an identifier, if known
+
+    Nothing is requested, the publisher is looked up with the resolver of
+    the prefix handler (see resolve.py) in the known metadata. Without
+    metadata (before the first lookup of the identifier or when the cached
+    one is refreshed), the prefix rules of the "routing" configuration are
+    applied even if routing by prefix is disabled, such that the breakers
+    also apply to identifiers which are looked up.
+
+    Args:
+        prefixed_identifier: article identifier with prefix
+        config:              configuration dictionary
+        cache:               MetadataCache with the metadata of the identifier
+
+    Returns:
+        handler name (e.g. "elsevier") or None if not known
+    """
+    prefix, _, identifier = prefixed_identifier.partition(':')
+    try:
+        resolver = load(get_prefix_handler(prefix, config), 'resolver')
+    except ValueError:
+        return None
+    if resolver is None:
+        return None
+    handler = resolver(identifier, config, cache).get('handler')
+    if handler is None and not config.get("routing", {}).get("prefixes", True):
+        prefix_config = dict(config, routing=dict(config["routing"], prefixes=True))
+        handler = resolver(identifier, prefix_config, None).get('handler')
+    return handler
+
+
+class CircuitBreaker:
+    """Circuit breaker of a single publisher (not thread-safe)"""
+
+    def __init__(self, threshold=DEFAULT_CIRCUIT_BREAKER_CONFIG["threshold"],
+                 cooldown=DEFAULT_CIRCUIT_BREAKER_CONFIG["cooldown"]):
+        """Create a closed circuit breaker
+
+        Args:
+            threshold: number of consecutive transient failures opening it
+            cooldown:  seconds before the publisher is probed again
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CIRCUIT_CLOSED
+        # Number of consecutive transient failures
+        self.failures = 0
+        self._opened = None
+
+    def allow(self):
+        """Check whether an identifier of the publisher may be retrieved
+
+        Once the cooldown of an open breaker passed, a single retrieval is
+        allowed as probe, further ones wait for its outcome.
+
+        Returns:
+            True if the retrieval may be started
+        """
+        if self.state == CIRCUIT_OPEN and \
+                time.monotonic() - self._opened >= self.cooldown:
+            self.state = CIRCUIT_HALF_OPEN
+            return True
+        return self.state == CIRCUIT_CLOSED
+
+    def record(self, failure):
+        """Record the outcome of a retrieval
+
+        Permanent failures show that the publisher answers, they count as
+        success.
+
+        Args:
+            failure: None (success) or one of the FAILURE_* classes
+        """
+        if failure is None or failure == FAILURE_PERMANENT:
+            self.state = CIRCUIT_CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if failure == FAILURE_QUOTA or self.failures >= self.threshold \
+                or self.state == CIRCUIT_HALF_OPEN:
+            self.state = CIRCUIT_OPEN
+            self._opened = time.monotonic()
+
+
+class CircuitBreakers:
+    """Circuit breakers of all publishers, may be shared between threads"""
+
+    def __init__(self, threshold=DEFAULT_CIRCUIT_BREAKER_CONFIG["threshold"],
+                 cooldown=DEFAULT_CIRCUIT_BREAKER_CONFIG["cooldown"]):
+        """Create circuit breakers, which are closed for all publishers
+
+        Args:
+            threshold: see CircuitBreaker
+            cooldown:  see CircuitBreaker
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def allow(self, publisher):
+        """Check whether an identifier of a publisher may be retrieved
+
+        Args:
+            publisher: publisher name (None: unknown, always allowed)
+
+        Returns:
+            True if the retrieval may be started (see CircuitBreaker.allow)
+        """
+        if publisher is None:
+            return True
+        with self._lock:
+            return self._breaker(publisher).allow()
+
+    def record(self, publisher, error=None):
+        """Record the outcome of a retrieval
+
+        Args:
+            publisher: publisher name (None: unknown, nothing is recorded)
+            error:     None or the exception raised by the retrieval
+
+        Returns:
+            None or the class of the failure (see classify_failure)
+        """
+        failure = None if error is None else classify_failure(error)
+        if publisher is not None:
+            with self._lock:
+                self._breaker(publisher).record(failure)
+        return failure
+
+    def states(self):
+        """States of the breakers of the publishers retrieved so far
+
+        Returns:
+            dict mapping publisher names to CIRCUIT_* states
+        """
+        with self._lock:
+            return {publisher: breaker.state
+                    for publisher, breaker in self._breakers.items()}
+
+    def _breaker(self, publisher):
+        """Circuit breaker of a publisher, created on first use"""
+        if publisher not in self._breakers:
+            self._breakers[publisher] = CircuitBreaker(self.threshold, self.cooldown)
+        return self._breakers[publisher]
+
+
+def open_circuit_breakers(config):
+    """Create the circuit breakers according to the configuration
+
+    Args:
+        config: configuration dictionary, whose optional "circuit_breaker"
+                section holds the settings (see DEFAULT_CIRCUIT_BREAKER_CONFIG)
+
+    Returns:
+        CircuitBreakers or None if disabled
+    """
+    settings = dict(DEFAULT_CIRCUIT_BREAKER_CONFIG, **config.get("circuit_breaker", {}))
+    if not settings["enabled"]:
+        return None
+    return CircuitBreakers(settings["threshold"], settings["cooldown"])
@@ -0,0 +1,195 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Metadata cache module
+
+The registration agency of a DOI and its CrossRef member almost never
+change, hence they are kept in a persistent SQLite cache such that re-runs
+over overlapping DOI lists do not query doi.org and api.crossref.org again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Defaults for the "cache" section of the configuration (see doc/config.md),
+# a single get_fulltext call only opens the cache if the section is present
+DEFAULT_CACHE_CONFIG = {
+    # false keeps the cache in memory for the current run only
+    "enabled": True,
+    # SQLite database file (default: metadata.sqlite in the fulltext storage)
+    "path": None,
+    # Days after which cached entries expire
+    "ttl": 30,
+    # Maximum number of cached entries, the oldest ones get evicted first
+    "max_entries": 1000000,
+    # Ignore entries cached before the run and fetch fresh ones (which get
+    # cached again and are used for the rest of the run)
+    "refresh": False,
+}
+
+
+class MetadataCache:
+    """Persistent key-value cache for JSON-serialisable metadata
+
+    Entries are stored per namespace (e.g. "doiRA" or "crossref") and key
+    (e.g. the DOI). The cache may be shared between threads.
+    """
+
+    def __init__(self, path=":memory:", ttl=30, max_entries=1000000, refresh=False):
+        """Open or create a cache
+
+        Args:
+            path:         SQLite database file (":memory:" for a non-persistent cache)
+            ttl:          days after which entries expire
+            max_entries:  maximum number of entries, the oldest ones get evicted
+                          when the cache is full (checked while entries are
+                          stored, not when the cache is opened)
+            refresh:      if True, entries stored before the cache was opened are
+                          ignored (new ones are stored and used)
+        """
+        self.ttl = ttl * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self._opened = time.time()
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'namespace TEXT, key TEXT, value TEXT, stored REAL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS entries_stored ON entries (stored)'
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._connection.close()
+
+    def get(self, namespace, key):
+        """Get a cached value
+
+        Args:
+            namespace: namespace of the entry
+            key:       key of the entry
+
+        Returns:
+            the cached value or None if not cached, expired or (when
+            refreshing) stored before the cache was opened
+        """
+        oldest = time.time() - self.ttl
+        if self.refresh:
+            oldest = max(oldest, self._opened)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM entries '
+                'WHERE namespace = ? AND key = ? AND stored >= ?',
+                (namespace, key, oldest)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, namespace, key, value):
+        """Store a value in the cache
+
+        Args:
+            namespace: namespace of the entry
+            key:       key of the entry
+            value:     JSON-serialisable value
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                (namespace, key, json.dumps(value), time.time())
+            )
+            self._inserts += 1
+            # Counting all entries is expensive, hence the size is only
+            # checked once the cache could have grown by 1% since the last check
+            check_size = self._inserts >= max(1, self.max_entries // 100)
+        if check_size:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries and the oldest ones exceeding max_entries"""
+        with self._lock, self._connection:
+            self._inserts = 0
+            self._connection.execute('DELETE FROM entries WHERE stored <= ?',
+                                     (time.time() - self.ttl,))
+            excess = self._connection.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    'DELETE FROM entries WHERE rowid IN '
+                    '(SELECT rowid FROM entries ORDER BY stored LIMIT ?)', (excess,)
+                )
+
+
+def open_metadata_cache(config):
+    """Open the metadata cache configured in the "cache" section
+
+    Args:
+        config: configuration dictionary (see config.py)
+
+    Returns:
+        MetadataCache, kept in memory if the cache is disabled
+    """
+    settings = dict(DEFAULT_CACHE_CONFIG, **config.get("cache", {}))
+
+    path = ":memory:"
+    if settings["enabled"]:
+        path = settings["path"] or os.path.join(config["storage"]["fulltext"],
+                                                "metadata.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    return MetadataCache(path, ttl=settings["ttl"], max_entries=settings["max_entries"],
+                         refresh=settings["refresh"])
+
+
+def cached(cache, namespace, key, fetch):
+    """Get a value from the cache or fetch and cache it
+
+    Args:
+        cache:     MetadataCache or None (no caching)
+        namespace: namespace of the entry
+        key:       key of the entry
+        fetch:     function without arguments returning the value
+
+    Returns:
+        the cached or fetched value
+    """
+    value = None if cache is None else cache.get(namespace, key)
+    if value is None:
+        value = fetch()
+        if cache is not None:
+            cache.set(namespace, key, value)
+    return value
+
+
+async def cached_async(cache, namespace, key, fetch):
+    """Get a value from the cache or fetch and cache it (asyncio variant of cached)
+
+    Args:
+        cache:     MetadataCache or None (no caching)
+        namespace: namespace of the entry
+        key:       key of the entry
+        fetch:     coroutine function without arguments returning the value
+
+    Returns:
+        the cached or fetched value
+    """
+    value = None if cache is None else cache.get(namespace, key)
+    if value is None:
+        value = await fetch()
+        if cache is not None:
+            cache.set(namespace, key, value)
+    return value
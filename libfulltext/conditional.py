@@ -0,0 +1,139 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Conditional request module
+
+The ETag and Last-Modified headers of every saved response are recorded in
+the manifest together with the requested URL. When an identifier is
+retrieved again while its files still exist, the download requests send
+them as If-None-Match and If-Modified-Since, such that unchanged files are
+answered with 304 Not Modified instead of the whole body.
+
+Likewise, downloads whose partial file was kept by an earlier attempt (see
+resume.py) are requested with a Range header for the missing bytes and an
+If-Range header, such that only the rest of an unchanged file is sent.
+"""
+
+from .resume import PARTIAL_CONTENT, content_range
+
+# HTTP status code of a response to a conditional request for an unchanged file
+NOT_MODIFIED = 304
+
+# Validators recorded in the manifest:
+# names of the response header and of the conditional request header
+VALIDATOR_HEADERS = {
+    'etag': ('ETag', 'If-None-Match'),
+    'last_modified': ('Last-Modified', 'If-Modified-Since'),
+}
+
+
+class ConditionalSession:
+    """Proxy of a requests.Session making download requests conditional
+
+    Streamed GET requests (i.e. downloads) of URLs for which validators of
+    a saved file are known get the corresponding conditional headers, those
+    of URLs with a kept partial file get Range and If-Range headers. All
+    other attributes are those of the proxied session. A ConditionalSession
+    serves the retrieval of a single identifier.
+    """
+
+    def __init__(self, session, saved_files, partials=None):
+        """Create proxy
+
+        Args:
+            session:     requests.Session sending the requests
+            saved_files: dict mapping paths to the manifest entries (with url
+                         and validators) of the existing files of the identifier
+            partials:    dict mapping URLs to the kept partial files of the
+                         identifier (see resume.read_partials)
+        """
+        self.session = session
+        self._saved = {saved['url']: saved for saved in saved_files.values()
+                       if 'url' in saved}
+        self._partials = partials or {}
+        # Requested URLs by response, as the URL of a response contains
+        # the query parameters (possibly an API key)
+        self._urls = {}
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def get(self, url, **kwargs):
+        """Send a GET request, conditional for downloads of saved files
+
+        Args:
+            url:    URL to request
+            kwargs: passed on to requests.Session.get
+
+        Returns:
+            requests.Response
+        """
+        headers = dict(kwargs.get('headers') or {})
+        partial = self._partials.get(url) if kwargs.get('stream') else None
+        saved = self._saved.get(url) if kwargs.get('stream') else None
+        if partial is not None:
+            # The saved file (if any) is outdated, as it was downloaded again
+            headers['Range'] = 'bytes={0}-'.format(partial['offset'])
+            headers['If-Range'] = partial['validator']
+            kwargs['headers'] = headers
+        elif saved is not None:
+            for validator, (_, request_header) in VALIDATOR_HEADERS.items():
+                if validator in saved:
+                    headers[request_header] = saved[validator]
+            kwargs['headers'] = headers
+        response = self.session.get(url, **kwargs)
+        self._urls[id(response)] = url
+        return response
+
+    def validators(self, response):
+        """URL and validators of a response to be recorded in the manifest
+
+        Args:
+            response: requests.Response sent by get
+
+        Returns:
+            dict with url and, if sent by the server, etag and last_modified
+        """
+        validators = {'url': self._urls.get(id(response), response.url)}
+        for validator, (response_header, _) in VALIDATOR_HEADERS.items():
+            if response_header in response.headers:
+                validators[validator] = response.headers[response_header]
+        return validators
+
+    def not_modified(self, response):
+        """Manifest entry of the saved file if a response is 304 Not Modified
+
+        Args:
+            response: requests.Response sent by get
+
+        Raises:
+            ValueError: 304 Not Modified for a request which was not conditional
+        Returns:
+            the manifest entry of the unchanged file or None if the response
+            has to be saved
+        """
+        if response.status_code != NOT_MODIFIED:
+            return None
+        url = self._urls.get(id(response))
+        if url not in self._saved or url in self._partials:
+            raise ValueError('Unexpected 304 Not Modified for {0}'.format(url))
+        return self._saved[url]
+
+    def resumed(self, response):
+        """Whether a response continues a kept partial file
+
+        Args:
+            response: requests.Response sent by get
+
+        Raises:
+            ValueError: 206 Partial Content not matching a kept partial file
+        Returns:
+            True if the body of the response is to be appended to the
+            partial file, False if the response has to be saved from scratch
+            (e.g. because the file changed since the partial download)
+        """
+        if response.status_code != PARTIAL_CONTENT:
+            return False
+        partial = self._partials.get(self._urls.get(id(response)))
+        if partial is None or content_range(response)[0] != partial['offset']:
+            raise ValueError('Unexpected 206 Partial Content for {0}'.format(
+                self._urls.get(id(response), response.url)))
+        return True
@@ -1,29 +1,143 @@
 # copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
-"""Config handling module"""
+"""Config handling module
 
+Configuration files given by path are parsed once, then their parsed content
+is loaded from a cache (JSON files in DEFAULT_CONFIG_CACHE_DIR) until the
+file changes, which spares parsing the YAML and importing yaml at all on
+every start of the command line tools. As configurations hold API keys, the
+cache is only used in a directory accessible by the current user alone.
+"""
+
+import hashlib
+import json
 import os
-import yaml
 
 # Default location for the configuration file
 DEFAULT_CONFIG_PATH = os.path.expanduser("~/.config/libfulltext/config.yaml")
 
+# Default directory of the parsed configuration files
+DEFAULT_CONFIG_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "libfulltext")
+
 
-def parse(path=DEFAULT_CONFIG_PATH):
+def parse(path=DEFAULT_CONFIG_PATH, cache_dir=DEFAULT_CONFIG_CACHE_DIR):
     """Parse config file or config stream
 
     Args:
         path:       Path to the configuration yaml file
                     or file stream with its content.
+        cache_dir:  Directory in which the parsed content of configuration
+                    files given by path is cached (None: no caching)
     Returns:
         parsed configuration dictionary
     """
     if isinstance(path, str):
-        with open(path, "r") as file:
-            return parse(file)
+        cfg = _load_cached(path, cache_dir)
     else:
+        import yaml  # pylint: disable=import-outside-toplevel
         cfg = yaml.safe_load(path)
 
-        # Insert defaults
-        cfg.setdefault("storage", dict())
-        cfg["storage"].setdefault("fulltext", os.path.abspath("fulltext"))
-        return cfg
+    # Insert defaults
+    cfg.setdefault("storage", dict())
+    cfg["storage"].setdefault("fulltext", os.path.abspath("fulltext"))
+    return cfg
+
+
+def _load_cached(path, cache_dir):
+    """Parsed content of a configuration file, from the cache if unchanged
+
+    The cache entry of a file is keyed by its absolute path and is valid as
+    long as modification time and size of the file match. Failing to read
+    or write the cache only costs the parsing.
+
+    Args:
+        path:      path of the configuration file
+        cache_dir: cache directory (None: no caching)
+
+    Returns:
+        parsed configuration dictionary
+    """
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        cache_path = None if cache_dir is None else _cache_path(cache_dir, path)
+        if cache_path is None:
+            return _parse_yaml(file)
+
+        key = [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+        entry = _read_cache_entry(cache_path)
+        if entry is not None and entry.get("key") == key:
+            return entry["config"]
+
+        cfg = _parse_yaml(file)
+
+    _write_cache_entry(cache_path, {"key": key, "config": cfg})
+    return cfg
+
+
+def _cache_path(cache_dir, path):
+    """Cache file of a configuration file
+
+    The cache directory is created if needed and made private to the
+    current user.
+
+    Args:
+        cache_dir: cache directory
+        path:      path of the configuration file
+
+    Returns:
+        path of the cache file or None if the cache directory cannot be
+        created or belongs to another user
+    """
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(cache_dir)
+        if stat.st_uid != os.getuid():
+            return None
+        if stat.st_mode & 0o077:
+            os.chmod(cache_dir, 0o700)
+    except OSError:
+        return None
+    return os.path.join(cache_dir, hashlib.sha1(os.path.abspath(path).encode())
+                        .hexdigest() + ".json")
+
+
+def _read_cache_entry(cache_path):
+    """Read a cache entry, None if missing, invalid or owned by another user"""
+    try:
+        with open(os.open(cache_path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0)),
+                  "rb") as cache_file:
+            if os.fstat(cache_file.fileno()).st_uid != os.getuid():
+                return None
+            entry = json.loads(cache_file.read().decode())
+    except (OSError, ValueError):
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _write_cache_entry(cache_path, entry):
+    """Write a cache entry readable by the current user only
+
+    Configurations not surviving the conversion to JSON unchanged (e.g.
+    with dates or integer keys) are not cached.
+    """
+    try:
+        data = json.dumps(entry)
+        if json.loads(data) != entry:
+            return
+    except (TypeError, ValueError):
+        return
+
+    partial_path = "{0}.{1}".format(cache_path, os.getpid())
+    try:
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0)
+        with open(os.open(partial_path, flags, 0o600), "w") as cache_file:
+            cache_file.write(data)
+        os.replace(partial_path, cache_path)
+    except OSError:
+        pass
+
+
+def _parse_yaml(file):
+    """Parse a YAML configuration stream"""
+    import yaml  # pylint: disable=import-outside-toplevel
+    return yaml.safe_load(file)
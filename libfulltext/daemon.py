@@ -0,0 +1,182 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Retrieval daemon module
+
+A long-running process serves batches of prefixed identifiers over a local
+(Unix domain) socket, such that callers retrieving small batches do not pay
+the start of the interpreter, the imports and the opening of session,
+metadata cache and manifest for every batch. Circuit breakers and the
+connection pools are shared by all batches.
+
+Protocol: the client sends the prefixed identifiers, one per line, and
+closes its side of the connection (or sends an empty line). For every
+identifier the daemon answers a JSON object per line with the keys "id",
+"status", "error", "failure" and "reason" (see BatchResult) as soon as it is
+finished, then closes the connection. Batches are retrieved one after
+another, e.g. with `socat - UNIX-CONNECT:<socket>` as client. Only the user
+running the daemon may connect to the socket.
+
+Only the server imports the retrieval machinery, the client is light.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import threading
+
+# Outcome of retrieving an identifier of a batch, as sent over the socket
+#   prefixed_identifier:  the identifier
+#   status:               status of the FulltextResult
+#   error:                error message (None unless failed)
+#   failure:              class of the failure (see breaker.classify_failure,
+#                         None unless failed)
+#   reason:               reason code of a rejected PDF (see FulltextResult)
+BatchResult = collections.namedtuple('BatchResult', [
+    'prefixed_identifier', 'status', 'error', 'failure', 'reason',
+])
+
+
+def batch_result(result):
+    """Convert a FulltextResult to a BatchResult
+
+    Args:
+        result: FulltextResult (see get_fulltexts)
+
+    Returns:
+        BatchResult
+    """
+    from .breaker import classify_failure  # pylint: disable=import-outside-toplevel
+
+    if result.error is None:
+        return BatchResult(result.prefixed_identifier, result.status, None, None, None)
+    return BatchResult(result.prefixed_identifier, result.status, str(result.error),
+                       classify_failure(result.error), result.reason)
+
+
+def serve(socket_path, config, workers=1, skip_existing=False, metrics=None):
+    """Serve batches of identifiers on a Unix domain socket until interrupted
+
+    Args:
+        socket_path:   path of the socket (a stale socket file is replaced)
+        config:        configuration dictionary (see config.py and README.md)
+        workers:       number of concurrent retrievals per batch
+        skip_existing: skip identifiers which are complete according to
+                       the manifest (see get_fulltexts)
+        metrics:       Metrics recording the stages of all retrievals
+                       (default: not recorded)
+
+    Raises:
+        ValueError: another daemon serves the socket already
+    """
+    # pylint: disable=import-outside-toplevel
+    from .backend import open_storage_backend
+    from .breaker import open_circuit_breakers
+    from .cache import open_metadata_cache
+    from .extract import open_extraction_pool
+    from .fulltext import get_fulltexts, unique_identifiers
+    from .manifest import open_manifest
+    from .session import create_session
+    from .store import open_fulltext_store
+
+    _remove_stale_socket(socket_path)
+    with contextlib.ExitStack() as stack:
+        backend = open_storage_backend(config)
+        resources = {
+            'session': stack.enter_context(create_session(config)),
+            'cache': stack.enter_context(open_metadata_cache(config)),
+            'manifest': stack.enter_context(open_manifest(config, backend)),
+            'store': open_fulltext_store(config),
+            'extraction': open_extraction_pool(config),
+            'backend': backend,
+            'breakers': open_circuit_breakers(config),
+            'metrics': metrics,
+        }
+        for name in ('store', 'extraction'):
+            if resources[name] is not None:
+                stack.enter_context(resources[name])
+
+        class BatchHandler(socketserver.StreamRequestHandler):
+            """Retrieve the identifiers of a connection and send the results"""
+
+            def handle(self):
+                identifiers = unique_identifiers(_read_batch(self.rfile))
+                for result in get_fulltexts(identifiers, config, workers,
+                                            skip_existing=skip_existing, **resources):
+                    result = batch_result(result)
+                    self.wfile.write(json.dumps({
+                        'id': result.prefixed_identifier, 'status': result.status,
+                        'error': result.error, 'failure': result.failure,
+                        'reason': result.reason,
+                    }).encode() + b'\n')
+                    self.wfile.flush()
+
+        server = socketserver.UnixStreamServer(socket_path, BatchHandler,
+                                               bind_and_activate=False)
+        stack.callback(server.server_close)
+        server.server_bind()
+        stack.callback(os.remove, socket_path)
+        # Batches run with the credentials of this process, hence only its
+        # user may connect (the socket does not accept connections before)
+        os.chmod(socket_path, 0o600)
+        server.server_activate()
+        server.serve_forever()
+
+
+def submit(socket_path, prefixed_identifiers):
+    """Retrieve identifiers with the daemon serving a socket
+
+    Args:
+        socket_path:          path of the socket of the daemon
+        prefixed_identifiers: iterable of article identifiers with prefix
+
+    Raises:
+        OSError: no daemon serves the socket
+    Yields:
+        BatchResult for each identifier, in order of completion
+    """
+    def send():
+        """Send the identifiers, while the results are received"""
+        with connection.makefile('wb') as stream:
+            # An empty line would end the batch
+            for prfid in filter(None, (prfid.strip() for prfid in prefixed_identifiers)):
+                stream.write(prfid.encode() + b'\n')
+        connection.shutdown(socket.SHUT_WR)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        with connection.makefile('rb') as stream:
+            for line in stream:
+                result = json.loads(line.decode())
+                yield BatchResult(result['id'], result['status'], result['error'],
+                                  result['failure'], result.get('reason'))
+        sender.join()
+
+
+def _read_batch(stream):
+    """Identifiers sent by a client, up to the end of the stream or an empty line"""
+    for line in stream:
+        line = line.decode().strip()
+        if not line:
+            return
+        yield line
+
+
+def _remove_stale_socket(socket_path):
+    """Remove the socket file of a daemon which is not running anymore
+
+    Raises:
+        ValueError: another daemon serves the socket
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise ValueError('Socket {0} is served by another daemon.'.format(socket_path))
@@ -3,17 +3,28 @@
 
 import requests
 
-from .crossref import get_crossref_fulltext
+from .crossref import get_crossref_fulltext, get_crossref_fulltext_async
+from .crossref import CROSSREF_ROUTING_FIELDS, get_crossref_metadata_batch
+from .crossref.prefixes import get_prefix_crossref_metadata
 from .datacite import get_datacite_fulltext
+from ..cache import cached, cached_async
+from ..registry import get_crossref_handler
+from ..response import raise_for_status_aiohttp
 
+# doi.org endpoint returning the registration agency of a DOI
+DOIRA_URL = 'https://doi.org/doiRA/'
 
-def get_doi_fulltext(doi, save_stream, config):
+
+def get_doi_fulltext(doi, save_stream, config, session=requests, cache=None):
     """Get the fulltext for a DOI
 
     Args:
         doi:         DOI string
         save_stream: function that saves a stream (arguments: stream, path)
         config:      configuration dictionary (see config.py)
+        session:     requests.Session used for all requests
+        cache:       MetadataCache consulted before metadata requests
+                     (None: no caching)
 
     Returns:
         What the actual getter returns (usually None)
@@ -25,10 +36,13 @@ def get_doi_fulltext(doi, save_stream, config):
     # dois are case insensitive (wtf!)
     doi = doi.lower()
 
-    registration_agency = get_doi_registration_agency(doi)
+    registration_agency = _prefix_registration_agency(doi, config)
+    if registration_agency is None:
+        registration_agency = cached(cache, 'doiRA', doi,
+                                     lambda: get_doi_registration_agency(doi, session))
 
     if registration_agency == 'Crossref':
-        return get_crossref_fulltext(doi, save_stream, config)
+        return get_crossref_fulltext(doi, save_stream, config, session, cache)
     elif registration_agency == 'DataCite':
         return get_datacite_fulltext()
 
@@ -36,11 +50,95 @@ def get_doi_fulltext(doi, save_stream, config):
                               .format(registration_agency))
 
 
-def get_doi_registration_agency(doi):
+def prefetch_doi_metadata(dois, config, session=requests, cache=None):
+    """Fill the cache with the metadata of many DOIs using batched requests
+
+    The CrossRef metadata of all DOIs which are neither routed by their
+    prefix nor cached already is fetched with one request per batch (see
+    "routing" in doc/config.md). DOIs known to CrossRef are also cached with
+    their registration agency, such that get_doi_fulltext does not need any
+    metadata request for them. Failing batches are ignored, the metadata of
+    their DOIs is then fetched by get_doi_fulltext, as well as the one of
+    DOIs containing a comma, which cannot be part of a batch request.
+
+    Args:
+        dois:    iterable of DOIs
+        config:  configuration dictionary (see config.py)
+        session: requests.Session used for all requests
+        cache:   MetadataCache to be filled (None or refreshing: nothing to do)
+    """
+    batch_size = config.get("routing", {}).get("prefetch", 100)
+    if cache is None or cache.refresh or not batch_size:
+        return
+
+    missing = sorted(doi for doi in {doi.lower() for doi in dois}
+                     if _batchable(doi)
+                     if _prefix_registration_agency(doi, config) is None
+                     if cache.get('crossref', doi) is None)
+    for start in range(0, len(missing), batch_size):
+        try:
+            metadata = get_crossref_metadata_batch(missing[start:start + batch_size],
+                                                   session)
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            continue
+        for doi, doi_metadata in metadata.items():
+            cache.set('doiRA', doi, 'Crossref')
+            cache.set('crossref', doi, doi_metadata)
+
+
+def _batchable(doi):
+    """Check whether a DOI can be part of a CrossRef batch request
+
+    The filter of a batch request separates the DOIs by commas, which valid
+    DOIs may contain as well.
+    """
+    return ',' not in doi
+
+
+def resolve_doi_route(doi, config, cache=None):
+    """Describe how a DOI is routed, using the known metadata only
+
+    Nothing is requested, the route consists of what the prefix rules and
+    the cache (e.g. filled by get_doi_fulltext) know about the DOI.
+
+    Args:
+        doi:    DOI string
+        config: configuration dictionary (see config.py)
+        cache:  MetadataCache with the metadata of the DOI (None: no caching)
+
+    Returns:
+        dict with the known ones of registration_agency, member, publisher
+        and handler (name of the CrossRef member handler)
+    """
+    doi = doi.lower()
+    route = {}
+
+    registration_agency = _prefix_registration_agency(doi, config)
+    if registration_agency is None and cache is not None:
+        registration_agency = cache.get('doiRA', doi)
+    if registration_agency is None:
+        return route
+    route['registration_agency'] = registration_agency
+
+    metadata = get_prefix_crossref_metadata(doi, config)
+    if metadata is None and cache is not None and registration_agency == 'Crossref':
+        metadata = cache.get('crossref', doi)
+    if metadata is None:
+        return route
+    route.update((field, value) for field, value in metadata['message'].items()
+                 if field in CROSSREF_ROUTING_FIELDS)
+    handler = get_crossref_handler(metadata['message']['member'], config)
+    if handler is not None:
+        route['handler'] = handler.name
+    return route
+
+
+def get_doi_registration_agency(doi, session=requests):
     """Get registration agency for a DOI
 
     Args:
-        doi: the DOI as a string
+        doi:     the DOI as a string
+        session: requests.Session used for the request
 
     Returns:
         registration agency as a string
@@ -49,9 +147,73 @@ def get_doi_registration_agency(doi):
         ValueError: registration agency not known to doi.org
     """
 
-    response = requests.get('https://doi.org/doiRA/' + doi)
+    response = session.get(DOIRA_URL + doi)
     response.raise_for_status()
-    ra_result = response.json()[0]
+    return _parse_registration_agency(doi, response.json())
+
+
+async def get_doi_fulltext_async(doi, save_stream, config, session, cache=None):
+    """Get the fulltext for a DOI (asyncio variant of get_doi_fulltext)
+
+    Args:
+        doi:         DOI string
+        save_stream: coroutine function that saves a stream (arguments: stream, path)
+        config:      configuration dictionary (see config.py)
+        session:     aiohttp.ClientSession used for all requests
+        cache:       MetadataCache consulted before metadata requests
+                     (None: no caching)
+
+    Returns:
+        What the actual getter returns (usually None)
+
+    Raises:
+        NotImplementedError: Function to handle publisher is not implemented
+    """
+    doi = doi.lower()
+
+    registration_agency = _prefix_registration_agency(doi, config)
+    if registration_agency is None:
+        registration_agency = await cached_async(
+            cache, 'doiRA', doi, lambda: get_doi_registration_agency_async(doi, session))
+
+    if registration_agency == 'Crossref':
+        return await get_crossref_fulltext_async(doi, save_stream, config, session,
+                                                 cache)
+    elif registration_agency == 'DataCite':
+        return get_datacite_fulltext()
+
+    raise NotImplementedError('Registration agency {0} is not yet implemented.'
+                              .format(registration_agency))
+
+
+async def get_doi_registration_agency_async(doi, session):
+    """Get registration agency for a DOI (asyncio variant)
+
+    Args:
+        doi:     the DOI as a string
+        session: aiohttp.ClientSession used for the request
+
+    Returns:
+        registration agency as a string
+
+    Raises:
+        ValueError: registration agency not known to doi.org
+    """
+    async with session.get(DOIRA_URL + doi) as response:
+        raise_for_status_aiohttp(response)
+        return _parse_registration_agency(doi, await response.json(content_type=None))
+
+
+def _prefix_registration_agency(doi, config):
+    """Registration agency of DOIs with prefixes of known CrossRef members (or None)"""
+    if get_prefix_crossref_metadata(doi, config) is not None:
+        return 'Crossref'
+    return None
+
+
+def _parse_registration_agency(doi, ra_results):
+    """Extract the registration agency from a doiRA response"""
+    ra_result = ra_results[0]
     if 'RA' not in ra_result:
         raise ValueError('No registration agency known for DOI {0}.'.format(doi))
     return ra_result['RA']
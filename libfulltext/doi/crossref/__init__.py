@@ -3,21 +3,35 @@
 
 import requests
 
-from .aps import get_aps_fulltext
-from .elsevier import get_elsevier_fulltext
-from .springer import get_springer_fulltext
+from .prefixes import get_prefix_crossref_metadata
+from ...cache import cached, cached_async
+from ...registry import get_crossref_handler, handler_options, load
+from ...response import raise_for_status_aiohttp
 
+# CrossRef REST API endpoint for the metadata of a single work
+CROSSREF_WORKS_URL = 'https://api.crossref.org/v1/works/'
 
-def get_crossref_fulltext(doi, save_stream, config):
+# CrossRef REST API endpoint for queries over many works
+CROSSREF_WORKS_QUERY_URL = 'https://api.crossref.org/v1/works'
+
+# Fields of the CrossRef metadata message needed for routing,
+# only these are kept in the metadata cache
+CROSSREF_ROUTING_FIELDS = ('member', 'publisher')
+
+
+def get_crossref_fulltext(doi, save_stream, config, session=requests, cache=None):
     """Get fulltext for a CrossRef doi
 
-    Fetches metadata about a DOI from CrossRef to determine the publisher and
-    pick the getter function accoridingly.
+    Determines the publisher from the DOI prefix or, for unknown prefixes,
+    from the metadata at CrossRef (or the cache) and picks the getter function
+    of its handler (see registry.py) accoridingly.
 
     Args:
         doi:           DOI as string
         save_stream:   a function with two arguments (data stream and output filename)
         config:        the libfulltext configuration dictionary
+        session:       requests.Session used for all requests
+        cache:         MetadataCache for the CrossRef metadata (None: no caching)
 
     Returns:
         What the actual getter returns (usually None)
@@ -26,30 +40,115 @@ def get_crossref_fulltext(doi, save_stream, config):
         ValueError: no getter function for publisher found
     """
 
-    metadata = get_crossref_metadata(doi)
-    crossref_member = metadata['message']['member']
+    metadata = get_prefix_crossref_metadata(doi, config)
+    if metadata is None:
+        metadata = cached(cache, 'crossref', doi,
+                          lambda: _routing_metadata(get_crossref_metadata(doi, session)))
+    handler = get_crossref_handler(metadata['message']['member'], config)
+    if handler is None:
+        raise ValueError('No handler for DOI {0} (publisher {1}) found.'
+                         .format(doi, metadata['message']['publisher']))
 
-    if crossref_member == '16':
-        return get_aps_fulltext(doi, save_stream)
-    elif crossref_member == '78':
-        return get_elsevier_fulltext(doi, save_stream,
-                                     apikey=config['publishers']['elsevier']['apikey'])
-    elif crossref_member == '297':
-        return get_springer_fulltext(doi, save_stream)
+    return load(handler)(doi, save_stream, session=session,
+                         **handler_options(handler, config))
 
-    raise ValueError('No handler for DOI {0} (publisher {1}) found.'
-                     .format(doi, metadata['message']['publisher']))
 
-
-def get_crossref_metadata(doi):
+def get_crossref_metadata(doi, session=requests):
     """Obtain metadata for DOI from crossref.org
 
     Args:
-        doi: DOI as string
+        doi:     DOI as string
+        session: requests.Session used for the request
 
     Returns:
         dict with CrossRef metadata
     """
-    response = requests.get('https://api.crossref.org/v1/works/' + doi)
+    response = session.get(CROSSREF_WORKS_URL + doi)
     response.raise_for_status()
     return response.json()
+
+
+def get_crossref_metadata_batch(dois, session=requests):
+    """Obtain the routing metadata for many DOIs with a single request
+
+    Args:
+        dois:    list of DOIs (at most 1000, the maximal number of rows
+                 CrossRef returns at once), without commas, which separate
+                 the DOIs in the request
+        session: requests.Session used for the request
+
+    Raises:
+        ValueError: a DOI contains a comma
+    Returns:
+        dict mapping the (lower case) DOIs known to CrossRef to their
+        metadata, reduced to the CROSSREF_ROUTING_FIELDS
+    """
+    for doi in dois:
+        if ',' in doi:
+            raise ValueError('DOI {0} contains a comma and cannot be requested '
+                             'in a batch.'.format(doi))
+    response = session.get(CROSSREF_WORKS_QUERY_URL, params={
+        'filter': ','.join('doi:' + doi for doi in dois),
+        'select': ','.join(('DOI',) + CROSSREF_ROUTING_FIELDS),
+        'rows': len(dois),
+    })
+    response.raise_for_status()
+    return {item['DOI'].lower(): _routing_metadata({'message': item})
+            for item in response.json()['message']['items']}
+
+
+async def get_crossref_fulltext_async(doi, save_stream, config, session, cache=None):
+    """Get fulltext for a CrossRef doi (asyncio variant of get_crossref_fulltext)
+
+    Args:
+        doi:           DOI as string
+        save_stream:   a coroutine function with two arguments
+                       (data stream and output filename)
+        config:        the libfulltext configuration dictionary
+        session:       aiohttp.ClientSession used for all requests
+        cache:         MetadataCache for the CrossRef metadata (None: no caching)
+
+    Returns:
+        What the actual getter returns (usually None)
+
+    Raises:
+        ValueError: no getter function for publisher found
+    """
+
+    async def fetch():
+        """Fetch the routing metadata from CrossRef"""
+        return _routing_metadata(await get_crossref_metadata_async(doi, session))
+
+    metadata = get_prefix_crossref_metadata(doi, config)
+    if metadata is None:
+        metadata = await cached_async(cache, 'crossref', doi, fetch)
+    handler = get_crossref_handler(metadata['message']['member'], config)
+    getter = None if handler is None else load(handler, 'getter_async')
+    if getter is None:
+        raise ValueError('No handler for DOI {0} (publisher {1}) found.'
+                         .format(doi, metadata['message']['publisher']))
+
+    return await getter(doi, save_stream, session=session,
+                        **handler_options(handler, config))
+
+
+async def get_crossref_metadata_async(doi, session):
+    """Obtain metadata for DOI from crossref.org (asyncio variant)
+
+    Args:
+        doi:     DOI as string
+        session: aiohttp.ClientSession used for the request
+
+    Returns:
+        dict with CrossRef metadata
+    """
+    async with session.get(CROSSREF_WORKS_URL + doi) as response:
+        raise_for_status_aiohttp(response)
+        return await response.json(content_type=None)
+
+
+def _routing_metadata(metadata):
+    """Reduce CrossRef metadata to the CROSSREF_ROUTING_FIELDS of its message"""
+    return {'message': {field: metadata['message'][field]
+                        for field in CROSSREF_ROUTING_FIELDS
+                        if field in metadata['message']}}
@@ -2,21 +2,40 @@
 """American Physical Society publisher module"""
 
 import requests
-from ...response import verify
+from ...response import verify, verify_aiohttp
 
+# APS harvest API endpoint for article fulltexts
+APS_FULLTEXT_URL = 'http://harvest.aps.org/v2/journals/articles/{0}'
 
-def get_aps_fulltext(doi, save_stream):
+
+def get_aps_fulltext(doi, save_stream, session=requests):
     """Retrieve APS fulltext
 
     Args:
         doi:         DOI string
         save_stream: function that saves a stream (arguments: stream, path)
+        session:     requests.Session used for the request
+                     (default: the requests module, i.e. no connection reuse)
     """
-    response = requests.get(
-        'http://harvest.aps.org/v2/journals/articles/{0}'.format(doi),
+    response = session.get(
+        APS_FULLTEXT_URL.format(doi),
         headers={"Accept": "application/pdf"},
         stream=True
     )
 
     verify(response, 'application/pdf')
     save_stream(response, 'fulltext.pdf')
+
+
+async def get_aps_fulltext_async(doi, save_stream, session):
+    """Retrieve APS fulltext (asyncio variant)
+
+    Args:
+        doi:         DOI string
+        save_stream: coroutine function that saves a stream (arguments: stream, path)
+        session:     aiohttp.ClientSession used for the request
+    """
+    async with session.get(APS_FULLTEXT_URL.format(doi),
+                           headers={"Accept": "application/pdf"}) as response:
+        verify_aiohttp(response, 'application/pdf')
+        await save_stream(response, 'fulltext.pdf')
@@ -2,39 +2,74 @@
 """Elsevier publisher module"""
 
 import requests
-from ...response import verify
+from ...conditional import NOT_MODIFIED
+from ...response import QuotaExceededError, verify, verify_aiohttp
 
+# Elsevier article retrieval API endpoint (DOI gets appended)
+ELSEVIER_FULLTEXT_URL = 'https://api.elsevier.com/content/article/doi/'
 
-def get_elsevier_fulltext(doi, save_stream, apikey):
+
+def get_elsevier_fulltext(doi, save_stream, apikey, session=requests):
     """Retrieve Elsevier fulltext
 
     Args:
         doi:         DOI string
         save_stream: function that saves a stream (arguments: stream, path)
         apikey:      Elsevier API key
+        session:     requests.Session used for the request
+                     (default: the requests module, i.e. no connection reuse)
 
     Raises:
         requests.exceptions.HTTPError: request was not successful
+        QuotaExceededError: X-ELS-Status warning, e.g. quota exceeded
     """
-    params = {
-        'apiKey': apikey,
-        'httpAccept': 'application/pdf',
-    }
-
-    response = requests.get(
-        'https://api.elsevier.com/content/article/doi/' + doi,
-        params=params,
+    response = session.get(
+        ELSEVIER_FULLTEXT_URL + doi,
+        params=_params(apikey),
         stream=True
     )
 
     verify(response, 'application/pdf')
+    if response.status_code != NOT_MODIFIED:
+        _verify_elsevier_status(response.headers)
+    save_stream(response, 'fulltext.pdf')
+
+
+async def get_elsevier_fulltext_async(doi, save_stream, session, apikey):
+    """Retrieve Elsevier fulltext (asyncio variant)
+
+    Args:
+        doi:         DOI string
+        save_stream: coroutine function that saves a stream (arguments: stream, path)
+        session:     aiohttp.ClientSession used for the request
+        apikey:      Elsevier API key
 
-    # Elsevier sometimes only returns the first page (yep, also for OA content)
-    elsevier_status = response.headers['X-ELS-Status']
-    if 'WARNING' in response.headers['X-ELS-Status']:
-        raise requests.exceptions.HTTPError(
+    Raises:
+        requests.exceptions.HTTPError: request was not successful
+        QuotaExceededError: X-ELS-Status warning, e.g. quota exceeded
+    """
+    async with session.get(ELSEVIER_FULLTEXT_URL + doi,
+                           params=_params(apikey)) as response:
+        verify_aiohttp(response, 'application/pdf')
+        _verify_elsevier_status(response.headers)
+        await save_stream(response, 'fulltext.pdf')
+
+
+def _params(apikey):
+    """Query parameters for a fulltext PDF request"""
+    return {
+        'apiKey': apikey,
+        'httpAccept': 'application/pdf',
+    }
+
+
+def _verify_elsevier_status(headers):
+    """Raise if the X-ELS-Status header signals an incomplete response"""
+    # Elsevier sometimes only returns the first page (yep, also for OA content),
+    # e.g. once the quota of the API key is exceeded
+    elsevier_status = headers['X-ELS-Status']
+    if 'WARNING' in elsevier_status:
+        raise QuotaExceededError(
             'X-ELS-Status indicates that request was not successful: {0}'
             .format(elsevier_status)
         )
-
-    save_stream(response, 'fulltext.pdf')
@@ -0,0 +1,60 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""DOI prefixes of CrossRef members
+
+Generated from doi2test/DOI-info_publisher_CRmemberID_prefixes.txt by
+bin/generate_prefix_table.py, do not edit.
+"""
+
+# Names of the CrossRef members
+CROSSREF_MEMBER_NAMES = {
+    '317': 'AIP Publishing',
+    '16': 'American Physical Society (APS)',
+    '78': 'Elsevier',
+    '98': 'Hindawi',
+    '266': 'IOP Publishing',
+    '297': 'Springer Nature',
+    '311': 'Wiley-Blackwell',
+}
+
+# DOI prefixes registered by the CrossRef members
+CROSSREF_MEMBER_PREFIXES = {
+    # AIP Publishing
+    '317': (
+        '10.1063',
+    ),
+    # American Physical Society (APS)
+    '16': (
+        '10.1103', '10.29172',
+    ),
+    # Elsevier
+    '78': (
+        '10.1006', '10.1016', '10.1053', '10.1054', '10.1067', '10.1078', '10.1157',
+        '10.1197', '10.1205', '10.1240', '10.1331', '10.1367', '10.1383', '10.14219',
+        '10.1529', '10.1533', '10.1580', '10.1602', '10.2111', '10.2139', '10.2353',
+        '10.25013', '10.3182', '10.3816', '10.3921', '10.4065', '10.7424', '10.7811',
+    ),
+    # Hindawi
+    '98': (
+        '10.1100', '10.1155', '10.3814', '10.4061', '10.5402', '10.6064', '10.7167',
+        '10.7217',
+    ),
+    # IOP Publishing
+    '266': (
+        '10.1088', '10.1209',
+    ),
+    # Springer Nature
+    '297': (
+        '10.1007', '10.1023', '10.1065', '10.1114', '10.1140', '10.1186', '10.1245',
+        '10.1251', '10.1361', '10.1379', '10.1381', '10.1385', '10.1617', '10.2165',
+        '10.26777', '10.26778', '10.3758', '10.4056', '10.4333', '10.5052', '10.5819',
+        '10.5822', '10.7603',
+    ),
+    # Wiley-Blackwell
+    '311': (
+        '10.1002', '10.1034', '10.1046', '10.1111', '10.1113', '10.1118', '10.1196',
+        '10.1256', '10.1301', '10.1348', '10.1359', '10.14814', '10.1506', '10.1516',
+        '10.1526', '10.1581', '10.1592', '10.1890', '10.1892', '10.1897', '10.2164',
+        '10.2746', '10.2903', '10.2966', '10.3162', '10.3170', '10.3401', '10.3405',
+        '10.4004', '10.4218', '10.4319', '10.5054', '10.7863',
+    ),
+}
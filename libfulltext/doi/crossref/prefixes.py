@@ -0,0 +1,54 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""DOI prefixes of CrossRef members
+
+The prefix of a DOI (the part before the first slash) usually identifies
+the CrossRef member that registered it, which allows to route DOIs to the
+publisher handler without asking doi.org and api.crossref.org.
+
+The prefixes are generated from
+doi2test/DOI-info_publisher_CRmemberID_prefixes.txt into prefix_table.py
+(see bin/generate_prefix_table.py).
+"""
+
+from .prefix_table import CROSSREF_MEMBER_NAMES, CROSSREF_MEMBER_PREFIXES
+
+# Lookup table from DOI prefix to CrossRef member ID
+CROSSREF_PREFIX_MEMBERS = {
+    prefix: member
+    for member, prefixes in CROSSREF_MEMBER_PREFIXES.items()
+    for prefix in prefixes
+}
+
+
+def get_prefix_crossref_member(doi):
+    """Get the CrossRef member which registered a DOI from its prefix
+
+    Args:
+        doi: DOI as string
+
+    Returns:
+        CrossRef member ID as string or None if the prefix is unknown
+    """
+    return CROSSREF_PREFIX_MEMBERS.get(doi.split('/', 1)[0])
+
+
+def get_prefix_crossref_metadata(doi, config):
+    """Get the routing metadata of a DOI from its prefix without any request
+
+    Args:
+        doi:    DOI as string
+        config: configuration dictionary, prefix routing can be disabled
+                in its "routing" section
+
+    Returns:
+        dict shaped like the CrossRef metadata of the DOI, but only with member
+        and publisher in the message, or None if the prefix is unknown or
+        prefix routing is disabled
+    """
+    if not config.get("routing", {}).get("prefixes", True):
+        return None
+
+    member = get_prefix_crossref_member(doi)
+    if member is None:
+        return None
+    return {'message': {'member': member, 'publisher': CROSSREF_MEMBER_NAMES[member]}}
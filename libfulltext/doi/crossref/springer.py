@@ -2,20 +2,38 @@
 """SpringerNature publisher module"""
 
 import requests
-from ...response import verify
+from ...response import verify, verify_aiohttp
 
+# SpringerLink endpoint for article PDFs
+SPRINGER_FULLTEXT_URL = 'https://link.springer.com/content/pdf/{0}.pdf'
 
-def get_springer_fulltext(doi, save_stream):
+
+def get_springer_fulltext(doi, save_stream, session=requests):
     """Retrieve SpringerNature fulltext
 
     Args:
         doi:         DOI string
         save_stream: function that saves a stream (arguments: stream, path)
+        session:     requests.Session used for the request
+                     (default: the requests module, i.e. no connection reuse)
     """
-    response = requests.get(
-        'https://link.springer.com/content/pdf/{0}.pdf'.format(doi),
+    response = session.get(
+        SPRINGER_FULLTEXT_URL.format(doi),
         stream=True
     )
 
     verify(response, 'application/pdf')
     save_stream(response, 'fulltext.pdf')
+
+
+async def get_springer_fulltext_async(doi, save_stream, session):
+    """Retrieve SpringerNature fulltext (asyncio variant)
+
+    Args:
+        doi:         DOI string
+        save_stream: coroutine function that saves a stream (arguments: stream, path)
+        session:     aiohttp.ClientSession used for the request
+    """
+    async with session.get(SPRINGER_FULLTEXT_URL.format(doi)) as response:
+        verify_aiohttp(response, 'application/pdf')
+        await save_stream(response, 'fulltext.pdf')
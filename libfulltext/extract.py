@@ -0,0 +1,142 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Text extraction module
+
+Saved PDFs can be handed to a pool of processes which extracts their text
+into fulltext.txt next to the PDF (see the "extraction" configuration),
+such that the CPU-bound extraction runs while further downloads wait for
+the network. The number of files waiting for extraction is bounded: once
+it is reached, saving the next file waits, so downloads never get far
+ahead of the extraction.
+
+The default extractor uses pdfminer.six, which is only imported by the
+extraction processes.
+"""
+
+import multiprocessing
+import os
+import threading
+
+from .response import PARTIAL_SUFFIX
+
+# Defaults for the "extraction" section of the configuration (see doc/config.md)
+DEFAULT_EXTRACTION_CONFIG = {
+    # false does not extract any text
+    "enabled": False,
+    # Number of extraction processes (None: number of CPUs)
+    "processes": None,
+    # Number of files submitted but not yet extracted, before saving
+    # further files waits (None: twice the number of processes)
+    "max_pending": None,
+}
+
+# Extension of the extracted text files, replacing the one of the PDF
+TEXT_EXTENSION = '.txt'
+
+
+def extract_pdf_text(pdf_filename, text_filename):
+    """Extract the text of a PDF with pdfminer.six
+
+    Args:
+        pdf_filename:  name of the PDF
+        text_filename: name of the text file to be written (atomically)
+
+    Returns:
+        dict with the number of extracted characters (chars)
+    """
+    from pdfminer import high_level  # pylint: disable=import-outside-toplevel
+
+    text = high_level.extract_text(pdf_filename)
+    with open(text_filename + PARTIAL_SUFFIX, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(text_filename + PARTIAL_SUFFIX, text_filename)
+    return {'chars': len(text)}
+
+
+class ExtractionPool:
+    """Process pool extracting the text of saved files with backpressure
+
+    The pool may be shared between threads. Failed extractions do not
+    affect the downloads, they are collected in failed.
+    """
+
+    def __init__(self, processes=None, max_pending=None, extractor=extract_pdf_text):
+        """Start the extraction processes
+
+        Args:
+            processes:   number of processes (default: number of CPUs)
+            max_pending: number of files submitted but not yet extracted, before
+                         submit blocks (default: twice the number of processes)
+            extractor:   picklable function taking the names of a PDF and of
+                         the text file to be written
+        """
+        processes = processes or os.cpu_count() or 1
+        self.extractor = extractor
+        # Number of extracted files
+        self.extracted = 0
+        # Files whose extraction failed and the raised exceptions
+        self.failed = {}
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * processes)
+        self._lock = threading.Lock()
+        # Worker processes are started from scratch, not forked from a
+        # process running download threads (ProcessPoolExecutor only takes
+        # a start method since Python 3.7)
+        self._pool = multiprocessing.get_context('spawn').Pool(processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Wait for all submitted extractions and stop the processes"""
+        self._pool.close()
+        self._pool.join()
+
+    def submit(self, pdf_filename):
+        """Extract the text of a PDF into a text file next to it
+
+        Blocks while max_pending files wait for extraction.
+
+        Args:
+            pdf_filename: name of the PDF
+
+        Returns:
+            name of the text file (written once extracted)
+        """
+        text_filename = os.path.splitext(pdf_filename)[0] + TEXT_EXTENSION
+        self._slots.acquire()
+        try:
+            self._pool.apply_async(
+                self.extractor, (pdf_filename, text_filename),
+                callback=lambda result: self._done(pdf_filename, None),
+                error_callback=lambda error: self._done(pdf_filename, error))
+        except Exception:
+            self._slots.release()
+            raise
+        return text_filename
+
+    def _done(self, pdf_filename, error):
+        """Record the outcome of an extraction and free its slot"""
+        with self._lock:
+            if error is None:
+                self.extracted += 1
+            else:
+                self.failed[pdf_filename] = error
+        self._slots.release()
+
+
+def open_extraction_pool(config):
+    """Start the extraction pool according to the configuration
+
+    Args:
+        config: configuration dictionary, whose optional "extraction"
+                section holds the settings (see DEFAULT_EXTRACTION_CONFIG)
+
+    Returns:
+        ExtractionPool or None if the extraction is disabled
+    """
+    settings = dict(DEFAULT_EXTRACTION_CONFIG, **config.get("extraction", {}))
+    if not settings["enabled"]:
+        return None
+    return ExtractionPool(settings["processes"], settings["max_pending"])
@@ -1,16 +1,54 @@
 # copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
 """Fulltext retrieval module"""
 
+import collections
+import concurrent.futures
+import itertools
 import os
+import time
 
-from .doi import get_doi_fulltext
+import requests
 
-PREFIX_FULLTEXT_GETTER = {
-    'doi': get_doi_fulltext,
-}
+from .backend import open_storage_backend
+from .breaker import open_circuit_breakers, publisher_of
+from .cache import open_metadata_cache
+from .conditional import ConditionalSession
+from .extract import open_extraction_pool
+from .manifest import STATUS_COMPLETE, STATUS_FAILED, open_manifest
+from .pdf import InvalidPDFError, pdf_validator
+from .registry import get_prefix_handler, load
+from .response import DEFAULT_CHUNK_SIZE
+from .resume import DEFAULT_RESUME_RETRIES, RESUMABLE_ERRORS, content_range, \
+    iter_resumable, read_partials, remove_partial_info, resume_validator, \
+    write_partial_info
+from .session import create_aiohttp_session, create_session
+from .store import normalise_identifier, open_fulltext_store
 
+# Content-Type of the downloads handed to the text extraction
+PDF_TYPE = 'application/pdf'
 
-def get_fulltext(prefixed_identifier, config):
+# Status of identifiers skipped by get_fulltexts, because they are complete
+STATUS_SKIPPED = 'skipped'
+# Status of identifiers not retrieved because the circuit breaker of their
+# publisher is open (see breaker.py), to be retrieved by a later pass
+STATUS_DEFERRED = 'deferred'
+
+# Number of the most recent distinct identifiers unique_identifiers remembers
+DEFAULT_DEDUP_WINDOW = 100000
+
+# Outcome of retrieving a single fulltext in a batch (see get_fulltexts).
+# The status is one of STATUS_COMPLETE, STATUS_FAILED, STATUS_SKIPPED or
+# STATUS_DEFERRED, the error is None unless failed, in which case it is the
+# raised exception. The reason is the reason code of a rejected PDF (see
+# pdf.InvalidPDFError), None for other outcomes.
+FulltextResult = collections.namedtuple('FulltextResult',
+                                        ['prefixed_identifier', 'status', 'error',
+                                         'reason'])
+
+
+def get_fulltext(prefixed_identifier, config, session=None,  # pylint: disable=R0913
+                 cache=None, manifest=None, store=None, metrics=None, extraction=None,
+                 backend=None):
     """Get fulltext for a prefixed ID
 
     Args:
@@ -18,9 +56,27 @@ def get_fulltext(prefixed_identifier, config):
                               (e.g. "doi:10.1016/j.cortex.2015.10.021")
         config:               configuration dictionary
                               (see config.py and README.md)
+        session:              requests.Session used for all requests
+                              (default: a new session from create_session)
+        cache:                MetadataCache for registration agencies and
+                              publisher metadata (default: the one opened by
+                              open_metadata_cache if the configuration has a
+                              "cache" section, otherwise not cached)
+        manifest:             Manifest in which the outcome is recorded
+                              (default: not recorded)
+        store:                FulltextStore in which the saved files are kept
+                              (default: the one opened by open_fulltext_store)
+        metrics:              Metrics recording the stages of the retrieval
+                              (default: not recorded)
+        extraction:           ExtractionPool to which saved PDFs are submitted
+                              (default: the one opened by open_extraction_pool)
+        backend:              storage backend to which the files are written
+                              (default: the one opened by open_storage_backend)
 
     Raises:
-        ValueError: Prefix is not implemented or not provided by caller
+        ValueError: Prefix is not implemented or not provided by caller,
+                    or the store or the extraction is used with a storage
+                    backend without local files
     Returns:
         What the actual getter (e.g. get_elsevier_fulltext) returns
         (usually None)
@@ -29,16 +85,59 @@ def get_fulltext(prefixed_identifier, config):
         raise ValueError('No prefix provided')
 
     prefix, identifier = prefixed_identifier.split(':', 1)
-    try:
-        fulltext_getter = PREFIX_FULLTEXT_GETTER[prefix]
-    except KeyError:
-        raise ValueError('Prefix {0} unknown.'.format(prefix))
+    fulltext_getter = load(get_prefix_handler(prefix, config))
+
+    if session is None:
+        with create_session(config) as own_session:
+            return get_fulltext(prefixed_identifier, config, own_session, cache,
+                                manifest, store, metrics, extraction, backend)
+    # A single retrieval benefits little from a persistent cache, hence it
+    # is only opened if configured
+    if cache is None and "cache" in config:
+        with open_metadata_cache(config) as own_cache:
+            return get_fulltext(prefixed_identifier, config, session, own_cache,
+                                manifest, store, metrics, extraction, backend)
+    if store is None:
+        own_store = open_fulltext_store(config)
+        if own_store is not None:
+            with own_store:
+                return get_fulltext(prefixed_identifier, config, session, cache,
+                                    manifest, own_store, metrics, extraction, backend)
+    if extraction is None:
+        own_extraction = open_extraction_pool(config)
+        if own_extraction is not None:
+            with own_extraction:
+                return get_fulltext(prefixed_identifier, config, session, cache,
+                                    manifest, store, metrics, own_extraction, backend)
+    if backend is None:
+        backend = open_storage_backend(config)
+    _verify_local(backend, store, extraction)
 
     # fulltext sanitisation:
     fulltext_dirname = os.path.abspath(config["storage"]["fulltext"])
+    chunk_size = config["storage"].get("chunk_size", DEFAULT_CHUNK_SIZE)
+
+    resume_retries = config.get("http", {}).get("resume_retries", DEFAULT_RESUME_RETRIES)
+
+    # Size and hashes of the saved files for the manifest
+    saved_files = dict()
+
+    # Downloads are conditional on changes of the files saved before and
+    # continue the partial files kept by earlier attempts
+    existing_files = {}
+    if manifest is not None and config.get("http", {}).get("conditional", True):
+        existing_files = manifest.existing_files(prefixed_identifier)
+    partials = {}
+    if resume_retries > 0 and backend.local:
+        try:
+            partials = read_partials(os.path.dirname(
+                _destination_path(fulltext_dirname, prefix, identifier, 'partial')))
+        except ValueError:
+            pass  # reported by save_stream
+    conditional_session = ConditionalSession(session, existing_files, partials)
 
     def save_stream(stream, path):
-        """Save a stream to fulltext_dirname/prefix/identifier/path
+        """Save a stream to prefix/identifier/path in the storage backend
 
         There might be several files connected to a DOI, each to be saved under
         a different filename. The actual getter function only provides the
@@ -56,22 +155,474 @@ def get_fulltext(prefixed_identifier, config):
                         collisions with other identifiers or break out of the
                         libfulltext directory.
         """
+        destination_path = _destination_path(fulltext_dirname, prefix, identifier, path)
+        relative_path = os.path.relpath(destination_path, fulltext_dirname)
+
+        unchanged = conditional_session.not_modified(stream)
+        if unchanged is not None:
+            saved_files[relative_path] = unchanged
+            return
+
+        # Only the time spent writing counts, not the time waiting for data
+        write_seconds = 0.
+        with backend.writer(relative_path, resume=conditional_session.resumed(stream),
+                            validator=pdf_validator(stream.headers, config)) as writer:
+            try:
+                for chunk in iter_resumable(stream, session, writer.size, chunk_size,
+                                            resume_retries):
+                    start = time.perf_counter()
+                    writer.write(chunk)
+                    write_seconds += time.perf_counter() - start
+            except RESUMABLE_ERRORS:
+                validator = resume_validator(stream)
+                if resume_retries > 0 and validator is not None and backend.local:
+                    # The next retrieval of the identifier continues the file
+                    writer.keep()
+                    write_partial_info(writer.partial_filename,
+                                       conditional_session.validators(stream)['url'],
+                                       validator)
+                raise
+            # Integrity check of the (possibly resumed) download
+            _verify_size(stream, writer.size)
+            start = time.perf_counter()
+            saved = writer.commit()
+            if backend.local:
+                remove_partial_info(writer.partial_filename)
+        if store is not None:
+            store.add(prefixed_identifier, path, destination_path, saved)
+        if extraction is not None and stream.headers.get('Content-Type') == PDF_TYPE:
+            extraction.submit(destination_path)
+        if metrics is not None:
+            metrics.emit('save', write_seconds + time.perf_counter() - start,
+                         size=saved['size'])
+        saved.update(conditional_session.validators(stream))
+        saved_files[relative_path] = saved
+
+    def retrieve():
+        """Retrieve the fulltext and record the outcome in the manifest"""
+        try:
+            result = fulltext_getter(identifier, save_stream, config,
+                                     conditional_session, cache)
+        except Exception as error:
+            if manifest is not None:
+                manifest.record(prefixed_identifier, STATUS_FAILED, error=str(error))
+            raise
+        if manifest is not None:
+            manifest.record(prefixed_identifier, STATUS_COMPLETE, files=saved_files)
+        return result
+
+    if metrics is None:
+        return retrieve()
+    with metrics.instrumented(session), metrics.track(prefixed_identifier):
+        return retrieve()
+
+
+async def get_fulltext_async(prefixed_identifier, config,  # pylint: disable=R0913
+                             session=None, cache=None, store=None, extraction=None,
+                             backend=None):
+    """Get fulltext for a prefixed ID (asyncio variant of get_fulltext)
+
+    Many retrievals can share one event loop, e.g. by gathering several
+    get_fulltext_async calls which use the same session.
+
+    Args:
+        prefixed_identifier:  article identifier with prefix
+                              (e.g. "doi:10.1016/j.cortex.2015.10.021")
+        config:               configuration dictionary
+                              (see config.py and README.md)
+        session:              aiohttp.ClientSession used for all requests
+                              (default: a new session from create_aiohttp_session)
+        cache:                MetadataCache for registration agencies and
+                              publisher metadata (default: the one opened by
+                              open_metadata_cache if the configuration has a
+                              "cache" section, otherwise not cached)
+        store:                FulltextStore in which the saved files are kept
+                              (default: the one opened by open_fulltext_store)
+        extraction:           ExtractionPool to which saved PDFs are submitted
+                              (default: the one opened by open_extraction_pool)
+        backend:              storage backend to which the files are written
+                              (default: the one opened by open_storage_backend,
+                              uploads to S3 block the event loop)
+
+    Raises:
+        ValueError: Prefix is not implemented or not provided by caller,
+                    or the store or the extraction is used with a storage
+                    backend without local files
+    Returns:
+        What the actual getter (e.g. get_elsevier_fulltext_async) returns
+        (usually None)
+    """
+    if ":" not in prefixed_identifier:
+        raise ValueError('No prefix provided')
+
+    prefix, identifier = prefixed_identifier.split(':', 1)
+    fulltext_getter = load(get_prefix_handler(prefix, config), 'getter_async')
+    if fulltext_getter is None:
+        raise ValueError('Prefix {0} has no asyncio handler.'.format(prefix))
+
+    if session is None:
+        async with create_aiohttp_session(config) as own_session:
+            return await get_fulltext_async(prefixed_identifier, config, own_session,
+                                            cache, store, extraction, backend)
+    if cache is None and "cache" in config:
+        with open_metadata_cache(config) as own_cache:
+            return await get_fulltext_async(prefixed_identifier, config, session,
+                                            own_cache, store, extraction, backend)
+    if store is None:
+        own_store = open_fulltext_store(config)
+        if own_store is not None:
+            with own_store:
+                return await get_fulltext_async(prefixed_identifier, config, session,
+                                                cache, own_store, extraction, backend)
+    if extraction is None:
+        own_extraction = open_extraction_pool(config)
+        if own_extraction is not None:
+            with own_extraction:
+                return await get_fulltext_async(prefixed_identifier, config, session,
+                                                cache, store, own_extraction, backend)
+    if backend is None:
+        backend = open_storage_backend(config)
+    _verify_local(backend, store, extraction)
+
+    fulltext_dirname = os.path.abspath(config["storage"]["fulltext"])
+    chunk_size = config["storage"].get("chunk_size", DEFAULT_CHUNK_SIZE)
+
+    async def save_stream(stream, path):
+        """Save an aiohttp response stream to prefix/identifier/path in the backend
+
+        Args:
+            stream: the aiohttp response whose body will be stored
+            path:   the filename in the pre-configured directory to which the stream
+                    should get saved
+
+        Raises:
+            ValueError: Malicious parts in the identifier or path
+                        (see save_stream in get_fulltext)
+        """
+        destination_path = _destination_path(fulltext_dirname, prefix, identifier, path)
+        relative_path = os.path.relpath(destination_path, fulltext_dirname)
+
+        with backend.writer(relative_path,
+                            validator=pdf_validator(stream.headers, config)) as writer:
+            async for chunk in stream.content.iter_chunked(chunk_size):
+                writer.write(chunk)
+            saved = writer.commit()
+        if store is not None:
+            store.add(prefixed_identifier, path, destination_path, saved)
+        if extraction is not None and stream.headers.get('Content-Type') == PDF_TYPE:
+            extraction.submit(destination_path)
+
+    return await fulltext_getter(identifier, save_stream, config, session, cache)
+
+
+def get_fulltexts(prefixed_identifiers, config, workers=1,  # pylint: disable=R0913
+                  session=None, cache=None, manifest=None, skip_existing=False,
+                  store=None, metrics=None, extraction=None, backend=None,
+                  breakers=None):
+    """Get fulltexts for many prefixed IDs on a bounded pool of worker threads
+
+    Identifiers are consumed lazily from the iterable, such that at most
+    2 * workers retrievals are queued or running at any time. A failing
+    retrieval does not abort the batch, the exception is reported in the
+    corresponding result instead. All workers share one session, whose
+    connection pools ("pool_maxsize" in the "http" configuration) should
+    hold at least as many connections as there are workers.
+
+    The outcome of every retrieval is recorded in the manifest. Identifiers
+    which the manifest lists as complete can be skipped, which allows to
+    resume interrupted runs.
+
+    Unless disabled in the "routing" configuration, identifiers are read
+    ahead in batches whose metadata is prefetched with few requests by the
+    prefetchers of the handlers (see registry.py).
+
+    With circuit breakers (see breaker.py), identifiers of publishers whose
+    breaker is open are deferred: they are neither retrieved nor recorded
+    in the manifest, such that a later pass retrieves them.
+
+    Args:
+        prefixed_identifiers: iterable of article identifiers with prefix
+        config:               configuration dictionary
+                              (see config.py and README.md)
+        workers:              number of concurrent retrievals
+        session:              requests.Session used for all requests
+                              (default: a new session from create_session)
+        cache:                MetadataCache shared by all retrievals
+                              (default: the one opened by open_metadata_cache)
+        manifest:             Manifest recording the outcome of all retrievals
+                              (default: the one opened by open_manifest)
+        skip_existing:        skip identifiers which are complete according to
+                              the manifest (without any request)
+        store:                FulltextStore shared by all retrievals
+                              (default: the one opened by open_fulltext_store)
+        metrics:              Metrics recording the stages of all retrievals
+                              (default: not recorded)
+        extraction:           ExtractionPool shared by all retrievals
+                              (default: the one opened by open_extraction_pool)
+        backend:              storage backend shared by all retrievals
+                              (default: the one opened by open_storage_backend)
+        breakers:             CircuitBreakers of the publishers
+                              (default: the ones created by open_circuit_breakers)
+
+    Raises:
+        ValueError: number of workers is smaller than 1, or the store or the
+                    extraction is used with a storage backend without local
+                    files
+    Yields:
+        FulltextResult for each identifier, in order of completion
+    """
+    if workers < 1:
+        raise ValueError('At least one worker is required, got {0}.'.format(workers))
+
+    if session is None:
+        with create_session(config) as own_session:
+            yield from get_fulltexts(prefixed_identifiers, config, workers,
+                                     own_session, cache, manifest, skip_existing,
+                                     store, metrics, extraction, backend, breakers)
+        return
+    if cache is None:
+        with open_metadata_cache(config) as own_cache:
+            yield from get_fulltexts(prefixed_identifiers, config, workers,
+                                     session, own_cache, manifest, skip_existing,
+                                     store, metrics, extraction, backend, breakers)
+        return
+    if backend is None:
+        backend = open_storage_backend(config)
+    _verify_local(backend, store, extraction)
+    if breakers is None:
+        breakers = open_circuit_breakers(config)
+    if manifest is None:
+        with open_manifest(config, backend) as own_manifest:
+            yield from get_fulltexts(prefixed_identifiers, config, workers,
+                                     session, cache, own_manifest, skip_existing,
+                                     store, metrics, extraction, backend, breakers)
+        return
+    if store is None:
+        own_store = open_fulltext_store(config)
+        if own_store is not None:
+            with own_store:
+                yield from get_fulltexts(prefixed_identifiers, config, workers,
+                                         session, cache, manifest, skip_existing,
+                                         own_store, metrics, extraction, backend,
+                                         breakers)
+            return
+    if extraction is None:
+        own_extraction = open_extraction_pool(config)
+        if own_extraction is not None:
+            with own_extraction:
+                yield from get_fulltexts(prefixed_identifiers, config, workers,
+                                         session, cache, manifest, skip_existing,
+                                         store, metrics, own_extraction, backend,
+                                         breakers)
+            return
+
+    # With skip_existing, the manifest is checked once per identifier: by the
+    # prefetching, which keeps the outcome until the identifier is dispatched
+    # (the checks might be requests to the storage backend), or else right
+    # before the dispatch
+    completed = dict()
+
+    def is_complete(prfid):
+        """Check the manifest for an identifier about to be dispatched"""
+        if prfid not in completed:
+            completed[prfid] = manifest.is_complete(prfid)
+        return completed[prfid]
+
+    identifiers = _prefetched(prefixed_identifiers, config, session, cache,
+                              is_complete if skip_existing else None, metrics)
+    exhausted = False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = dict()
+        try:
+            while True:
+                # Queue further identifiers, skipped ones are reported right away
+                while not exhausted and len(pending) < 2 * workers:
+                    prfid = next(identifiers, None)
+                    if prfid is None:
+                        exhausted = True
+                        continue
+                    if skip_existing and (completed.pop(prfid) if prfid in completed
+                                          else manifest.is_complete(prfid)):
+                        yield FulltextResult(prfid, STATUS_SKIPPED, None, None)
+                        continue
+                    publisher = None
+                    if breakers is not None:
+                        publisher = publisher_of(prfid, config, cache)
+                        if not breakers.allow(publisher):
+                            yield FulltextResult(prfid, STATUS_DEFERRED, None, None)
+                            continue
+                    future = executor.submit(get_fulltext, prfid, config, session,
+                                             cache, manifest, store, metrics,
+                                             extraction, backend)
+                    pending[future] = prfid, publisher
+
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    (prfid, publisher), error = pending.pop(future), future.exception()
+                    if breakers is not None:
+                        # The outcome counts for the publisher the retrieval was
+                        # allowed for (e.g. as probe), if unknown then for the one
+                        # known after the retrieval
+                        if publisher is None:
+                            publisher = publisher_of(prfid, config, cache)
+                        breakers.record(publisher, error)
+                    reason = error.reason if isinstance(error, InvalidPDFError) else None
+                    yield FulltextResult(prfid,
+                                         STATUS_FAILED if error else STATUS_COMPLETE,
+                                         error, reason)
+        finally:
+            # Do not start queued retrievals if the caller stops consuming
+            for future in pending:
+                future.cancel()
 
-        destination_path = os.path.join(fulltext_dirname, prefix, identifier, path)
 
-        if not os.path.abspath(destination_path).startswith(fulltext_dirname):
-            raise ValueError('Destination path {0} not in {1}'
-                             .format(destination_path, fulltext_dirname))
+def unique_identifiers(prefixed_identifiers, window=DEFAULT_DEDUP_WINDOW):
+    """Lazily drop blank lines and duplicates from a stream of identifiers
+
+    Identifiers are stripped and compared in their normalised form (DOIs
+    are case-insensitive, see normalise_identifier), the first occurrence
+    is kept as is. Only the most recent distinct identifiers are remembered,
+    such that the memory stays bounded for arbitrarily long streams:
+    duplicates further apart are passed on, to be skipped by get_fulltexts
+    with skip_existing (or retrieved conditionally, see conditional.py).
+
+    Args:
+        prefixed_identifiers: iterable of article identifiers with prefix
+                              (e.g. the lines of a file)
+        window:               number of distinct identifiers remembered
+
+    Yields:
+        the non-empty identifiers in order of appearance, without duplicates
+        among the last window distinct ones
+    """
+    recent = collections.OrderedDict()
+    for prfid in prefixed_identifiers:
+        prfid = prfid.strip()
+        if not prfid:
+            continue
+        normalised = normalise_identifier(prfid)
+        if normalised in recent:
+            recent.move_to_end(normalised)
+            continue
+        recent[normalised] = None
+        if len(recent) > window:
+            recent.popitem(last=False)
+        yield prfid
+
+
+def _prefetched(prefixed_identifiers, config, session, cache,  # pylint: disable=R0913
+                exclude=None, metrics=None):
+    """Iterate over identifiers while prefetching their metadata in batches
+
+    Args:
+        prefixed_identifiers: iterable of article identifiers with prefix
+        config:               configuration dictionary
+        session:              requests.Session used for prefetching
+        cache:                MetadataCache filled by the prefetchers
+        exclude:              function returning True for identifiers whose
+                              metadata is not needed (default: none excluded)
+        metrics:              Metrics recording the prefetch requests
+                              (default: not recorded)
+
+    Returns:
+        iterator over prefixed_identifiers
+    """
+    batch_size = config.get("routing", {}).get("prefetch", 100)
+    identifiers = iter(prefixed_identifiers)
+    if not batch_size:
+        return identifiers
+    return itertools.chain.from_iterable(
+        _prefetch_batch(batch, config, session, cache, exclude, metrics)
+        for batch in iter(lambda: list(itertools.islice(identifiers, batch_size)), [])
+    )
+
+
+def _prefetch_batch(prefixed_identifiers, config, session, cache,  # pylint: disable=R0913
+                    exclude, metrics):
+    """Prefetch the metadata of a batch of identifiers (see _prefetched)
+
+    Returns:
+        prefixed_identifiers
+    """
+    by_prefix = collections.defaultdict(list)
+    for prfid in prefixed_identifiers:
+        prefix, _, identifier = prfid.partition(':')
+        if exclude is None or not exclude(prfid):
+            by_prefix[prefix].append(identifier)
+    for prefix, identifiers in by_prefix.items():
+        try:
+            prefetcher = load(get_prefix_handler(prefix, config), 'prefetcher')
+        except ValueError:
+            # Unknown prefixes are reported by get_fulltext
+            continue
+        if prefetcher is None:
+            continue
+        if metrics is None:
+            prefetcher(identifiers, config, session, cache)
+        else:
+            with metrics.instrumented(session):
+                prefetcher(identifiers, config, session, cache)
+    return prefixed_identifiers
+
+
+def _verify_size(response, size):
+    """Raise ChunkedEncodingError if a download is smaller or larger than announced
+
+    Args:
+        response: requests.Response of the download
+        size:     size of the downloaded file
+    """
+    expected_size = content_range(response)[1]
+    if expected_size is not None and size != expected_size:
+        raise requests.exceptions.ChunkedEncodingError(
+            'Downloaded {0} bytes of {1}, expected {2}.'
+            .format(size, response.url, expected_size))
+
+
+def _verify_local(backend, store, extraction):
+    """Raise ValueError if the store or the extraction is used with a
+    storage backend without local files
+
+    Args:
+        backend:    storage backend
+        store:      FulltextStore or None
+        extraction: ExtractionPool or None
+    """
+    if not backend.local and (store is not None or extraction is not None):
+        raise ValueError('The fulltext store and the text extraction require '
+                         'the local storage backend.')
+
+
+def _destination_path(fulltext_dirname, prefix, identifier, path):
+    """Sanitised path of the file path connected to prefix:identifier
+
+    Args:
+        fulltext_dirname: absolute path of the fulltext storage directory
+        prefix:           identifier prefix (e.g. "doi")
+        identifier:       identifier without prefix
+        path:             filename provided by the getter function
+
+    Raises:
+        ValueError: Malicious parts in the identifier or path can cause
+                    collisions with other identifiers or break out of the
+                    libfulltext directory.
+    Returns:
+        fulltext_dirname/prefix/identifier/path
+    """
+    destination_path = os.path.join(fulltext_dirname, prefix, identifier, path)
 
-        # .. or . in paths can lead to collisions
-        path_elements = destination_path.split('/')
-        if '..' in path_elements or '.' in path_elements:
-            raise ValueError('Destination path {0} contains ".." or ".".'
-                             .format(destination_path))
+    if not os.path.abspath(destination_path).startswith(fulltext_dirname):
+        raise ValueError('Destination path {0} not in {1}'
+                         .format(destination_path, fulltext_dirname))
 
-        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-        with open(destination_path, 'wb') as file:
-            for chunk in stream.iter_content(chunk_size=128):
-                file.write(chunk)
+    # .. or . in paths can lead to collisions
+    path_elements = destination_path.split('/')
+    if '..' in path_elements or '.' in path_elements:
+        raise ValueError('Destination path {0} contains ".." or ".".'
+                         .format(destination_path))
 
-    return fulltext_getter(identifier, save_stream, config)
+    return destination_path
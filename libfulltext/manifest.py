@@ -0,0 +1,169 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Download manifest module
+
+The manifest records the outcome of every retrieval in the fulltext
+storage, such that interrupted runs can be resumed by skipping the
+identifiers which are already complete.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .backend import LocalBackend, open_storage_backend
+from .store import normalise_identifier
+
+# Statuses of an identifier in the manifest
+STATUS_COMPLETE = 'complete'
+STATUS_FAILED = 'failed'
+
+# Name of the manifest file in the fulltext storage directory
+MANIFEST_FILENAME = 'manifest.sqlite'
+
+# Seconds to wait for another process holding the lock on the manifest,
+# e.g. nodes sharing the fulltext storage (see workqueue.py)
+LOCK_TIMEOUT = 60
+
+
+class Manifest:
+    """Record of the retrieval status of prefixed identifiers
+
+    For each identifier the status, the time of the last retrieval, the
+    error (if failed) and the size and SHA1 and SHA256 hashes of every saved
+    file are recorded, as well as the URL it was downloaded from and its
+    validators for conditional requests (see conditional.py). Identifiers
+    are recorded in their normalised form (DOIs are case-insensitive, see
+    normalise_identifier). The manifest
+    may be shared between threads.
+    """
+
+    def __init__(self, path, root, backend=None):
+        """Open or create a manifest
+
+        Args:
+            path:    SQLite database file
+            root:    directory to which the paths of the saved files are relative
+            backend: storage backend holding the saved files
+                     (default: LocalBackend of root)
+        """
+        self.root = root
+        self.backend = LocalBackend(root) if backend is None else backend
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT,
+                                           check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'identifier TEXT PRIMARY KEY, status TEXT, timestamp REAL, '
+                'error TEXT, files TEXT)'
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._connection.close()
+
+    def get(self, identifier):
+        """Get the manifest entry of an identifier
+
+        Args:
+            identifier: prefixed identifier
+
+        Returns:
+            dict with status, timestamp, error and files (dict mapping the
+            paths relative to root to dicts with size, sha1 and sha256)
+            or None if the identifier is not in the manifest
+        """
+        # Entries recorded before identifiers were normalised are keyed as given
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, timestamp, error, files FROM entries '
+                'WHERE identifier IN (?, ?) ORDER BY timestamp DESC',
+                (normalise_identifier(identifier), identifier)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'status': row[0], 'timestamp': row[1], 'error': row[2],
+                'files': json.loads(row[3])}
+
+    def record(self, identifier, status, files=None, error=None):
+        """Record the outcome of a retrieval
+
+        Args:
+            identifier: prefixed identifier
+            status:     STATUS_COMPLETE or STATUS_FAILED
+            files:      dict mapping paths relative to root to dicts with
+                        size, sha1 and sha256 of the saved files
+            error:      error message of a failed retrieval
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                (normalise_identifier(identifier), status, time.time(), error,
+                 json.dumps(files or {}))
+            )
+
+    def is_complete(self, identifier):
+        """Check whether an identifier has been retrieved completely
+
+        Args:
+            identifier: prefixed identifier
+
+        Returns:
+            True if the last retrieval was successful and all saved files
+            still exist with the recorded size
+        """
+        entry = self.get(identifier)
+        if entry is None or entry['status'] != STATUS_COMPLETE:
+            return False
+        return all(self._exists(path, saved) for path, saved in entry['files'].items())
+
+    def existing_files(self, identifier):
+        """Get the files of the last successful retrieval which still exist
+
+        Args:
+            identifier: prefixed identifier
+
+        Returns:
+            dict mapping paths relative to root to the recorded dicts (with
+            size, hashes and possibly url and validators) of those files
+            which exist with the recorded size
+        """
+        entry = self.get(identifier)
+        if entry is None or entry['status'] != STATUS_COMPLETE:
+            return {}
+        return {path: saved for path, saved in entry['files'].items()
+                if self._exists(path, saved)}
+
+    def _exists(self, path, saved):
+        """Check whether a saved file exists with the recorded size"""
+        return self.backend.size(path) == saved['size']
+
+
+def open_manifest(config, backend=None):
+    """Open the manifest of the configured fulltext storage
+
+    The manifest itself is always kept in the local fulltext storage
+    directory, also if the files are saved to another storage backend.
+
+    Args:
+        config:  configuration dictionary (see config.py)
+        backend: storage backend holding the saved files
+                 (default: the one opened by open_storage_backend)
+
+    Returns:
+        Manifest stored in the fulltext storage directory
+    """
+    root = os.path.abspath(config["storage"]["fulltext"])
+    os.makedirs(root, exist_ok=True)
+    if backend is None:
+        backend = open_storage_backend(config)
+    return Manifest(os.path.join(root, MANIFEST_FILENAME), root, backend)
@@ -0,0 +1,276 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Metrics module
+
+Records latency, bytes, HTTP status and outcome of each stage of every
+retrieval and passes them as MetricsEvent to pluggable sinks. The stages
+are the registration agency lookup ("doiRA"), the CrossRef metadata
+request ("crossref"), the publisher request (named after the publisher),
+saving the files ("save") and the whole retrieval ("fulltext").
+
+HTTP stages are recorded by a response hook of the requests session,
+hence the publisher getters need no instrumentation of their own.
+"""
+
+import collections
+import contextlib
+import importlib
+import json
+import os
+import threading
+import time
+
+# A measurement of one stage of the retrieval of an identifier
+#   identifier: prefixed identifier
+#   stage:      "doiRA", "crossref", a publisher, "save" or "fulltext"
+#   seconds:    duration of the stage
+#   bytes:      bytes transferred or saved (None if unknown)
+#   status:     HTTP status code (None for stages without request)
+#   outcome:    "complete" or "failed"
+#   publisher:  publisher the identifier was routed to (None if unknown)
+MetricsEvent = collections.namedtuple('MetricsEvent', [
+    'identifier', 'stage', 'seconds', 'bytes', 'status', 'outcome', 'publisher',
+])
+
+# Outcomes of a stage
+OUTCOME_COMPLETE = 'complete'
+OUTCOME_FAILED = 'failed'
+
+# Publisher recorded for retrievals which failed before a publisher request
+UNKNOWN_PUBLISHER = 'unknown'
+
+
+class Metrics:
+    """Collector passing MetricsEvent objects to sinks
+
+    A sink is a function taking a MetricsEvent (e.g. Counters or
+    JsonLinesSink objects). The collector may be shared between threads,
+    each thread tracks the identifier it currently retrieves.
+    """
+
+    def __init__(self, sinks=()):
+        """Create a collector
+
+        Args:
+            sinks: functions to which all events are passed
+        """
+        self.sinks = list(sinks)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Number of active instrumented contexts per session, the response
+        # hook stays installed until the last one of all threads exits
+        self._instrumented = collections.Counter()
+        self._instrumented_lock = threading.Lock()
+        # URL prefixes of the stages, resolved when the hook is installed
+        self._stage_prefixes = None
+
+    def emit(self, stage, seconds, size=None, status=None, outcome=OUTCOME_COMPLETE):
+        """Record a stage of the identifier tracked by the current thread
+
+        Args:
+            stage:   name of the stage
+            seconds: duration of the stage
+            size:    bytes transferred or saved
+            status:  HTTP status code
+            outcome: OUTCOME_COMPLETE or OUTCOME_FAILED
+        """
+        event = MetricsEvent(getattr(self._local, 'identifier', None), stage, seconds,
+                             size, status, outcome,
+                             getattr(self._local, 'publisher', None))
+        with self._lock:
+            for sink in self.sinks:
+                sink(event)
+
+    @contextlib.contextmanager
+    def track(self, identifier):
+        """Track the retrieval of an identifier in the current thread
+
+        The whole retrieval is recorded as "fulltext" stage, failed if an
+        exception is raised.
+
+        Args:
+            identifier: prefixed identifier
+        """
+        self._local.identifier = identifier
+        self._local.publisher = None
+        start = time.perf_counter()
+        outcome = OUTCOME_FAILED
+        try:
+            yield
+            outcome = OUTCOME_COMPLETE
+        finally:
+            if self._local.publisher is None:
+                self._local.publisher = UNKNOWN_PUBLISHER
+            self.emit('fulltext', time.perf_counter() - start, outcome=outcome)
+            self._local.identifier = None
+            self._local.publisher = None
+
+    @contextlib.contextmanager
+    def instrumented(self, session):
+        """Record the requests of a session while in the context
+
+        The context may be entered by several threads sharing the session
+        at once, the requests of each are attributed to the identifier it
+        tracks.
+
+        Args:
+            session: requests.Session whose responses are recorded
+        """
+        with self._instrumented_lock:
+            if not self._instrumented:
+                self._stage_prefixes = stage_prefixes()
+            if not self._instrumented[session]:
+                session.hooks['response'].append(self.response_hook)
+            self._instrumented[session] += 1
+        try:
+            yield
+        finally:
+            with self._instrumented_lock:
+                self._instrumented[session] -= 1
+                if not self._instrumented[session]:
+                    del self._instrumented[session]
+                    session.hooks['response'].remove(self.response_hook)
+
+    def response_hook(self, response, *args, **kwargs):  # pylint: disable=unused-argument
+        """requests response hook recording the stage of the request"""
+        stage = request_stage(response.url, self._stage_prefixes)
+        if stage in PUBLISHER_URLS:
+            self._local.publisher = stage
+        size = response.headers.get('Content-Length')
+        self.emit(stage, response.elapsed.total_seconds(),
+                  size=None if size is None else int(size),
+                  status=response.status_code,
+                  outcome=OUTCOME_COMPLETE if response.ok else OUTCOME_FAILED)
+
+
+def _url_prefix(template):
+    """Constant part of an endpoint URL template"""
+    return template.split('{', 1)[0]
+
+
+# Modules and names of the endpoint URLs of the stages, looked up once per
+# instrumentation as the URLs may be patched (and the modules are only
+# imported once requests are sent)
+STAGE_URLS = collections.OrderedDict([
+    ('doiRA', ('libfulltext.doi', 'DOIRA_URL')),
+    ('crossref', ('libfulltext.doi.crossref', 'CROSSREF_WORKS_QUERY_URL')),
+])
+PUBLISHER_URLS = {
+    'aps': ('libfulltext.doi.crossref.aps', 'APS_FULLTEXT_URL'),
+    'elsevier': ('libfulltext.doi.crossref.elsevier', 'ELSEVIER_FULLTEXT_URL'),
+    'springer': ('libfulltext.doi.crossref.springer', 'SPRINGER_FULLTEXT_URL'),
+}
+
+
+def stage_prefixes():
+    """Constant parts of the current endpoint URLs of the stages
+
+    Returns:
+        list of pairs of stage and URL prefix, in the order to be matched
+    """
+    return [(stage, _url_prefix(getattr(importlib.import_module(module), name)))
+            for stage, (module, name)
+            in list(STAGE_URLS.items()) + list(PUBLISHER_URLS.items())]
+
+
+def request_stage(url, prefixes=None):
+    """Stage of a request by its URL
+
+    Args:
+        url:      requested URL
+        prefixes: pairs of stage and URL prefix (default: the current ones
+                  returned by stage_prefixes)
+
+    Returns:
+        "doiRA", "crossref", the publisher or "other"
+    """
+    for stage, prefix in stage_prefixes() if prefixes is None else prefixes:
+        if url.startswith(prefix):
+            return stage
+    return 'other'
+
+
+class Counters:
+    """Sink aggregating events in process
+
+    Per stage, the number of events, failures, seconds and bytes are
+    summed up, and per publisher the outcomes of the retrievals.
+    """
+
+    def __init__(self):
+        self.stages = collections.defaultdict(
+            lambda: {'count': 0, 'failed': 0, 'seconds': 0., 'bytes': 0})
+        self.publishers = collections.defaultdict(
+            lambda: {OUTCOME_COMPLETE: 0, OUTCOME_FAILED: 0, 'bytes': 0})
+        self.start = time.time()
+
+    def __call__(self, event):
+        stage = self.stages[event.stage]
+        stage['count'] += 1
+        stage['failed'] += event.outcome == OUTCOME_FAILED
+        stage['seconds'] += event.seconds
+        stage['bytes'] += event.bytes or 0
+        if event.stage == 'fulltext':
+            self.publishers[event.publisher][event.outcome] += 1
+        elif event.stage == 'save':
+            self.publishers[event.publisher]['bytes'] += event.bytes or 0
+
+    def summary(self):
+        """Human-readable summary of throughput and outcomes per publisher
+
+        Returns:
+            multi-line string
+        """
+        seconds = time.time() - self.start
+        retrievals = self.stages.get('fulltext', {}).get('count', 0)
+        lines = ['{0} retrievals in {1:.1f} s ({2:.2f}/s)'.format(
+            retrievals, seconds, retrievals / seconds if seconds else 0.)]
+        for publisher, outcomes in sorted(self.publishers.items()):
+            lines.append('{0}: {1} complete, {2} failed, {3} bytes'.format(
+                publisher, outcomes[OUTCOME_COMPLETE], outcomes[OUTCOME_FAILED],
+                outcomes['bytes']))
+        return '\n'.join(lines)
+
+    def write_prometheus(self, filename):
+        """Write the counters in the Prometheus text format
+
+        The file is replaced atomically, such that it can be read by the
+        node exporter's textfile collector at any time.
+
+        Args:
+            filename: file to be written
+        """
+        lines = []
+        for name, field, kind in [
+                ('libfulltext_stage_total', 'count', 'counter'),
+                ('libfulltext_stage_failed_total', 'failed', 'counter'),
+                ('libfulltext_stage_seconds_total', 'seconds', 'counter'),
+                ('libfulltext_stage_bytes_total', 'bytes', 'counter')]:
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            for stage, values in sorted(self.stages.items()):
+                lines.append('{0}{{stage="{1}"}} {2}'.format(name, stage, values[field]))
+        lines.append('# TYPE libfulltext_fulltexts_total counter')
+        for publisher, outcomes in sorted(self.publishers.items()):
+            for outcome in (OUTCOME_COMPLETE, OUTCOME_FAILED):
+                lines.append('libfulltext_fulltexts_total'
+                             '{{publisher="{0}",outcome="{1}"}} {2}'
+                             .format(publisher, outcome, outcomes[outcome]))
+
+        with open(filename + '.part', 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(filename + '.part', filename)
+
+
+class JsonLinesSink:
+    """Sink writing every event as a JSON object on a line of a stream"""
+
+    def __init__(self, stream):
+        """Create sink
+
+        Args:
+            stream: writable text stream
+        """
+        self.stream = stream
+
+    def __call__(self, event):
+        self.stream.write(json.dumps(event._asdict()) + '\n')
+        self.stream.flush()
@@ -0,0 +1,161 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""PDF validation module
+
+Downloaded PDFs are checked while they are written (see AtomicFileWriter):
+the %PDF header has to appear within the first bytes, the %%EOF trailer
+within the last ones, and the number of pages is estimated from the page
+objects and page tree counts passing by. Only these windows are kept in
+memory, the body is neither buffered nor read again. A download which is
+not a PDF at all (e.g. an HTML error page) is aborted as soon as its first
+bytes are known.
+"""
+
+import re
+
+# Defaults for the "validation" section of the configuration (see doc/config.md)
+DEFAULT_VALIDATION_CONFIG = {
+    # Validate responses with Content-Type application/pdf
+    "pdf": True,
+    # Also reject PDFs without %%EOF trailer (otherwise only reported)
+    "strict": False,
+    # Minimal number of pages, if the number of pages can be estimated
+    # (0: no minimum)
+    "min_pages": 0,
+}
+
+# Reason codes of the validation results
+REASON_OK = 'ok'
+REASON_EMPTY = 'empty'
+REASON_HTML = 'html'
+REASON_NOT_PDF = 'not_pdf'
+REASON_NO_EOF = 'no_eof'
+REASON_TOO_FEW_PAGES = 'too_few_pages'
+
+# The header has to start within the first bytes, the trailer within the
+# last ones (as accepted by common PDF readers)
+HEAD_WINDOW = 1024
+TAIL_WINDOW = 1024
+
+PDF_MAGIC = b'%PDF'
+PDF_EOF = b'%%EOF'
+
+_PAGE_OBJECT = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+_PAGE_COUNT = re.compile(rb'/Count\s+(\d+)')
+# Bytes of the previous chunk searched again for matches across chunk borders
+_OVERLAP = 32
+
+
+class InvalidPDFError(ValueError):
+    """A download is not a (complete) PDF
+
+    The reason attribute holds the reason code (e.g. REASON_HTML).
+    """
+
+    def __init__(self, reason, message):
+        self.reason = reason
+        super().__init__('Invalid PDF ({0}): {1}'.format(reason, message))
+
+
+class PDFValidator:
+    """Incremental validator of a PDF which is fed chunk by chunk"""
+
+    def __init__(self, strict=False, min_pages=0):
+        """Create validator
+
+        Args:
+            strict:    reject PDFs without trailer, otherwise this is only
+                       reported
+            min_pages: minimal number of pages (0: no minimum)
+        """
+        self.strict = strict
+        self.min_pages = min_pages
+        self.size = 0
+        self._head = b''
+        self._tail = b''
+        self._page_objects = 0
+        self._page_count = 0
+
+    def feed(self, chunk):
+        """Validate the next chunk of the PDF
+
+        Args:
+            chunk: bytes following the ones fed before
+
+        Raises:
+            InvalidPDFError: the first bytes do not start a PDF
+        """
+        if len(self._head) < HEAD_WINDOW:
+            self._head += chunk[:HEAD_WINDOW - len(self._head)]
+            if len(self._head) == HEAD_WINDOW:
+                self._check_head()
+
+        overlap = self._tail[-_OVERLAP:]
+        window = overlap + chunk
+        self._page_objects += sum(1 for match in _PAGE_OBJECT.finditer(window)
+                                  if match.end() > len(overlap))
+        for match in _PAGE_COUNT.finditer(window):
+            self._page_count = max(self._page_count, int(match.group(1)))
+
+        self._tail = (self._tail + chunk[-TAIL_WINDOW:])[-TAIL_WINDOW:]
+        self.size += len(chunk)
+
+    @property
+    def pages(self):
+        """Estimated number of pages (None: unknown)
+
+        Page objects in compressed object streams are not visible, hence
+        the estimate may be too low or unknown.
+        """
+        return max(self._page_objects, self._page_count) or None
+
+    def finish(self):
+        """Validate the complete PDF
+
+        Raises:
+            InvalidPDFError: the PDF is rejected
+        Returns:
+            dict with the reason code (validation) and, if known, the
+            estimated number of pages (pages)
+        """
+        if self.size == 0:
+            raise InvalidPDFError(REASON_EMPTY, 'no data')
+        if len(self._head) < HEAD_WINDOW:
+            self._check_head()
+
+        reason = REASON_OK
+        if PDF_EOF not in self._tail:
+            reason = REASON_NO_EOF
+        elif self.pages is not None and self.pages < self.min_pages:
+            reason = REASON_TOO_FEW_PAGES
+        if reason == REASON_TOO_FEW_PAGES or (self.strict and reason == REASON_NO_EOF):
+            raise InvalidPDFError(reason, '{0} bytes, {1} pages'.format(self.size,
+                                                                        self.pages))
+
+        result = {'validation': reason}
+        if self.pages is not None:
+            result['pages'] = self.pages
+        return result
+
+    def _check_head(self):
+        """Raise InvalidPDFError unless the head contains the PDF header"""
+        if PDF_MAGIC in self._head:
+            return
+        reason = REASON_HTML if self._head.lstrip()[:1] == b'<' else REASON_NOT_PDF
+        raise InvalidPDFError(reason, 'starts with {0!r}'.format(self._head[:32]))
+
+
+def pdf_validator(headers, config):
+    """Create the validator of a download, if it is to be validated
+
+    Args:
+        headers: response headers of the download
+        config:  configuration dictionary, whose optional "validation"
+                 section holds the settings (see DEFAULT_VALIDATION_CONFIG)
+
+    Returns:
+        PDFValidator or None if the download is not validated
+    """
+    settings = dict(DEFAULT_VALIDATION_CONFIG, **config.get("validation", {}))
+    if not settings["pdf"] or headers.get('Content-Type') != 'application/pdf':
+        return None
+    return PDFValidator(settings["strict"], settings["min_pages"])
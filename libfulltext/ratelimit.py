@@ -0,0 +1,120 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Rate limiting module
+
+Requests to each host pass a token bucket, such that a configured request
+rate is never exceeded. Throttled requests (429 and 503 responses) pause all
+requests to the host for the time given in the Retry-After header or an
+exponential backoff with jitter, and are then retried
+(see RateLimitedHTTPAdapter in session.py).
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+# Defaults for the "rate_limit" sections of the configuration (see doc/config.md)
+DEFAULT_RATE_LIMIT_CONFIG = {
+    # Requests per second (None: unlimited)
+    "rate": None,
+    # Number of requests which may be sent at once after an idle period
+    "burst": 1,
+    # Number of retries of throttled requests
+    "max_retries": 5,
+    # Seconds to wait before the first retry without Retry-After header,
+    # doubled for every further retry
+    "backoff": 1,
+    # Maximum number of seconds to wait before a retry
+    "max_delay": 300,
+}
+
+# Status codes with which servers signal that requests should be slowed down
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests to a host"""
+
+    def __init__(self, rate=None, burst=1):
+        """Create a full token bucket
+
+        Args:
+            rate:  tokens added per second (None: unlimited)
+            burst: maximum number of tokens
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = self._updated
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token
+
+        Returns:
+            seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if self.rate:
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Negative tokens are reservations of future tokens
+                self._tokens -= 1
+                wait = max(wait, -self._tokens / self.rate)
+        return max(wait, 0)
+
+    def acquire(self):
+        """Take a token, blocking until it may be used"""
+        time.sleep(self.reserve())
+
+    def pause(self, seconds):
+        """Do not hand out usable tokens for the given number of seconds"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def retry_delay(response, attempt, backoff, max_delay):
+    """Seconds to wait before retrying a throttled request
+
+    Args:
+        response:  the throttled response
+        attempt:   number of previous retries
+        backoff:   seconds to wait before the first retry
+        max_delay: maximum number of seconds to wait
+
+    Returns:
+        the delay given in the Retry-After header or, if there is none,
+        a random delay of up to backoff * 2^attempt seconds (full jitter)
+    """
+    delay = parse_retry_after(response.headers.get('Retry-After'))
+    if delay is None:
+        delay = random.uniform(0, backoff * 2 ** attempt)
+    return min(delay, max_delay)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header
+
+    Args:
+        value: header value, either seconds or an HTTP date (or None)
+
+    Returns:
+        seconds to wait or None if the value is missing or invalid
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time is None:
+        return None
+    return max(retry_time.timestamp() - time.time(), 0)
@@ -0,0 +1,190 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Handler registry module
+
+Handlers retrieve fulltexts for an identifier prefix (e.g. "doi") or, for
+DOIs registered with CrossRef, for a CrossRef member (i.e. a publisher).
+Their functions are given by name and imported only when first needed,
+such that importing libfulltext does not import every publisher module.
+
+Further handlers are added with register_prefix_handler and
+register_crossref_handler or in the "handlers" section of the
+configuration (see doc/config.md).
+"""
+
+import collections
+import importlib
+
+# A fulltext handler
+#   name:          short name, also the section of its settings in "publishers"
+#   description:   human-readable description
+#   module:        module containing the functions (None: functions given directly)
+#   getter:        synchronous getter function or its name in module
+#   getter_async:  asyncio getter function or its name (None: not supported)
+#   prefetcher:    function prefetching metadata for many identifiers or its
+#                  name (None: not supported, only for prefix handlers)
+#   options:       names of keyword arguments of the getters, which are taken
+#                  from the settings of the handler in "publishers"
+#   resolver:      function describing the route of an identifier from the
+#                  known metadata or its name (None: not supported, only for
+#                  prefix handlers, see resolve.py)
+Handler = collections.namedtuple('Handler', [
+    'name', 'description', 'module', 'getter', 'getter_async', 'prefetcher', 'options',
+    'resolver',
+])
+Handler.__new__.__defaults__ = ('', None, None, None, None, (), None)
+
+# Handlers by identifier prefix
+PREFIX_HANDLERS = {
+    'doi': Handler('doi', 'Digital Object Identifiers, routed by registration agency',
+                   'libfulltext.doi', 'get_doi_fulltext', 'get_doi_fulltext_async',
+                   'prefetch_doi_metadata', resolver='resolve_doi_route'),
+}
+
+# Handlers of DOIs registered with CrossRef by CrossRef member ID
+CROSSREF_MEMBER_HANDLERS = {
+    '16': Handler('aps', 'American Physical Society (APS) harvest API',
+                  'libfulltext.doi.crossref.aps',
+                  'get_aps_fulltext', 'get_aps_fulltext_async'),
+    '78': Handler('elsevier', 'Elsevier article retrieval API (requires apikey)',
+                  'libfulltext.doi.crossref.elsevier',
+                  'get_elsevier_fulltext', 'get_elsevier_fulltext_async',
+                  options=('apikey',)),
+    '297': Handler('springer', 'Springer Nature open access PDFs',
+                   'libfulltext.doi.crossref.springer',
+                   'get_springer_fulltext', 'get_springer_fulltext_async'),
+}
+
+# Functions of a handler and the capabilities they provide
+HANDLER_CAPABILITIES = (
+    ('getter', 'sync'),
+    ('getter_async', 'async'),
+    ('prefetcher', 'prefetch'),
+    ('resolver', 'resolve'),
+)
+
+
+def register_prefix_handler(prefix, handler):
+    """Register (or replace) the handler of an identifier prefix
+
+    Args:
+        prefix:  identifier prefix (e.g. "doi")
+        handler: Handler
+    """
+    PREFIX_HANDLERS[prefix] = handler
+
+
+def register_crossref_handler(member, handler):
+    """Register (or replace) the handler of a CrossRef member
+
+    Args:
+        member:  CrossRef member ID as string
+        handler: Handler
+    """
+    CROSSREF_MEMBER_HANDLERS[member] = handler
+
+
+def get_prefix_handler(prefix, config=None):
+    """Get the handler of an identifier prefix
+
+    Args:
+        prefix: identifier prefix
+        config: configuration dictionary, whose "handlers" section may
+                add or replace handlers
+
+    Raises:
+        ValueError: no handler for the prefix
+    Returns:
+        Handler
+    """
+    handler = _handlers('prefix', PREFIX_HANDLERS, config).get(prefix)
+    if handler is None:
+        raise ValueError('Prefix {0} unknown.'.format(prefix))
+    return handler
+
+
+def get_crossref_handler(member, config=None):
+    """Get the handler of a CrossRef member
+
+    Args:
+        member: CrossRef member ID as string
+        config: configuration dictionary, whose "handlers" section may
+                add or replace handlers
+
+    Returns:
+        Handler or None if no handler exists for the member
+    """
+    return _handlers('crossref', CROSSREF_MEMBER_HANDLERS, config).get(member)
+
+
+def load(handler, function='getter'):
+    """Get a function of a handler, importing its module if needed
+
+    Args:
+        handler:  Handler
+        function: "getter", "getter_async", "prefetcher" or "resolver"
+
+    Returns:
+        the function or None if the handler does not provide it
+    """
+    value = getattr(handler, function)
+    if value is None or callable(value):
+        return value
+    return getattr(importlib.import_module(handler.module), value)
+
+
+def handler_options(handler, config):
+    """Keyword arguments of the getters of a handler taken from the configuration
+
+    Args:
+        handler: Handler
+        config:  configuration dictionary
+
+    Raises:
+        KeyError: a required option is not configured
+    Returns:
+        dict mapping the option names to the configured values
+    """
+    settings = config.get('publishers', {}).get(handler.name, {}) if handler.options \
+        else {}
+    return {option: settings[option] for option in handler.options}
+
+
+def describe_handlers(config=None):
+    """Describe all handlers without importing them
+
+    Args:
+        config: configuration dictionary, whose "handlers" section may
+                add or replace handlers
+
+    Returns:
+        list of dicts with kind ("prefix" or "crossref"), key (prefix or
+        member ID), name, description and capabilities ("sync", "async",
+        "prefetch" and "resolve")
+    """
+    descriptions = []
+    for kind, handlers in [('prefix', PREFIX_HANDLERS),
+                           ('crossref', CROSSREF_MEMBER_HANDLERS)]:
+        for key, handler in sorted(_handlers(kind, handlers, config).items()):
+            descriptions.append({
+                'kind': kind,
+                'key': key,
+                'name': handler.name,
+                'description': handler.description,
+                'capabilities': [capability
+                                 for function, capability in HANDLER_CAPABILITIES
+                                 if getattr(handler, function) is not None],
+            })
+    return descriptions
+
+
+def _handlers(kind, handlers, config):
+    """Registered handlers of a kind, updated by the configured ones"""
+    configured = (config or {}).get('handlers', {}).get(kind)
+    if not configured:
+        return handlers
+    handlers = dict(handlers)
+    for key, settings in configured.items():
+        settings = dict(settings)
+        settings['options'] = tuple(settings.get('options', ()))
+        handlers[str(key)] = Handler(**settings)
+    return handlers
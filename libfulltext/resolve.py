@@ -0,0 +1,196 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Preflight resolver module
+
+Resolving an identifier runs the same routing as get_fulltext (registration
+agency, CrossRef member, handler), but the download requests of the handler
+are sent as HEAD requests and nothing is saved. The outcome tells whether
+the fulltext is available, e.g. to size a run or to spot unsupported
+publishers, at the cost of the metadata requests only.
+"""
+
+import collections
+import concurrent.futures
+
+from .cache import open_metadata_cache
+from .fulltext import _prefetched
+from .registry import get_prefix_handler, load
+from .session import create_session
+
+# Outcomes of resolving an identifier
+# the publisher answered the HEAD request for the fulltext successfully
+AVAILABILITY_AVAILABLE = 'available'
+# the publisher refused the fulltext (e.g. no access or not found)
+AVAILABILITY_UNAVAILABLE = 'unavailable'
+# no handler for the prefix, registration agency or publisher
+AVAILABILITY_UNSUPPORTED = 'unsupported'
+# the routing failed (e.g. DOI unknown to doi.org)
+AVAILABILITY_UNRESOLVED = 'unresolved'
+
+# Outcome of resolving a single identifier
+#   prefixed_identifier:  the resolved identifier
+#   availability:         one of the AVAILABILITY_* outcomes
+#   route:                dict describing the routing (see the resolver of
+#                         the prefix handler, e.g. registration_agency,
+#                         member, publisher and handler for DOIs)
+#   http_status:          status code of the last HEAD request (or None)
+#   size:                 Content-Length of the fulltexts in bytes (or None)
+#   error:                None or the exception raised by the routing
+Availability = collections.namedtuple('Availability', [
+    'prefixed_identifier', 'availability', 'route', 'http_status', 'size', 'error',
+])
+
+
+class ProbeSession:
+    """Proxy of a requests.Session sending downloads as HEAD requests
+
+    Streamed GET requests (i.e. downloads) are sent as HEAD requests with the
+    same headers and parameters, all other requests and attributes are those
+    of the proxied session.
+    """
+
+    def __init__(self, session):
+        """Create proxy
+
+        Args:
+            session: requests.Session sending the requests
+        """
+        self.session = session
+        # Responses to the HEAD requests
+        self.probes = []
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def get(self, url, **kwargs):
+        """Send a GET request, or a HEAD request instead of a download
+
+        Args:
+            url:    URL to request
+            kwargs: passed on to requests.Session.get or requests.Session.head
+
+        Returns:
+            requests.Response
+        """
+        if not kwargs.pop('stream', False):
+            return self.session.get(url, **kwargs)
+        kwargs.setdefault('allow_redirects', True)
+        response = self.session.head(url, **kwargs)
+        self.probes.append(response)
+        return response
+
+
+def resolve_fulltext(prefixed_identifier, config, session=None, cache=None):
+    """Find out whether the fulltext for a prefixed ID is available
+
+    Args:
+        prefixed_identifier:  article identifier with prefix
+                              (e.g. "doi:10.1016/j.cortex.2015.10.021")
+        config:               configuration dictionary
+                              (see config.py and README.md)
+        session:              requests.Session used for all requests
+                              (default: a new session from create_session)
+        cache:                MetadataCache for registration agencies and
+                              publisher metadata
+                              (default: the one opened by open_metadata_cache)
+
+    Returns:
+        Availability
+    """
+    if session is None:
+        with create_session(config) as own_session:
+            return resolve_fulltext(prefixed_identifier, config, own_session, cache)
+    if cache is None:
+        with open_metadata_cache(config) as own_cache:
+            return resolve_fulltext(prefixed_identifier, config, session, own_cache)
+
+    prefix, _, identifier = prefixed_identifier.partition(':')
+    try:
+        handler = get_prefix_handler(prefix, config)
+    except ValueError as error:
+        return Availability(prefixed_identifier, AVAILABILITY_UNSUPPORTED, {},
+                            None, None, error)
+
+    probe_session = ProbeSession(session)
+    sizes = []
+
+    def save_stream(stream, path):  # pylint: disable=unused-argument
+        """Record the size of a fulltext instead of saving it"""
+        length = stream.headers.get('Content-Length')
+        sizes.append(None if length is None else int(length))
+
+    error = None
+    try:
+        load(handler)(identifier, save_stream, config, probe_session, cache)
+    except Exception as getter_error:  # pylint: disable=broad-except
+        error = getter_error
+
+    resolver = load(handler, 'resolver')
+    route = {} if resolver is None else resolver(identifier, config, cache)
+    if error is None:
+        availability = AVAILABILITY_AVAILABLE
+    elif probe_session.probes:
+        availability = AVAILABILITY_UNAVAILABLE
+    elif isinstance(error, NotImplementedError) or \
+            (route.get('member') is not None and route.get('handler') is None):
+        availability = AVAILABILITY_UNSUPPORTED
+    else:
+        availability = AVAILABILITY_UNRESOLVED
+
+    return Availability(
+        prefixed_identifier, availability, route,
+        probe_session.probes[-1].status_code if probe_session.probes else None,
+        None if not sizes or None in sizes else sum(sizes),
+        error)
+
+
+def resolve_fulltexts(prefixed_identifiers, config, workers=1, session=None,
+                      cache=None):
+    """Find out whether the fulltexts for many prefixed IDs are available
+
+    Identifiers are resolved concurrently on a bounded pool of worker
+    threads (see get_fulltexts), with their metadata prefetched in batches.
+
+    Args:
+        prefixed_identifiers: iterable of article identifiers with prefix
+        config:               configuration dictionary
+                              (see config.py and README.md)
+        workers:              number of concurrent resolutions
+        session:              requests.Session used for all requests
+                              (default: a new session from create_session)
+        cache:                MetadataCache shared by all resolutions
+                              (default: the one opened by open_metadata_cache)
+
+    Raises:
+        ValueError: number of workers is smaller than 1
+    Yields:
+        Availability for each identifier, in order of the input
+    """
+    if workers < 1:
+        raise ValueError('At least one worker is required, got {0}.'.format(workers))
+
+    if session is None:
+        with create_session(config) as own_session:
+            yield from resolve_fulltexts(prefixed_identifiers, config, workers,
+                                         own_session, cache)
+        return
+    if cache is None:
+        with open_metadata_cache(config) as own_cache:
+            yield from resolve_fulltexts(prefixed_identifiers, config, workers,
+                                         session, own_cache)
+        return
+
+    identifiers = _prefetched(prefixed_identifiers, config, session, cache)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            for prfid in identifiers:
+                pending.append(executor.submit(resolve_fulltext, prfid, config,
+                                               session, cache))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Do not start queued resolutions if the caller stops consuming
+            for future in pending:
+                future.cancel()
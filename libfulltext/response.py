@@ -1,9 +1,28 @@
 # copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
 """Response functions"""
 
+import errno
+import fcntl
 import hashlib
+import os
 import requests
 
+from .conditional import NOT_MODIFIED
+
+# Bytes read from a response per iteration (see storage.chunk_size in doc/config.md)
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Suffix of the file which is written until the download is complete
+PARTIAL_SUFFIX = '.part'
+
+
+class QuotaExceededError(requests.exceptions.HTTPError):
+    """A publisher refused the request because a quota is exhausted"""
+
+
+class PartialFileLockedError(OSError):
+    """Another writer is writing the same partial file"""
+
 
 def assert_sha1(expected_sha1, expected_path):
     """Returns a function that checks a save_response call via expected SHA1 hash and path
@@ -27,27 +46,198 @@ def assert_sha1(expected_sha1, expected_path):
         """
         assert path == expected_path
         sha = hashlib.sha1()
-        for chunk in response.iter_content(chunk_size=128):
+        for chunk in response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE):
             sha.update(chunk)
         assert sha.hexdigest() == expected_sha1
     return process_response
 
 
-def save_to_file(response, filename):
-    """Save a stream to a file
+def save_to_file(response, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Save a stream to a file atomically
 
     Args:
-        stream:    stream that should be written to file
-        filename:  name of the file to which the stream gets written
+        stream:      stream that should be written to file
+        filename:    name of the file to which the stream gets written
+        chunk_size:  number of bytes read from the stream at once
+
+    Returns:
+        dict with size, sha1 and sha256 of the written file
+    """
+    with AtomicFileWriter(filename) as writer:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            writer.write(chunk)
+        return writer.commit()
+
+
+class HashingWriter:
+    """Base of the writers, computing size and hashes of the written data
+
+    Size and hashes are computed while writing, the data does not need to be
+    read again. Likewise, a validator (e.g. pdf.PDFValidator) checks the data
+    on the fly.
+    """
+
+    def __init__(self, validator=None):
+        """Start computing size and hashes
+
+        Args:
+            validator: object whose feed method is called with every chunk
+                       and whose finish method is called on commit
+                       (default: no validation)
+        """
+        self.size = 0
+        self._sha1 = hashlib.sha1()
+        self._sha256 = hashlib.sha256()
+        self._validator = validator
+
+    def _update(self, chunk):
+        """Account for a chunk in size, hashes and validation"""
+        if self._validator is not None:
+            self._validator.feed(chunk)
+        self._sha1.update(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    def _saved(self):
+        """Size and hashes of the written data, updated by the validation result
+
+        Raises:
+            ValueError: the validator rejected the data
+        """
+        saved = {'size': self.size,
+                 'sha1': self._sha1.hexdigest(),
+                 'sha256': self._sha256.hexdigest()}
+        if self._validator is not None:
+            saved.update(self._validator.finish())
+        return saved
+
+
+class AtomicFileWriter(HashingWriter):
+    """Writer which replaces a file atomically once all data is written
+
+    The data is written to filename + PARTIAL_SUFFIX and renamed to filename
+    on commit, such that filename never contains a truncated file. The
+    partial file is locked exclusively while it is written, a second writer
+    of the same file fails instead of clobbering it. The data is flushed to
+    disk before the rename, such that a crash does not leave an empty file.
+    If the writer is closed without commit or keep, the partial file is removed.
+    """
+
+    def __init__(self, filename, resume=False, validator=None):
+        """Start writing a file
+
+        Args:
+            filename:  name of the file to be written
+            resume:    append to the partial file kept by an earlier writer
+                       (see keep) instead of starting from scratch
+            validator: see HashingWriter
+
+        Raises:
+            PartialFileLockedError: another writer is writing the file
+            ValueError:             the validator rejected the resumed partial
+                                    file, which is removed
+        """
+        super().__init__(validator)
+        self.filename = filename
+        self.partial_filename = filename + PARTIAL_SUFFIX
+        # The partial file is only truncated once locked
+        self._file = os.fdopen(os.open(self.partial_filename, os.O_RDWR | os.O_CREAT,
+                                       0o666), 'r+b')
+        try:
+            _lock(self._file, self.partial_filename)
+            if resume:
+                for chunk in iter(lambda: self._file.read(DEFAULT_CHUNK_SIZE), b''):
+                    self._update(chunk)
+            else:
+                self._file.truncate()
+        except ValueError:
+            # An invalid partial file cannot be completed
+            self.abort()
+            raise
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._file.closed:
+            self.abort()
+
+    def write(self, chunk):
+        """Write a chunk of data
+
+        Args:
+            chunk: bytes to be written
+
+        Raises:
+            ValueError: the validator rejected the data
+        """
+        self._file.write(chunk)
+        self._update(chunk)
+
+    def commit(self):
+        """Complete the file and move it to its final name
+
+        Raises:
+            ValueError: the validator rejected the file
+        Returns:
+            dict with size, sha1 and sha256 of the written file,
+            updated by the result of the validator
+        """
+        saved = self._saved()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # Renamed while still locked, such that no other writer starts anew
+        try:
+            os.replace(self.partial_filename, self.filename)
+        finally:
+            self._file.close()
+        _fsync_directory(os.path.dirname(os.path.abspath(self.filename)))
+        return saved
+
+    def keep(self):
+        """Stop writing, but keep the partial file such that it can be resumed"""
+        self._file.close()
+
+    def abort(self):
+        """Discard the written data"""
+        try:
+            os.remove(self.partial_filename)
+        finally:
+            self._file.close()
+
+
+def _lock(file, filename):
+    """Lock an open file exclusively without waiting
+
+    Raises:
+        PartialFileLockedError: the file is locked by another writer
     """
-    with open(filename, 'wb') as file:
-        for chunk in response.iter_content(chunk_size=128):
-            file.write(chunk)
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError as error:
+        raise PartialFileLockedError(errno.EWOULDBLOCK,
+                                     'Partial file is written by another writer',
+                                     filename) from error
+
+
+def _fsync_directory(dirname):
+    """Flush a directory to disk, such that a rename within it persists"""
+    directory = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
 
 
 def verify(response, expected_content_type):
     """Verify a response (currently only the status code and content type header)
 
+    A 304 Not Modified response to a conditional request (see conditional.py)
+    has no body and is accepted.
+
     Args:
         response:               requests.Response object from an API request
         expected_content_type:  expected Content-Type as string (e.g. 'application/pdf')
@@ -56,10 +246,53 @@ def verify(response, expected_content_type):
         requests.exceptions.InvalidHeader: if content type undeclared or unexpected
     """
     response.raise_for_status()
+    if response.status_code == NOT_MODIFIED:
+        return
+    _verify_content_type(response.headers, expected_content_type)
+
+
+def verify_aiohttp(response, expected_content_type):
+    """Verify an aiohttp response like verify does for a requests response
+
+    Args:
+        response:               aiohttp.ClientResponse object from an API request
+        expected_content_type:  expected Content-Type as string (e.g. 'application/pdf')
+
+    Raises:
+        requests.exceptions.HTTPError: request was not successful
+        requests.exceptions.InvalidHeader: if content type undeclared or unexpected
+    """
+    raise_for_status_aiohttp(response)
+    _verify_content_type(response.headers, expected_content_type)
+
+
+def raise_for_status_aiohttp(response):
+    """Raise for an unsuccessful aiohttp response like requests does
+
+    The asyncio retrieval path thereby fails with the same exceptions
+    (and messages) as the synchronous one.
+
+    Args:
+        response: aiohttp.ClientResponse object from an API request
+
+    Raises:
+        requests.exceptions.HTTPError: status code indicates an error
+    """
+    if 400 <= response.status < 500:
+        kind = 'Client'
+    elif 500 <= response.status < 600:
+        kind = 'Server'
+    else:
+        return
+    raise requests.exceptions.HTTPError('{0} {1} Error: {2} for url: {3}'
+                                        .format(response.status, kind,
+                                                response.reason, response.url))
+
 
-    if 'Content-Type' not in response.headers or \
-            response.headers['Content-Type'] != expected_content_type:
-        raise requests.exceptions.InvalidHeader('Content-Type is not ' +
-                                                expected_content_type + ', '
-                                                'possibly because you do not have access '
-                                                'to this document.')
+def _verify_content_type(headers, expected_content_type):
+    """Raise InvalidHeader if the Content-Type header is not the expected one"""
+    if 'Content-Type' not in headers or \
+            headers['Content-Type'] != expected_content_type:
+        raise requests.exceptions.InvalidHeader(
+            'Content-Type is not {0}, possibly because you do not have access '
+            'to this document.'.format(expected_content_type))
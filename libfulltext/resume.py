@@ -0,0 +1,185 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Resumable download module
+
+Downloads from servers which accept byte ranges (Accept-Ranges: bytes) and
+identify the version of a file (ETag or Last-Modified) are resumed after
+connection errors with a Range request for the missing bytes, instead of
+starting from scratch. If a download fails for good, the partial file is
+kept together with a small JSON file naming its URL and version, such that
+the next retrieval of the identifier resumes it (see ConditionalSession).
+"""
+
+import json
+import os
+import re
+
+import requests
+
+# Suffix of the file describing a kept partial file (appended to its name)
+PARTIAL_INFO_SUFFIX = '.resume.json'
+
+# Default number of Range requests resuming a single download
+DEFAULT_RESUME_RETRIES = 3
+
+# HTTP status code of a response with the requested byte range
+PARTIAL_CONTENT = 206
+
+# Errors after which a download can be resumed
+RESUMABLE_ERRORS = (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout)
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+def resume_validator(response):
+    """Version of the file sent by a response, if the download is resumable
+
+    Args:
+        response: requests.Response of a download
+
+    Returns:
+        strong ETag or Last-Modified header, usable as If-Range, or None
+        if the server does not support resuming this download
+    """
+    if response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+        return None
+    if 'Content-Encoding' in response.headers:
+        # Ranges refer to the encoded body, the written data is decoded
+        return None
+    etag = response.headers.get('ETag')
+    if etag is not None and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def content_range(response):
+    """Start and total size of the bytes sent by a response
+
+    Args:
+        response: requests.Response of a (possibly ranged) download
+
+    Returns:
+        tuple of the offset of the first byte sent and the total size of
+        the file (None if unknown)
+    """
+    if response.status_code == PARTIAL_CONTENT:
+        match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if match is None:
+            raise requests.exceptions.InvalidHeader('Invalid Content-Range: {0}'.format(
+                response.headers.get('Content-Range')))
+        total = match.group(3)
+        return int(match.group(1)), None if total == '*' else int(total)
+    length = response.headers.get('Content-Length')
+    if 'Content-Encoding' in response.headers or length is None:
+        # The decoded body is larger than the transferred one
+        return 0, None
+    return 0, int(length)
+
+
+def iter_resumable(response, session, offset, chunk_size, retries):
+    """Iterate over the body of a download, resuming after connection errors
+
+    Args:
+        response:   requests.Response of the download
+        session:    requests.Session sending the Range requests
+        offset:     bytes of the file before the body of the response
+        chunk_size: number of bytes read at once
+        retries:    maximal number of Range requests
+
+    Raises:
+        requests.exceptions.RequestException: the download failed and could
+                                              not be resumed
+    Yields:
+        chunks of the body
+    """
+    validator = resume_validator(response)
+    while True:
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                offset += len(chunk)
+                yield chunk
+            _verify_complete(response, offset)
+            return
+        except RESUMABLE_ERRORS:
+            if validator is None or retries <= 0:
+                raise
+            retries -= 1
+
+        request = response.request.copy()
+        for header in ('If-None-Match', 'If-Modified-Since'):
+            request.headers.pop(header, None)
+        request.headers['Range'] = 'bytes={0}-'.format(offset)
+        request.headers['If-Range'] = validator
+        response = session.send(request, stream=True)
+        response.raise_for_status()
+        if response.status_code != PARTIAL_CONTENT \
+                or content_range(response)[0] != offset:
+            raise requests.exceptions.ChunkedEncodingError(
+                'Download of {0} could not be resumed.'.format(request.url))
+
+
+def _verify_complete(response, size):
+    """Raise ChunkedEncodingError if the body of a download ended early
+
+    urllib3 before version 2 ends streamed bodies cut off by the server
+    without an error.
+
+    Args:
+        response: requests.Response of the download
+        size:     size of the file including the body of the response
+    """
+    expected_size = content_range(response)[1]
+    if expected_size is not None and size < expected_size:
+        raise requests.exceptions.ChunkedEncodingError(
+            'Connection of {0} closed after {1} of {2} bytes.'.format(
+                response.url, size, expected_size))
+
+
+def write_partial_info(partial_filename, url, validator):
+    """Describe a kept partial file, such that its download can be resumed
+
+    Args:
+        partial_filename: name of the partial file (see AtomicFileWriter)
+        url:              URL requested for the file
+        validator:        version of the file (see resume_validator)
+    """
+    with open(partial_filename + PARTIAL_INFO_SUFFIX, 'w') as file:
+        json.dump({'url': url, 'validator': validator}, file)
+
+
+def remove_partial_info(partial_filename):
+    """Remove the description of a partial file, if any"""
+    try:
+        os.remove(partial_filename + PARTIAL_INFO_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def read_partials(directory):
+    """Find the kept partial files in a directory
+
+    Args:
+        directory: directory of the files of an identifier
+
+    Returns:
+        dict mapping requested URLs to dicts with the size of the partial
+        file (offset) and the version of the file (validator)
+    """
+    partials = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return partials
+    for name in names:
+        if not name.endswith(PARTIAL_INFO_SUFFIX):
+            continue
+        partial_filename = os.path.join(directory, name[:-len(PARTIAL_INFO_SUFFIX)])
+        try:
+            with open(partial_filename + PARTIAL_INFO_SUFFIX) as file:
+                info = json.load(file)
+            offset = os.path.getsize(partial_filename)
+            partials[info['url']] = {'offset': offset, 'validator': info['validator']}
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return partials
@@ -0,0 +1,178 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""HTTP session module
+
+A single session is shared by all requests of a run, such that TCP and TLS
+connections to doi.org, api.crossref.org and the publisher hosts are kept
+alive and reused.
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ratelimit import DEFAULT_RATE_LIMIT_CONFIG, THROTTLE_STATUS_CODES, \
+    TokenBucket, retry_delay
+
+# Defaults for the "http" section of the configuration (see doc/config.md)
+DEFAULT_HTTP_CONFIG = {
+    # Seconds to wait for connecting and for each read from the socket
+    "timeout": 30,
+    # Number of hosts for which connection pools are cached
+    "pool_connections": 10,
+    # Number of connections kept alive per host
+    "pool_maxsize": 10,
+    # Number of retries on connection errors and 502 and 504 responses
+    "retries": 3,
+    # Retry n waits backoff_factor * 2^(n - 1) seconds
+    "backoff_factor": 0.5,
+}
+
+# Status codes for which a request is retried immediately
+# (throttled requests are handled by RateLimitedHTTPAdapter)
+RETRY_STATUS_CODES = (502, 504)
+
+# Hosts of the publishers, whose "rate_limit" configuration applies to them
+PUBLISHER_HOSTS = {
+    'aps': 'harvest.aps.org',
+    'elsevier': 'api.elsevier.com',
+    'springer': 'link.springer.com',
+}
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter applying a default timeout to every request"""
+
+    def __init__(self, timeout=None, **kwargs):
+        """Create adapter
+
+        Args:
+            timeout: default timeout in seconds (None: wait forever)
+            kwargs:  passed on to requests.adapters.HTTPAdapter
+        """
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send a request, applying the default timeout if none is given"""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class RateLimitedHTTPAdapter(TimeoutHTTPAdapter):
+    """HTTPAdapter with a token bucket per host and retries of throttled requests"""
+
+    def __init__(self, rate_limit=None, **kwargs):
+        """Create adapter
+
+        Args:
+            rate_limit: dict with the rate limit settings
+                        (see DEFAULT_RATE_LIMIT_CONFIG)
+            kwargs:     passed on to TimeoutHTTPAdapter
+        """
+        self.rate_limit = dict(DEFAULT_RATE_LIMIT_CONFIG, **(rate_limit or {}))
+        self._buckets = dict()
+        self._buckets_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def bucket(self, host):
+        """Get the token bucket of a host"""
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate_limit["rate"],
+                                                  self.rate_limit["burst"])
+            return self._buckets[host]
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send a request once the rate limit allows, retrying throttled requests"""
+        bucket = self.bucket(urlsplit(request.url).hostname)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code not in THROTTLE_STATUS_CODES \
+                    or attempt >= self.rate_limit["max_retries"]:
+                return response
+
+            bucket.pause(retry_delay(response, attempt, self.rate_limit["backoff"],
+                                     self.rate_limit["max_delay"]))
+            response.close()
+            attempt += 1
+
+
+def create_session(config):
+    """Create a requests session with connection pooling, timeouts and retries
+
+    Args:
+        config: configuration dictionary (see config.py), the optional "http"
+                section holds the defaults and per-host overrides in "hosts",
+                rate limits of publishers can also be set in their section
+
+    Returns:
+        requests.Session to be passed to get_fulltext and the getter functions
+    """
+    http_config = config.get("http", {})
+    session = requests.Session()
+
+    adapter = _create_adapter(http_config)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    hosts = {host: dict(host_config)
+             for host, host_config in http_config.get("hosts", {}).items()}
+    for publisher, host in PUBLISHER_HOSTS.items():
+        rate_limit = config.get("publishers", {}).get(publisher, {}).get("rate_limit")
+        if rate_limit is not None:
+            host_config = hosts.setdefault(host, dict())
+            host_config["rate_limit"] = dict(host_config.get("rate_limit", {}),
+                                             **rate_limit)
+
+    # requests picks the adapter with the longest matching prefix
+    for host, host_config in hosts.items():
+        settings = dict(http_config, **host_config)
+        settings["rate_limit"] = dict(http_config.get("rate_limit", {}),
+                                      **host_config.get("rate_limit", {}))
+        adapter = _create_adapter(settings)
+        session.mount("http://" + host + "/", adapter)
+        session.mount("https://" + host + "/", adapter)
+
+    return session
+
+
+def create_aiohttp_session(config):
+    """Create an aiohttp session with connection pooling and timeouts
+
+    aiohttp does not support per-host settings, hence only the defaults
+    of the "http" configuration section are applied.
+
+    Args:
+        config: configuration dictionary (see config.py)
+
+    Returns:
+        aiohttp.ClientSession to be passed to get_fulltext_async
+    """
+    import aiohttp  # pylint: disable=import-outside-toplevel
+
+    settings = dict(DEFAULT_HTTP_CONFIG, **config.get("http", {}))
+    connector = aiohttp.TCPConnector(limit_per_host=settings["pool_maxsize"])
+    timeout = aiohttp.ClientTimeout(sock_connect=settings["timeout"],
+                                    sock_read=settings["timeout"])
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def _create_adapter(http_config):
+    """Create a RateLimitedHTTPAdapter from (a section of) the http configuration"""
+    settings = dict(DEFAULT_HTTP_CONFIG, **http_config)
+    retries = Retry(total=settings["retries"],
+                    backoff_factor=settings["backoff_factor"],
+                    status_forcelist=RETRY_STATUS_CODES,
+                    respect_retry_after_header=False,
+                    raise_on_status=False)
+    return RateLimitedHTTPAdapter(rate_limit=settings.get("rate_limit"),
+                                  timeout=settings["timeout"],
+                                  pool_connections=settings["pool_connections"],
+                                  pool_maxsize=settings["pool_maxsize"],
+                                  max_retries=retries)
@@ -0,0 +1,227 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Content-addressed fulltext store module
+
+Saved files are kept once per content under their SHA256 hash, and the
+usual <fulltext>/<prefix>/<identifier>/<path> layout links to them. Hence
+the same PDF retrieved for aliases of a DOI (or retrieved again) occupies
+disk space only once, and the integrity of all files can be checked by
+hashing the blobs.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .response import DEFAULT_CHUNK_SIZE
+
+# Defaults for the "store" subsection of the "storage" configuration
+# (see doc/config.md)
+DEFAULT_STORE_CONFIG = {
+    # false saves files directly in the fulltext storage directory
+    "enabled": False,
+    # How files in the fulltext layout point to blobs ("hardlink" or "symlink")
+    "link": "hardlink",
+}
+
+# Name of the store directory in the fulltext storage directory
+STORE_DIRNAME = 'store'
+
+# Supported ways of linking files to blobs
+LINK_TYPES = ('hardlink', 'symlink')
+
+
+class FulltextStore:
+    """Blob store addressed by SHA256 with an index of identifiers to blobs
+
+    Blobs are stored as root/blobs/<first two hex digits>/<sha256>. The index
+    maps each (normalised) prefixed identifier and path to the SHA256 of the
+    saved file. The store may be shared between threads.
+    """
+
+    def __init__(self, root, link="hardlink"):
+        """Open or create a store
+
+        Args:
+            root: store directory
+            link: "hardlink" or "symlink", how files are linked to blobs
+
+        Raises:
+            ValueError: unknown link type
+        """
+        if link not in LINK_TYPES:
+            raise ValueError('Link type {0} unknown.'.format(link))
+        self.root = root
+        self.link = link
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(root, 'index.sqlite'),
+                                           check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'identifier TEXT, path TEXT, sha256 TEXT, size INTEGER, stored REAL, '
+                'PRIMARY KEY (identifier, path))'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)'
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the underlying index"""
+        with self._lock:
+            self._connection.close()
+
+    def blob_path(self, sha256):
+        """Path of the blob with the given SHA256 hash"""
+        return os.path.join(self.root, 'blobs', sha256[:2], sha256)
+
+    def add(self, identifier, path, filename, saved):
+        """Move a saved file into the store and link it back to its place
+
+        If a blob with the same content exists already, the file is
+        replaced by a link to it.
+
+        Args:
+            identifier: prefixed identifier the file belongs to
+            path:       path of the file as provided by the getter function
+            filename:   the saved file
+            saved:      dict with size and sha256 of the file (as returned
+                        by AtomicFileWriter.commit)
+        """
+        blob_path = self.blob_path(saved['sha256'])
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(filename, blob_path)
+        except FileExistsError:
+            pass
+
+        # Replace the file atomically by a link to the blob (unless it is the
+        # blob already, renaming a hardlink onto itself would be a no-op)
+        link_filename = filename + '.link'
+        if self.link == 'symlink':
+            os.symlink(os.path.relpath(blob_path, os.path.dirname(filename)),
+                       link_filename)
+            os.replace(link_filename, filename)
+        elif not os.path.samefile(filename, blob_path):
+            os.link(blob_path, link_filename)
+            os.replace(link_filename, filename)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (normalise_identifier(identifier), path, saved['sha256'],
+                 saved['size'], time.time())
+            )
+
+    def get(self, identifier):
+        """Get the blobs stored for an identifier
+
+        Args:
+            identifier: prefixed identifier (DOIs are matched case-insensitively)
+
+        Returns:
+            dict mapping paths to SHA256 hashes of the stored files
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT path, sha256 FROM files WHERE identifier = ?',
+                (normalise_identifier(identifier),)
+            ).fetchall()
+        return dict(rows)
+
+    def verify(self):
+        """Check the integrity of all indexed blobs
+
+        Yields:
+            SHA256 hash of every indexed blob which is missing or whose
+            content does not match its hash
+        """
+        for sha256 in self._indexed_blobs():
+            try:
+                if _sha256_of(self.blob_path(sha256)) == sha256:
+                    continue
+            except OSError:
+                pass
+            yield sha256
+
+    def prune(self):
+        """Remove the blobs which are not indexed anymore
+
+        The blob of a file is no longer indexed once the file has been
+        retrieved again with another content, otherwise the store only grows.
+        Files in the usual layout linked to the removed blobs are kept (as
+        hardlinks) or become dangling (as symlinks). The store must not be
+        written to, e.g. by a retrieval, while it is pruned.
+
+        Yields:
+            SHA256 hash of every removed blob
+        """
+        indexed = set(self._indexed_blobs())
+        blobs_dirname = os.path.join(self.root, 'blobs')
+        for dirname in sorted(os.listdir(blobs_dirname)):
+            for sha256 in sorted(os.listdir(os.path.join(blobs_dirname, dirname))):
+                if sha256 not in indexed:
+                    os.remove(self.blob_path(sha256))
+                    yield sha256
+
+    def _indexed_blobs(self):
+        """SHA256 hashes of all indexed blobs"""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT DISTINCT sha256 FROM files').fetchall()
+        return [sha256 for (sha256,) in rows]
+
+
+def _sha256_of(filename):
+    """SHA256 hash of a file as hex digest
+
+    Raises:
+        OSError: the file cannot be read
+    """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(DEFAULT_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def normalise_identifier(prefixed_identifier):
+    """Normalise a prefixed identifier for the index
+
+    DOIs are case-insensitive, hence they are indexed in lower case.
+
+    Args:
+        prefixed_identifier: article identifier with prefix
+
+    Returns:
+        the normalised prefixed identifier
+    """
+    prefix, _, identifier = prefixed_identifier.partition(':')
+    if prefix == 'doi':
+        identifier = identifier.lower()
+    return prefix + ':' + identifier
+
+
+def open_fulltext_store(config):
+    """Open the store configured in the "store" subsection of "storage"
+
+    Args:
+        config: configuration dictionary (see config.py)
+
+    Returns:
+        FulltextStore in the fulltext storage directory or None if the
+        store is disabled
+    """
+    settings = dict(DEFAULT_STORE_CONFIG, **config["storage"].get("store", {}))
+    if not settings["enabled"]:
+        return None
+    root = os.path.join(os.path.abspath(config["storage"]["fulltext"]), STORE_DIRNAME)
+    return FulltextStore(root, link=settings["link"])
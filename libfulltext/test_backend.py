@@ -0,0 +1,110 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the storage backend module"""
+
+import importlib.util
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .backend import LocalBackend, open_storage_backend
+from .fulltext import STATUS_SKIPPED, get_fulltext, get_fulltexts
+from .manifest import open_manifest
+
+DOI = '10.1103/PhysRevB.1.1'
+CONTENT = b'%PDF-1.4' + bytes(4000) + b'\n%%EOF\n'
+KEY = 'fulltexts/doi/' + DOI + '/fulltext.pdf'
+
+
+class LocalBackendTest(TestCase):
+    """Test the local storage backend"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = tmpdir.name
+
+    def test_writer(self):
+        """Files are written below the root, including their directories"""
+        backend = LocalBackend(self.root)
+        self.assertIsNone(backend.size('a/b'))
+        with backend.writer('a/b') as writer:
+            writer.write(b'data')
+            self.assertEqual(writer.commit()['size'], 4)
+        self.assertEqual(backend.size('a/b'), 4)
+        with open(os.path.join(self.root, 'a', 'b'), 'rb') as file:
+            self.assertEqual(file.read(), b'data')
+
+    def test_unknown(self):
+        """Unknown backends and missing buckets are rejected"""
+        for storage in [{"backend": "tape"}, {"backend": "s3"}]:
+            storage["fulltext"] = self.root
+            with self.assertRaises(ValueError):
+                open_storage_backend({"storage": storage})
+
+
+@skipIf(importlib.util.find_spec('boto3') is None, 'boto3 is not installed')
+class S3BackendTest(TestCase):
+    """Test the S3 storage backend against the mock server"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.server = MockServer({DOI: MockDocument('Crossref', '16', CONTENT)})
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.server.buckets['bucket'] = {}
+        self.config = {"storage": {
+            "fulltext": tmpdir.name,
+            "chunk_size": 256,
+            "backend": "s3",
+            "s3": {"bucket": "bucket", "prefix": "fulltexts/",
+                   "endpoint_url": self.server.url, "region": "us-east-1",
+                   "access_key_id": "key", "secret_access_key": "secret",
+                   "part_size": 1024},
+        }}
+        self.fulltext_dirname = tmpdir.name
+
+    def test_multipart(self):
+        """Fulltexts are uploaded in parts, nothing is written locally"""
+        get_fulltext('doi:' + DOI, self.config)
+        self.assertEqual(self.server.buckets['bucket'], {KEY: CONTENT})
+        self.assertEqual(self.server.part_sizes, [1024] * 3 + [len(CONTENT) - 3072])
+        self.assertEqual(self.server.uploads, {})
+        self.assertFalse(os.path.exists(os.path.join(self.fulltext_dirname, 'doi')))
+
+    def test_small(self):
+        """Files smaller than a part are uploaded with a single request"""
+        self.config["storage"]["s3"]["part_size"] = 1024 * 1024
+        get_fulltext('doi:' + DOI, self.config)
+        self.assertEqual(self.server.buckets['bucket'], {KEY: CONTENT})
+        self.assertEqual(self.server.part_sizes, [])
+
+    def test_abort(self):
+        """Uploads of rejected files are aborted"""
+        self.config["validation"] = {"strict": True}
+        self.server.documents[DOI.lower()] = MockDocument('Crossref', '16',
+                                                          CONTENT[:-7])
+        with self.assertRaises(ValueError):
+            get_fulltext('doi:' + DOI, self.config)
+        self.assertEqual(self.server.buckets['bucket'], {})
+        self.assertEqual(self.server.uploads, {})
+
+    def test_manifest(self):
+        """The manifest checks the uploaded files, e.g. to skip them"""
+        results = list(get_fulltexts(['doi:' + DOI], self.config))
+        self.assertIsNone(results[0].error)
+        with open_manifest(self.config) as manifest:
+            self.assertTrue(manifest.is_complete('doi:' + DOI))
+        results = list(get_fulltexts(['doi:' + DOI], self.config, skip_existing=True))
+        self.assertEqual(results[0].status, STATUS_SKIPPED)
+        del self.server.buckets['bucket'][KEY]
+        with open_manifest(self.config) as manifest:
+            self.assertFalse(manifest.is_complete('doi:' + DOI))
+
+    def test_local_only(self):
+        """The fulltext store requires the local backend"""
+        self.config["storage"]["store"] = {"enabled": True}
+        with self.assertRaises(ValueError):
+            get_fulltext('doi:' + DOI, self.config)
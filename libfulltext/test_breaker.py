@@ -0,0 +1,149 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the circuit breaker module"""
+
+import collections
+import tempfile
+from unittest import TestCase
+
+import requests
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .breaker import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN,
+                      FAILURE_PERMANENT, FAILURE_QUOTA, FAILURE_TRANSIENT,
+                      CircuitBreaker, classify_failure, publisher_of)
+from .cache import MetadataCache, open_metadata_cache
+from .fulltext import STATUS_DEFERRED, get_fulltexts
+from .manifest import STATUS_FAILED, open_manifest
+from .pdf import InvalidPDFError
+from .response import QuotaExceededError
+
+DOIS = ['10.1103/PhysRevB.1.{0}'.format(number) for number in range(5)]
+
+
+def http_error(status_code):
+    """HTTPError raised for a response with the given status code"""
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+class ClassifyFailureTest(TestCase):
+    """Test classify_failure"""
+
+    def test_classes(self):
+        """Failures are classified by status code and exception type"""
+        for error, failure in [
+                (http_error(404), FAILURE_PERMANENT),
+                (http_error(403), FAILURE_PERMANENT),
+                (http_error(500), FAILURE_TRANSIENT),
+                (http_error(429), FAILURE_QUOTA),
+                (QuotaExceededError('X-ELS-Status: WARNING'), FAILURE_QUOTA),
+                (requests.exceptions.ReadTimeout(), FAILURE_TRANSIENT),
+                (requests.exceptions.ConnectionError(), FAILURE_TRANSIENT),
+                (requests.exceptions.InvalidHeader('no access'), FAILURE_PERMANENT),
+                (InvalidPDFError('html', 'HTML page'), FAILURE_PERMANENT),
+                (ValueError('No handler'), FAILURE_PERMANENT),
+                (NotImplementedError(), FAILURE_PERMANENT),
+        ]:
+            self.assertEqual(classify_failure(error), failure, error)
+
+
+class CircuitBreakerTest(TestCase):
+    """Test CircuitBreaker"""
+
+    def test_threshold(self):
+        """Consecutive transient failures open the breaker"""
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record(FAILURE_TRANSIENT)
+        breaker.record(None)
+        breaker.record(FAILURE_TRANSIENT)
+        breaker.record(FAILURE_PERMANENT)
+        breaker.record(FAILURE_TRANSIENT)
+        self.assertTrue(breaker.allow())
+        breaker.record(FAILURE_TRANSIENT)
+        self.assertEqual(breaker.state, CIRCUIT_OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_quota(self):
+        """A quota failure opens the breaker at once"""
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+        breaker.record(FAILURE_QUOTA)
+        self.assertFalse(breaker.allow())
+
+    def test_probe(self):
+        """After the cooldown, a single probe closes or reopens the breaker"""
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record(FAILURE_TRANSIENT)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CIRCUIT_HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(FAILURE_TRANSIENT)
+        self.assertEqual(breaker.state, CIRCUIT_OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record(None)
+        self.assertEqual(breaker.state, CIRCUIT_CLOSED)
+
+
+class GetFulltextsBreakerTest(TestCase):
+    """Test get_fulltexts with circuit breakers"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.config = {
+            "storage": {"fulltext": tmpdir.name},
+            "circuit_breaker": {"enabled": True, "threshold": 1, "cooldown": 600},
+        }
+
+    def test_defer(self):
+        """Identifiers of a failing publisher are deferred, not failed"""
+        documents = {doi: MockDocument('Crossref', '16', b'%PDF-aps') for doi in DOIS}
+        with MockServer(documents, error_rate=1) as server:
+            results = list(get_fulltexts(['doi:' + doi for doi in DOIS], self.config))
+            # Only the retrievals queued before the first one failed reach APS
+            self.assertEqual(sum(request.startswith('/aps/')
+                                 for request in server.requests), 2)
+        statuses = collections.Counter(result.status for result in results)
+        self.assertEqual(statuses, {STATUS_FAILED: 2, STATUS_DEFERRED: 3})
+        with open_manifest(self.config) as manifest:
+            for result in results:
+                entry = manifest.get(result.prefixed_identifier)
+                if result.status == STATUS_DEFERRED:
+                    self.assertIsNone(entry)
+                else:
+                    self.assertEqual(entry['status'], STATUS_FAILED)
+
+    def test_refresh(self):
+        """Without prefix routing and with refreshed metadata, publishers are known"""
+        self.config["routing"] = {"prefixes": False, "prefetch": 0}
+        self.config["cache"] = {"refresh": True}
+        documents = {doi: MockDocument('Crossref', '16', b'%PDF-aps') for doi in DOIS}
+        with MockServer(documents, error_rate=1):
+            # Fill the cache with the metadata to be refreshed
+            list(get_fulltexts(['doi:' + DOIS[0]], self.config))
+            with open_metadata_cache(self.config) as cache:
+                self.assertEqual(publisher_of('doi:' + DOIS[0], self.config, cache),
+                                 'aps')
+            results = list(get_fulltexts(['doi:' + doi for doi in DOIS], self.config))
+        statuses = collections.Counter(result.status for result in results)
+        self.assertEqual(statuses, {STATUS_FAILED: 2, STATUS_DEFERRED: 3})
+
+    def test_publisher_of(self):
+        """Publishers are found in the cache, else by the prefix rules"""
+        prfid = 'doi:10.5555/unknown'
+        with MetadataCache() as cache:
+            self.assertEqual(publisher_of('doi:' + DOIS[0], self.config, cache), 'aps')
+            self.assertIsNone(publisher_of(prfid, self.config, cache))
+            cache.set('doiRA', '10.5555/unknown', 'Crossref')
+            cache.set('crossref', '10.5555/unknown', {'message': {'member': '78'}})
+            self.assertEqual(publisher_of(prfid, self.config, cache), 'elsevier')
+        self.assertIsNone(publisher_of('x:1', self.config, None))
+
+    def test_disabled(self):
+        """Without circuit breakers, every identifier is retrieved"""
+        self.config["circuit_breaker"]["enabled"] = False
+        documents = {doi: MockDocument('Crossref', '16', b'%PDF-aps') for doi in DOIS}
+        with MockServer(documents, error_rate=1):
+            results = list(get_fulltexts(['doi:' + doi for doi in DOIS], self.config))
+        self.assertEqual([result.status for result in results], [STATUS_FAILED] * 5)
@@ -0,0 +1,97 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the metadata cache module"""
+
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .cache import MetadataCache, open_metadata_cache
+from .fulltext import get_fulltext, get_fulltexts
+
+
+class MetadataCacheTest(TestCase):
+    """Test MetadataCache"""
+
+    def test_get_set(self):
+        """Values are stored per namespace and key"""
+        with MetadataCache() as cache:
+            self.assertIsNone(cache.get('doiRA', '10.1000/1'))
+            cache.set('doiRA', '10.1000/1', 'Crossref')
+            cache.set('crossref', '10.1000/1', {'message': {'member': '16'}})
+            self.assertEqual(cache.get('doiRA', '10.1000/1'), 'Crossref')
+            self.assertEqual(cache.get('crossref', '10.1000/1'),
+                             {'message': {'member': '16'}})
+
+    def test_expiry(self):
+        """Entries expire after the ttl"""
+        with MetadataCache(ttl=1) as cache:
+            cache.set('doiRA', '10.1000/1', 'Crossref')
+            with mock.patch('time.time', return_value=1e10):
+                self.assertIsNone(cache.get('doiRA', '10.1000/1'))
+
+    def test_eviction(self):
+        """The oldest entries get evicted once the cache is full"""
+        now = time.time()
+        with MetadataCache(max_entries=3) as cache:
+            for i in range(5):
+                with mock.patch('time.time', return_value=now - 5 + i):
+                    cache.set('doiRA', str(i), 'Crossref')
+            cached = [cache.get('doiRA', str(i)) for i in range(5)]
+        self.assertEqual(cached, [None, None, 'Crossref', 'Crossref', 'Crossref'])
+
+    def test_refresh(self):
+        """Entries cached before are ignored when refreshing, new ones are used"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'metadata.sqlite')
+            with MetadataCache(path) as cache:
+                cache.set('doiRA', '10.1000/1', 'Crossref')
+            with MetadataCache(path, refresh=True) as cache:
+                self.assertIsNone(cache.get('doiRA', '10.1000/1'))
+                cache.set('doiRA', '10.1000/1', 'DataCite')
+                self.assertEqual(cache.get('doiRA', '10.1000/1'), 'DataCite')
+
+    def test_persistence(self):
+        """The configured cache is persisted in the fulltext storage by default"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = {"storage": {"fulltext": tmpdir}}
+            with open_metadata_cache(config) as cache:
+                cache.set('doiRA', '10.1000/1', 'Crossref')
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'metadata.sqlite')))
+            with open_metadata_cache(config) as cache:
+                self.assertEqual(cache.get('doiRA', '10.1000/1'), 'Crossref')
+
+
+class CachedResolverTest(TestCase):
+    """Test that the resolver consults the cache"""
+
+    def test_rerun(self):
+        """A re-run only requests the fulltexts"""
+        documents = {'10.1103/PhysRevB.{0}'.format(i):
+                     MockDocument('Crossref', '16', b'%PDF') for i in range(3)}
+        prefixed_ids = ['doi:' + doi for doi in documents]
+
+        with MockServer(documents) as server, tempfile.TemporaryDirectory() as tmpdir:
+            config = {"storage": {"fulltext": tmpdir},
+                      "routing": {"prefixes": False, "prefetch": 0}}
+            list(get_fulltexts(prefixed_ids, config))
+            self.assertEqual(len(server.requests), 9)
+            list(get_fulltexts(prefixed_ids, config))
+            self.assertEqual(len(server.requests), 12)
+            config["cache"] = {"refresh": True}
+            list(get_fulltexts(prefixed_ids, config))
+            self.assertEqual(len(server.requests), 21)
+
+    def test_single_retrieval(self):
+        """A single retrieval only opens the cache if it is configured"""
+        documents = {'10.1103/PhysRevB.1': MockDocument('Crossref', '16', b'%PDF')}
+
+        with MockServer(documents), tempfile.TemporaryDirectory() as tmpdir:
+            config = {"storage": {"fulltext": tmpdir}}
+            get_fulltext('doi:10.1103/PhysRevB.1', config)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, 'metadata.sqlite')))
+            config["cache"] = {}
+            get_fulltext('doi:10.1103/PhysRevB.1', config)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'metadata.sqlite')))
@@ -0,0 +1,105 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the config module"""
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+from .config import parse
+
+
+class ParseTest(TestCase):
+    """Test parse"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'config.yaml')
+        self.cache_dir = os.path.join(tmpdir.name, 'cache')
+        with open(self.path, 'w') as file:
+            file.write('storage:\n  fulltext: /data\n')
+
+    def test_stream(self):
+        """Streams are parsed and completed with defaults"""
+        cfg = parse(io.StringIO('http:\n  retries: 2\n'), cache_dir=self.cache_dir)
+        self.assertEqual(cfg['http'], {'retries': 2})
+        self.assertEqual(cfg['storage']['fulltext'], os.path.abspath('fulltext'))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_cached(self):
+        """Unchanged files are loaded from the cache, without parsing"""
+        self.assertEqual(parse(self.path, self.cache_dir)['storage']['fulltext'], '/data')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        with mock.patch('libfulltext.config._parse_yaml') as parse_yaml:
+            self.assertEqual(parse(self.path, self.cache_dir)['storage']['fulltext'],
+                             '/data')
+        parse_yaml.assert_not_called()
+
+    def test_changed(self):
+        """Changed files are parsed again"""
+        parse(self.path, self.cache_dir)
+        with open(self.path, 'w') as file:
+            file.write('storage:\n  fulltext: /other/data\n')
+        self.assertEqual(parse(self.path, self.cache_dir)['storage']['fulltext'],
+                         '/other/data')
+
+    def test_broken_cache(self):
+        """Unreadable cache entries are replaced"""
+        parse(self.path, self.cache_dir)
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'wb') as file:
+                file.write(b'broken')
+        self.assertEqual(parse(self.path, self.cache_dir)['storage']['fulltext'], '/data')
+        with mock.patch('libfulltext.config._parse_yaml') as parse_yaml:
+            parse(self.path, self.cache_dir)
+        parse_yaml.assert_not_called()
+
+    def test_private(self):
+        """Cache directory and files are accessible by the current user only"""
+        os.makedirs(self.cache_dir, mode=0o755)
+        os.chmod(self.cache_dir, 0o755)
+        parse(self.path, self.cache_dir)
+        self.assertEqual(os.stat(self.cache_dir).st_mode & 0o777, 0o700)
+        for name in os.listdir(self.cache_dir):
+            self.assertEqual(os.stat(os.path.join(self.cache_dir, name)).st_mode & 0o777,
+                             0o600)
+
+    def test_other_user(self):
+        """Caches of other users are not used"""
+        parse(self.path, self.cache_dir)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1), \
+                mock.patch('libfulltext.config._parse_yaml',
+                           return_value={}) as parse_yaml:
+            parse(self.path, self.cache_dir)
+        parse_yaml.assert_called_once_with(mock.ANY)
+
+    def test_not_json(self):
+        """Configurations changed by the conversion to JSON are not cached"""
+        with open(self.path, 'w') as file:
+            file.write('handlers:\n  crossref:\n    16: {name: aps}\n')
+        for _ in range(2):
+            self.assertEqual(parse(self.path, self.cache_dir)['handlers'],
+                             {'crossref': {16: {'name': 'aps'}}})
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_no_cache(self):
+        """Without cache directory, files are always parsed"""
+        self.assertEqual(parse(self.path, None)['storage']['fulltext'], '/data')
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'exports are imported eagerly')
+    def test_light_import(self):
+        """Neither requests nor yaml are imported with the config module"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, libfulltext, libfulltext.config; '
+            'print(" ".join(sorted(sys.modules)))'
+        ], cwd=root).decode().split()
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('yaml', modules)
+        self.assertNotIn('libfulltext.fulltext', modules)
@@ -0,0 +1,91 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the daemon module"""
+
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .daemon import BatchResult, serve, submit
+from .fulltext import STATUS_SKIPPED
+from .manifest import STATUS_COMPLETE, STATUS_FAILED
+
+DOI = '10.1103/PhysRevB.1.1'
+
+
+class DaemonTest(TestCase):
+    """Test serve and submit"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.socket_path = os.path.join(self.tmpdir, 'daemon.sock')
+        self.config = {'storage': {'fulltext': os.path.join(self.tmpdir, 'fulltext')}}
+
+    def start_daemon(self, **kwargs):
+        """Serve the socket in a thread until the end of the test"""
+        servers = []
+        serve_forever = socketserver.BaseServer.serve_forever
+
+        def record_server(server):
+            """serve_forever remembering the server to shut it down"""
+            servers.append(server)
+            serve_forever(server, poll_interval=0.01)
+
+        patch = mock.patch.object(socketserver.BaseServer, 'serve_forever',
+                                  record_server)
+        patch.start()
+        self.addCleanup(patch.stop)
+        thread = threading.Thread(target=serve,
+                                  args=(self.socket_path, self.config), kwargs=kwargs)
+        thread.start()
+        self.addCleanup(thread.join)
+        while not servers:
+            time.sleep(0.01)
+        self.addCleanup(servers[0].shutdown)
+
+    def test_batches(self):
+        """Batches are retrieved by the daemon, with shared resources"""
+        documents = {DOI: MockDocument('Crossref', '16', b'%PDF-aps')}
+        with MockServer(documents):
+            self.start_daemon(skip_existing=True)
+            results = list(submit(self.socket_path, ['doi:' + DOI, '', 'x:1']))
+            self.assertEqual(sorted(results), [
+                BatchResult('doi:' + DOI, STATUS_COMPLETE, None, None, None),
+                BatchResult('x:1', STATUS_FAILED, 'Prefix x unknown.', 'permanent', None),
+            ])
+            self.assertEqual(
+                list(submit(self.socket_path, ['doi:' + DOI])),
+                [BatchResult('doi:' + DOI, STATUS_SKIPPED, None, None, None)])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.config['storage']['fulltext'], 'doi', DOI, 'fulltext.pdf')))
+
+    def test_private(self):
+        """Only the user running the daemon may connect"""
+        self.start_daemon()
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_served(self):
+        """A socket is not served by two daemons"""
+        self.start_daemon()
+        with self.assertRaises(ValueError):
+            serve(self.socket_path, self.config)
+
+    def test_stale_socket(self):
+        """The socket file of a daemon not running anymore is replaced"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(self.socket_path)
+        self.start_daemon()
+        self.assertEqual([result.status for result in submit(self.socket_path, ['x:1'])],
+                         [STATUS_FAILED])
+
+    def test_no_daemon(self):
+        """Submitting without daemon fails"""
+        with self.assertRaises(OSError):
+            list(submit(self.socket_path, ['x:1']))
@@ -0,0 +1,110 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the text extraction module"""
+
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .extract import ExtractionPool, open_extraction_pool
+from .fulltext import get_fulltexts
+
+DOCUMENTS = {
+    '10.1103/PhysRevB.1.{0}'.format(i): MockDocument('Crossref', '16',
+                                                     '%PDF-{0}'.format(i).encode())
+    for i in range(4)
+}
+
+# Changed by test_spawn, forked processes would inherit the change
+START_METHOD = 'spawn'
+
+
+def copy_extractor(pdf_filename, text_filename):
+    """Extractor copying the PDF (run in the extraction processes)"""
+    with open(pdf_filename, 'rb') as pdf, open(text_filename, 'wb') as text:
+        content = pdf.read()
+        text.write(content)
+    if content == b'fail':
+        raise ValueError('Extraction failed')
+    return {'chars': len(content)}
+
+
+def start_method_extractor(pdf_filename, text_filename):
+    """Extractor writing the start method of its process (see test_spawn)"""
+    with open(text_filename, 'w') as file:
+        file.write(START_METHOD)
+    return copy_extractor(pdf_filename, os.devnull)
+
+
+def slow_extractor(pdf_filename, text_filename):
+    """Extractor taking its time (run in the extraction processes)"""
+    time.sleep(0.3)
+    return copy_extractor(pdf_filename, text_filename)
+
+
+class ExtractionPoolTest(TestCase):
+    """Test ExtractionPool"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def write_pdf(self, name, content):
+        """Write a file to be extracted"""
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'wb') as file:
+            file.write(content)
+        return filename
+
+    def test_extract(self):
+        """Texts are written next to the PDFs, failures are collected"""
+        valid = self.write_pdf('valid.pdf', b'%PDF')
+        invalid = self.write_pdf('invalid.pdf', b'fail')
+        with ExtractionPool(1, extractor=copy_extractor) as pool:
+            self.assertEqual(pool.submit(valid), os.path.join(self.tmpdir, 'valid.txt'))
+            pool.submit(invalid)
+        self.assertEqual(pool.extracted, 1)
+        self.assertEqual(list(pool.failed), [invalid])
+        with open(os.path.join(self.tmpdir, 'valid.txt'), 'rb') as file:
+            self.assertEqual(file.read(), b'%PDF')
+
+    def test_spawn(self):
+        """Extraction processes are spawned, not forked from the downloads"""
+        global START_METHOD  # pylint: disable=global-statement
+        filename = self.write_pdf('spawned.pdf', b'%PDF')
+        START_METHOD = 'fork'
+        try:
+            with ExtractionPool(1, extractor=start_method_extractor) as pool:
+                pool.submit(filename)
+        finally:
+            START_METHOD = 'spawn'
+        self.assertEqual(pool.extracted, 1)
+        with open(os.path.join(self.tmpdir, 'spawned.txt')) as file:
+            self.assertEqual(file.read(), 'spawn')
+
+    def test_backpressure(self):
+        """Submitting waits while max_pending files wait for extraction"""
+        filenames = [self.write_pdf('{0}.pdf'.format(i), b'%PDF') for i in range(3)]
+        with ExtractionPool(1, max_pending=1, extractor=slow_extractor) as pool:
+            start = time.perf_counter()
+            for filename in filenames:
+                pool.submit(filename)
+            # The third submission waits for the first two extractions
+            self.assertGreater(time.perf_counter() - start, 0.5)
+        self.assertEqual(pool.extracted, 3)
+
+    def test_get_fulltexts(self):
+        """Downloaded PDFs are extracted while further ones are downloaded"""
+        config = {"storage": {"fulltext": self.tmpdir}}
+        self.assertIsNone(open_extraction_pool(config))
+        with MockServer(DOCUMENTS), \
+                ExtractionPool(2, extractor=copy_extractor) as pool:
+            list(get_fulltexts(['doi:' + doi for doi in DOCUMENTS], config, 2,
+                               extraction=pool))
+        for doi, document in DOCUMENTS.items():
+            text_filename = os.path.join(self.tmpdir, 'doi', doi, 'fulltext.txt')
+            with open(text_filename, 'rb') as file:
+                self.assertEqual(file.read(), document.content)
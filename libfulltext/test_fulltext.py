@@ -0,0 +1,252 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the fulltext retrieval module"""
+
+import asyncio
+import os
+import tempfile
+import threading
+from unittest import TestCase, mock, skipIf
+
+import requests
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltext, get_fulltext_async, get_fulltexts, unique_identifiers
+from .registry import Handler
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+MOCK_DOCUMENTS = {
+    '10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF-aps'),
+    '10.1016/j.test.1': MockDocument('Crossref', '78', b'%PDF-elsevier'),
+    '10.1007/test-1': MockDocument('Crossref', '297', b'%PDF-springer'),
+    '10.1103/PhysRevB.1.404': MockDocument('Crossref', '16', None),
+    '10.5555/unknown': MockDocument('Crossref', '1', b'%PDF-unknown'),
+    '10.5281/zenodo.1': MockDocument('DataCite', None, b''),
+}
+
+
+class MockServerTestCase(TestCase):
+    """Base class for tests running against a mock server and a temporary storage"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.config = {
+            "storage": {"fulltext": tmpdir.name},
+            "publishers": {"elsevier": {"apikey": "secret"}},
+        }
+        self.server = MockServer(MOCK_DOCUMENTS)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def assertStored(self, doi, content):  # pylint: disable=invalid-name
+        """Assert that the fulltext of a doi has been stored"""
+        path = os.path.join(self.config["storage"]["fulltext"], 'doi', doi,
+                            'fulltext.pdf')
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+
+class GetFulltextTest(MockServerTestCase):
+    """Test get_fulltext against the mock server"""
+
+    def test_publishers(self):
+        """Fulltexts of all publishers are routed and stored"""
+        for doi, document in MOCK_DOCUMENTS.items():
+            if document.member in ('16', '78', '297') and document.content:
+                get_fulltext('doi:' + doi, self.config)
+                self.assertStored(doi, document.content)
+
+    def test_prefix_routing(self):
+        """Known DOI prefixes are routed without metadata requests"""
+        get_fulltext('doi:10.1103/PhysRevB.1.1', self.config)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.config["routing"] = {"prefixes": False}
+        get_fulltext('doi:10.1103/PhysRevB.1.1', self.config)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_no_handler(self):
+        """Unknown publishers are reported"""
+        with self.assertRaises(ValueError) as context:
+            get_fulltext('doi:10.5555/unknown', self.config)
+        self.assertIn('No handler for DOI', str(context.exception))
+
+    def test_datacite(self):
+        """DataCite DOIs are routed to the (unimplemented) DataCite handler"""
+        with self.assertRaises(NotImplementedError):
+            get_fulltext('doi:10.5281/zenodo.1', self.config)
+
+    def test_not_found(self):
+        """Missing fulltexts are reported"""
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            get_fulltext('doi:10.1103/PhysRevB.1.404', self.config)
+        self.assertIn('Not Found', str(context.exception))
+
+    def test_malicious_identifier(self):
+        """Identifiers must not break out of the storage directory"""
+        def saving_getter(identifier, save_stream, *args):  # pylint: disable=W0613
+            """Getter that saves nothing to path x"""
+            save_stream(None, 'x')
+
+        with mock.patch.dict('libfulltext.registry.PREFIX_HANDLERS',
+                             {'fake': Handler('fake', getter=saving_getter)}):
+            with self.assertRaises(ValueError):
+                get_fulltext('fake:../../etc', self.config)
+
+
+@skipIf(aiohttp is None, 'aiohttp is not installed')
+class GetFulltextAsyncTest(MockServerTestCase):
+    """Test get_fulltext_async against the mock server"""
+
+    def run_async(self, coroutine):
+        """Run a coroutine in a new event loop"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        return loop.run_until_complete(coroutine)
+
+    def test_publishers(self):
+        """Concurrent retrievals in one session are routed like the sync ones"""
+        dois = [doi for doi, document in MOCK_DOCUMENTS.items()
+                if document.member in ('16', '78', '297') and document.content]
+
+        async def get_all():
+            """Retrieve all fulltexts concurrently"""
+            async with aiohttp.ClientSession() as session:
+                await asyncio.gather(*[
+                    get_fulltext_async('doi:' + doi, self.config, session)
+                    for doi in dois
+                ])
+
+        self.run_async(get_all())
+        for doi in dois:
+            self.assertStored(doi, MOCK_DOCUMENTS[doi].content)
+
+    def test_errors(self):
+        """Errors are raised like in the sync path"""
+        with self.assertRaises(ValueError):
+            self.run_async(get_fulltext_async('doi:10.5555/unknown', self.config))
+        with self.assertRaises(NotImplementedError):
+            self.run_async(get_fulltext_async('doi:10.5281/zenodo.1', self.config))
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            self.run_async(get_fulltext_async('doi:10.1103/PhysRevB.1.404', self.config))
+        self.assertIn('Not Found', str(context.exception))
+
+
+def fake_getter(identifier, save_stream, config, session, cache):  # pylint: disable=W0613
+    """Getter that fails for identifiers starting with 'bad'"""
+    if identifier.startswith('bad'):
+        raise ValueError('Cannot get ' + identifier)
+
+
+class GetFulltextsTest(TestCase):
+    """Test get_fulltexts"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.config = {"storage": {"fulltext": tmpdir.name}}
+
+    def test_results(self):
+        """Every identifier gets a result, failures do not abort the batch"""
+        with mock.patch.dict('libfulltext.registry.PREFIX_HANDLERS',
+                             {'fake': Handler('fake', getter=fake_getter)}):
+            results = list(get_fulltexts(
+                ['fake:good1', 'fake:bad1', 'unknown:id', 'fake:good2'],
+                self.config, workers=3
+            ))
+
+        errors = {result.prefixed_identifier: result.error for result in results}
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(result.status for result in results),
+                         ['complete', 'complete', 'failed', 'failed'])
+        self.assertIsNone(errors['fake:good1'])
+        self.assertIsNone(errors['fake:good2'])
+        self.assertIsInstance(errors['fake:bad1'], ValueError)
+        self.assertIn('Prefix unknown unknown', str(errors['unknown:id']))
+
+    def test_bounded_workers(self):
+        """No more than the requested number of retrievals run concurrently"""
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def counting_getter(identifier, save_stream, config,  # pylint: disable=W0613
+                            session, cache):
+            """Getter that records how many getters run at the same time"""
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+
+        with mock.patch.dict('libfulltext.registry.PREFIX_HANDLERS',
+                             {'fake': Handler('fake', getter=counting_getter)}):
+            results = list(get_fulltexts(
+                ('fake:{0}'.format(i) for i in range(20)), self.config, workers=2
+            ))
+
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(max_running[0], 2)
+
+    def test_prefetch(self):
+        """Metadata is prefetched with one request per batch"""
+        self.config["routing"] = {"prefixes": False}
+        self.config["publishers"] = {"elsevier": {"apikey": "secret"}}
+        dois = ['10.1103/PhysRevB.1.1', '10.1016/j.test.1', '10.1007/test-1',
+                '10.5281/zenodo.1']
+        with MockServer(MOCK_DOCUMENTS) as server:
+            results = list(get_fulltexts(['doi:' + doi for doi in dois], self.config))
+
+        self.assertEqual(sorted(result.status for result in results),
+                         ['complete', 'complete', 'complete', 'failed'])
+        self.assertEqual(len([path for path in server.requests
+                              if path.startswith('/crossref/v1/works?')]), 1)
+        # Only the DataCite DOI unknown to CrossRef needs a doiRA request
+        self.assertEqual(len(server.requests), 5)
+
+    def test_prefetch_comma(self):
+        """DOIs containing a comma are not part of the batch request"""
+        self.config["routing"] = {"prefixes": False}
+        documents = {'10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF-1'),
+                     '10.1103/PhysRevB.1,2': MockDocument('Crossref', '16', b'%PDF-2')}
+        with MockServer(documents) as server:
+            results = list(get_fulltexts(['doi:' + doi for doi in documents],
+                                         self.config))
+
+        self.assertEqual([result.status for result in results], ['complete'] * 2)
+        queries = [path for path in server.requests
+                   if path.startswith('/crossref/v1/works?')]
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('1%2C2', queries[0])
+        self.assertIn('/crossref/v1/works/10.1103/physrevb.1,2', server.requests)
+
+    def test_invalid_workers(self):
+        """At least one worker is required"""
+        with self.assertRaises(ValueError):
+            list(get_fulltexts(['doi:10.1000/1'], self.config, workers=0))
+
+
+class UniqueIdentifiersTest(TestCase):
+    """Test unique_identifiers"""
+
+    def test_unique(self):
+        """Blank lines and duplicates of normalised identifiers are dropped"""
+        lines = iter(['doi:10.1000/A\n', '\n', 'doi:10.1000/a\n', 'fake:A\n',
+                      'fake:a\n', '  doi:10.1000/B  \n'])
+        identifiers = unique_identifiers(lines)
+        self.assertEqual(next(identifiers), 'doi:10.1000/A')
+        # Lines are consumed lazily
+        self.assertEqual(next(lines), '\n')
+        self.assertEqual(list(identifiers), ['fake:A', 'fake:a', 'doi:10.1000/B'])
+
+    def test_window(self):
+        """Only duplicates among the most recent identifiers are dropped"""
+        lines = ['fake:1', 'fake:2', 'fake:1', 'fake:3', 'fake:2', 'fake:1']
+        self.assertEqual(list(unique_identifiers(lines, window=2)),
+                         ['fake:1', 'fake:2', 'fake:3', 'fake:2', 'fake:1'])
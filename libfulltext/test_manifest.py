@@ -0,0 +1,106 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the download manifest module"""
+
+import hashlib
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltexts
+from .manifest import STATUS_COMPLETE, STATUS_FAILED, open_manifest
+
+DOCUMENTS = {
+    '10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF-1'),
+    '10.1103/PhysRevB.1.2': MockDocument('Crossref', '16', b'%PDF-2'),
+    '10.1103/PhysRevB.1.404': MockDocument('Crossref', '16', None),
+}
+
+
+class ManifestTest(TestCase):
+    """Test the manifest and resuming with get_fulltexts"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.config = {"storage": {"fulltext": tmpdir.name}}
+        self.prefixed_ids = ['doi:' + doi for doi in DOCUMENTS]
+
+    def test_record(self):
+        """Status, size and hash of every retrieval are recorded"""
+        with MockServer(DOCUMENTS) as server:
+            list(get_fulltexts(self.prefixed_ids, self.config))
+
+        with open_manifest(self.config) as manifest:
+            entry = manifest.get('doi:10.1103/PhysRevB.1.1')
+            self.assertEqual(entry['status'], STATUS_COMPLETE)
+            self.assertEqual(entry['files'], {'doi/10.1103/PhysRevB.1.1/fulltext.pdf': {
+                'size': 6,
+                'sha1': hashlib.sha1(b'%PDF-1').hexdigest(),
+                'sha256': hashlib.sha256(b'%PDF-1').hexdigest(),
+                'url': server.url + '/aps/10.1103/physrevb.1.1',
+                'etag': '"{0}"'.format(hashlib.sha1(b'%PDF-1').hexdigest()),
+                'validation': 'no_eof',
+            }})
+            entry = manifest.get('doi:10.1103/PhysRevB.1.404')
+            self.assertEqual(entry['status'], STATUS_FAILED)
+            self.assertIn('Not Found', entry['error'])
+            self.assertIsNone(manifest.get('doi:10.1103/PhysRevB.1.3'))
+
+    def test_skip_existing(self):
+        """Only failed, missing or deleted fulltexts are retrieved again"""
+        with MockServer(DOCUMENTS) as server:
+            list(get_fulltexts(self.prefixed_ids[:2], self.config))
+            os.remove(os.path.join(self.config["storage"]["fulltext"],
+                                   'doi/10.1103/PhysRevB.1.2/fulltext.pdf'))
+            results = list(get_fulltexts(self.prefixed_ids, self.config,
+                                         skip_existing=True))
+
+        statuses = {result.prefixed_identifier: result.status for result in results}
+        self.assertEqual(statuses, {
+            'doi:10.1103/PhysRevB.1.1': 'skipped',
+            'doi:10.1103/PhysRevB.1.2': 'complete',
+            'doi:10.1103/PhysRevB.1.404': 'failed',
+        })
+        self.assertEqual(len(server.requests), 4)
+
+    def test_normalised(self):
+        """DOIs are recorded case-insensitively and checked once when skipping"""
+        with MockServer(DOCUMENTS) as server:
+            list(get_fulltexts(self.prefixed_ids[:1], self.config))
+            with open_manifest(self.config) as manifest, \
+                    mock.patch.object(manifest, 'is_complete',
+                                      wraps=manifest.is_complete) as is_complete:
+                results = list(get_fulltexts(['doi:10.1103/PHYSREVB.1.1'], self.config,
+                                             manifest=manifest, skip_existing=True))
+                self.assertEqual(is_complete.call_count, 1)
+
+        self.assertEqual([result.status for result in results], ['skipped'])
+        self.assertEqual(len(server.requests), 1)
+
+    def test_conditional(self):
+        """Unchanged fulltexts are not downloaded again"""
+        path = os.path.join(self.config["storage"]["fulltext"],
+                            'doi/10.1103/PhysRevB.1.1/fulltext.pdf')
+        with MockServer(DOCUMENTS) as server:
+            list(get_fulltexts(self.prefixed_ids[:1], self.config))
+            with open_manifest(self.config) as manifest:
+                entry = manifest.get(self.prefixed_ids[0])
+            results = list(get_fulltexts(self.prefixed_ids[:1], self.config))
+            self.assertEqual(server.statuses, [200, 304])
+
+            self.assertEqual(results[0].status, STATUS_COMPLETE)
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), b'%PDF-1')
+            with open_manifest(self.config) as manifest:
+                self.assertEqual(manifest.get(self.prefixed_ids[0])['files'],
+                                 entry['files'])
+
+            # Without the file or with conditional requests disabled,
+            # the fulltext is downloaded again
+            os.remove(path)
+            list(get_fulltexts(self.prefixed_ids[:1], self.config))
+            self.config["http"] = {"conditional": False}
+            list(get_fulltexts(self.prefixed_ids[:1], self.config))
+            self.assertEqual(server.statuses, [200, 304, 200, 200])
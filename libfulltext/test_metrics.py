@@ -0,0 +1,108 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the metrics module"""
+
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltexts
+from .metrics import Counters, JsonLinesSink, Metrics, stage_prefixes
+
+DOCUMENTS = {
+    '10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF-1'),
+    '10.1103/PhysRevB.1.404': MockDocument('Crossref', '16', None),
+    '10.5555/unknown': MockDocument('Crossref', '1', b'%PDF'),
+}
+
+
+class MetricsTest(TestCase):
+    """Test recording metrics with get_fulltexts"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = tmpdir.name
+        self.counters = Counters()
+        self.log = io.StringIO()
+        metrics = Metrics([self.counters, JsonLinesSink(self.log)])
+        with MockServer(DOCUMENTS):
+            list(get_fulltexts(['doi:' + doi for doi in DOCUMENTS],
+                               {"storage": {"fulltext": tmpdir.name},
+                                "routing": {"prefixes": False, "prefetch": 0}},
+                               metrics=metrics))
+
+    def test_stages(self):
+        """Every stage of every retrieval is recorded"""
+        events = [json.loads(line) for line in self.log.getvalue().splitlines()]
+        stages = [(event['stage'], event['status'], event['outcome'])
+                  for event in events
+                  if event['identifier'] == 'doi:10.1103/PhysRevB.1.1']
+        self.assertEqual(stages, [('doiRA', 200, 'complete'),
+                                  ('crossref', 200, 'complete'),
+                                  ('aps', 200, 'complete'),
+                                  ('save', None, 'complete'),
+                                  ('fulltext', None, 'complete')])
+        self.assertEqual([event['bytes'] for event in events
+                          if event['stage'] == 'save'], [6])
+        self.assertEqual(self.counters.stages['fulltext']['failed'], 2)
+        self.assertEqual(self.counters.stages['doiRA']['count'], 3)
+
+    def test_publishers(self):
+        """Outcomes are counted per publisher"""
+        self.assertEqual(dict(self.counters.publishers), {
+            'aps': {'complete': 1, 'failed': 1, 'bytes': 6},
+            'unknown': {'complete': 0, 'failed': 1, 'bytes': 0},
+        })
+        summary = self.counters.summary()
+        self.assertIn('3 retrievals', summary)
+        self.assertIn('aps: 1 complete, 1 failed, 6 bytes', summary)
+
+    def test_prometheus(self):
+        """Counters are written in the Prometheus text format"""
+        filename = os.path.join(self.root, 'metrics.prom')
+        self.counters.write_prometheus(filename)
+        with open(filename) as file:
+            lines = file.read().splitlines()
+        self.assertIn('libfulltext_stage_total{stage="aps"} 2', lines)
+        self.assertIn('libfulltext_fulltexts_total{publisher="aps",outcome="failed"} 1',
+                      lines)
+
+
+class ConcurrentMetricsTest(TestCase):
+    """Test recording metrics of concurrent retrievals"""
+
+    def test_workers(self):
+        """Every request of workers sharing the session is recorded"""
+        dois = ['10.1103/PhysRevB.2.{0}'.format(number) for number in range(60)]
+        counters = Counters()
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                MockServer({doi: MockDocument('Crossref', '16', b'%PDF-1')
+                            for doi in dois}, latency=0.01):
+            list(get_fulltexts(['doi:' + doi for doi in dois],
+                               {"storage": {"fulltext": tmpdir},
+                                "routing": {"prefixes": False, "prefetch": 0}},
+                               workers=8, metrics=Metrics([counters])))
+        for stage in ('doiRA', 'crossref', 'aps', 'save', 'fulltext'):
+            self.assertEqual(counters.stages[stage]['count'], 60, stage)
+        self.assertEqual(dict(counters.publishers),
+                         {'aps': {'complete': 60, 'failed': 0, 'bytes': 360}})
+
+    def test_stages_resolved_once(self):
+        """The URLs of the stages are looked up once per instrumentation"""
+        counters = Counters()
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                MockServer({'10.1103/PhysRevB.2.1': MockDocument('Crossref', '16',
+                                                                 b'%PDF-1')}), \
+                mock.patch('libfulltext.metrics.stage_prefixes',
+                           wraps=stage_prefixes) as prefixes:
+            list(get_fulltexts(['doi:10.1103/PhysRevB.2.1'],
+                               {"storage": {"fulltext": tmpdir},
+                                "routing": {"prefixes": False, "prefetch": 0}},
+                               metrics=Metrics([counters])))
+        self.assertEqual(prefixes.call_count, 1)
+        for stage in ('doiRA', 'crossref', 'aps'):
+            self.assertEqual(counters.stages[stage]['count'], 1, stage)
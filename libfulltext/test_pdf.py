@@ -0,0 +1,101 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the PDF validation module"""
+
+import os
+import tempfile
+from unittest import TestCase
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .daemon import batch_result
+from .fulltext import get_fulltext, get_fulltexts
+from .pdf import REASON_HTML, REASON_NO_EOF, REASON_NOT_PDF, REASON_OK, \
+    REASON_TOO_FEW_PAGES, InvalidPDFError, PDFValidator, pdf_validator
+
+PAGE = b'1 0 obj\n<< /Type /Page /Parent 3 0 R >>\nendobj\n'
+PDF = b'%PDF-1.4\n' + PAGE * 3 + b'3 0 obj\n<< /Type /Pages /Count 3 >>\nendobj\n' \
+    + b'\0' * 4096 + b'trailer\n<< /Root 4 0 R >>\n%%EOF\n'
+
+
+def validate(content, chunk_size=7, **kwargs):
+    """Feed content chunk by chunk to a PDFValidator and finish it"""
+    validator = PDFValidator(**kwargs)
+    for start in range(0, len(content), chunk_size):
+        validator.feed(content[start:start + chunk_size])
+    return validator.finish()
+
+
+class PDFValidatorTest(TestCase):
+    """Test PDFValidator"""
+
+    def test_valid(self):
+        """Valid PDFs are accepted and their pages are counted across chunks"""
+        self.assertEqual(validate(PDF), {'validation': REASON_OK, 'pages': 3})
+        self.assertEqual(validate(PDF.replace(b'/Count 3', b'/Count 12'), 4096),
+                         {'validation': REASON_OK, 'pages': 12})
+
+    def test_not_pdf(self):
+        """HTML pages and other data are rejected after the first bytes"""
+        validator = PDFValidator()
+        with self.assertRaises(InvalidPDFError) as context:
+            validator.feed(b'  <!DOCTYPE html><html>' + b' ' * 2048)
+        self.assertEqual(context.exception.reason, REASON_HTML)
+        with self.assertRaises(InvalidPDFError) as context:
+            validate(b'Access denied')
+        self.assertEqual(context.exception.reason, REASON_NOT_PDF)
+        with self.assertRaises(InvalidPDFError):
+            validate(b'')
+
+    def test_no_eof(self):
+        """PDFs without trailer are reported or, if strict, rejected"""
+        truncated = PDF[:-len(b'%%EOF\n')]
+        self.assertEqual(validate(truncated)['validation'], REASON_NO_EOF)
+        with self.assertRaises(InvalidPDFError) as context:
+            validate(truncated, strict=True)
+        self.assertEqual(context.exception.reason, REASON_NO_EOF)
+
+    def test_min_pages(self):
+        """PDFs with too few pages are rejected, unknown page counts accepted"""
+        with self.assertRaises(InvalidPDFError) as context:
+            validate(PDF, min_pages=4)
+        self.assertEqual(context.exception.reason, REASON_TOO_FEW_PAGES)
+        self.assertEqual(validate(b'%PDF-1.5\n%%EOF', min_pages=4),
+                         {'validation': REASON_OK})
+
+    def test_pdf_validator(self):
+        """Only PDF responses are validated, unless disabled"""
+        headers = {'Content-Type': 'application/pdf'}
+        self.assertIsInstance(pdf_validator(headers, {}), PDFValidator)
+        self.assertIsNone(pdf_validator({'Content-Type': 'text/xml'}, {}))
+        self.assertIsNone(pdf_validator(headers, {'validation': {'pdf': False}}))
+
+    def test_get_fulltext(self):
+        """Invalid downloads are not saved and valid ones record the result"""
+        documents = {'10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', PDF),
+                     '10.1103/PhysRevB.1.2': MockDocument('Crossref', '16',
+                                                          b'<html>Error</html>')}
+        with MockServer(documents), tempfile.TemporaryDirectory() as tmpdir:
+            config = {"storage": {"fulltext": tmpdir}}
+            get_fulltext('doi:10.1103/PhysRevB.1.1', config)
+            with self.assertRaises(InvalidPDFError):
+                get_fulltext('doi:10.1103/PhysRevB.1.2', config)
+            self.assertTrue(os.path.exists(os.path.join(
+                tmpdir, 'doi/10.1103/PhysRevB.1.1/fulltext.pdf')))
+            self.assertEqual(os.listdir(os.path.join(tmpdir, 'doi/10.1103/PhysRevB.1.2')),
+                             [])
+
+    def test_get_fulltexts(self):
+        """The reason code of rejected downloads is part of the result"""
+        documents = {'10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', PDF),
+                     '10.1103/PhysRevB.1.2': MockDocument('Crossref', '16',
+                                                          b'<html>Error</html>')}
+        with MockServer(documents), tempfile.TemporaryDirectory() as tmpdir:
+            results = list(get_fulltexts(['doi:' + doi for doi in documents],
+                                         {"storage": {"fulltext": tmpdir}}))
+
+        self.assertEqual({result.prefixed_identifier: result.reason
+                          for result in results},
+                         {'doi:10.1103/PhysRevB.1.1': None,
+                          'doi:10.1103/PhysRevB.1.2': REASON_HTML})
+        self.assertEqual({batch_result(result).reason for result in results},
+                         {None, REASON_HTML})
@@ -0,0 +1,80 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the rate limiting module"""
+
+import email.utils
+import tempfile
+import time
+from unittest import TestCase
+
+import requests
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltext
+from .ratelimit import TokenBucket, parse_retry_after
+from .session import create_session
+
+
+class TokenBucketTest(TestCase):
+    """Test TokenBucket"""
+
+    def test_rate(self):
+        """Tokens beyond the burst are handed out at the configured rate"""
+        bucket = TokenBucket(rate=10, burst=2)
+        waits = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 0.1, places=2)
+        self.assertAlmostEqual(waits[3], 0.2, places=2)
+
+    def test_unlimited(self):
+        """Without a rate tokens are available immediately"""
+        bucket = TokenBucket()
+        self.assertEqual([bucket.reserve() for _ in range(100)], [0] * 100)
+
+    def test_pause(self):
+        """No tokens are usable during a pause"""
+        bucket = TokenBucket()
+        bucket.pause(5)
+        self.assertAlmostEqual(bucket.reserve(), 5, places=1)
+
+
+class ParseRetryAfterTest(TestCase):
+    """Test parse_retry_after"""
+
+    def test_values(self):
+        """Seconds and HTTP dates are understood"""
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(date), 60, delta=2)
+
+
+class RateLimitedSessionTest(TestCase):
+    """Test the rate limiting of sessions"""
+
+    def test_publisher_config(self):
+        """Rate limits can be configured per publisher"""
+        session = create_session({
+            "http": {"rate_limit": {"rate": 10, "max_retries": 2}},
+            "publishers": {"elsevier": {"rate_limit": {"rate": 2}}},
+        })
+        adapter = session.get_adapter('https://api.elsevier.com/content/article/doi/x')
+        self.assertEqual(adapter.rate_limit["rate"], 2)
+        self.assertEqual(adapter.rate_limit["max_retries"], 2)
+        self.assertEqual(session.get_adapter('https://doi.org/').rate_limit["rate"], 10)
+
+    def test_throttled_retries(self):
+        """Throttled requests are retried up to max_retries times"""
+        documents = {'10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF')}
+        with MockServer(documents) as server, tempfile.TemporaryDirectory() as tmpdir:
+            config = {"storage": {"fulltext": tmpdir},
+                      "http": {"rate_limit": {"max_retries": 2}}}
+            server.throttle = 2
+            get_fulltext('doi:10.1103/PhysRevB.1.1', config)
+            self.assertEqual(len(server.requests), 3)
+
+            server.throttle = 3
+            with self.assertRaises(requests.exceptions.HTTPError) as context:
+                get_fulltext('doi:10.1103/PhysRevB.1.1', config)
+            self.assertIn('Too Many Requests', str(context.exception))
@@ -0,0 +1,88 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the handler registry module"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltext
+from .registry import Handler, describe_handlers, get_crossref_handler, \
+    get_prefix_handler, handler_options, load, register_crossref_handler
+
+
+def aip_getter(doi, save_stream, session):  # pylint: disable=unused-argument
+    """Getter of a configured fake handler"""
+
+
+class RegistryTest(TestCase):
+    """Test the handler registry"""
+
+    def test_lazy_import(self):
+        """Handler modules are not imported with the retrieval functions"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, libfulltext; libfulltext.get_fulltext; '
+            'print(" ".join(sorted(sys.modules)))'
+        ], cwd=root).decode().split()
+        self.assertIn('libfulltext.registry', modules)
+        self.assertNotIn('libfulltext.doi', modules)
+        self.assertNotIn('libfulltext.doi.crossref.aps', modules)
+
+    def test_load(self):
+        """Functions are imported by name or given directly"""
+        from .doi.crossref.aps import get_aps_fulltext_async
+        self.assertIs(load(get_crossref_handler('16'), 'getter_async'),
+                      get_aps_fulltext_async)
+        self.assertIsNone(load(get_crossref_handler('16'), 'prefetcher'))
+        self.assertIs(load(Handler('fake', getter=len)), len)
+
+    def test_unknown(self):
+        """Unknown prefixes and members are reported"""
+        with self.assertRaises(ValueError):
+            get_prefix_handler('unknown')
+        self.assertIsNone(get_crossref_handler('1'))
+
+    def test_options(self):
+        """Options are taken from the publisher settings"""
+        config = {'publishers': {'elsevier': {'apikey': 'secret', 'other': 1}}}
+        self.assertEqual(handler_options(get_crossref_handler('78'), config),
+                         {'apikey': 'secret'})
+        self.assertEqual(handler_options(get_crossref_handler('16'), {}), {})
+        with self.assertRaises(KeyError):
+            handler_options(get_crossref_handler('78'), {})
+
+    def test_describe(self):
+        """Handlers and their capabilities are described"""
+        config = {'handlers': {'crossref': {317: {
+            'name': 'aip', 'module': __name__, 'getter': 'aip_getter',
+        }}}}
+        descriptions = {(description['kind'], description['key']): description
+                        for description in describe_handlers(config)}
+        self.assertEqual(descriptions[('prefix', 'doi')]['capabilities'],
+                         ['sync', 'async', 'prefetch', 'resolve'])
+        self.assertEqual(descriptions[('crossref', '297')]['name'], 'springer')
+        self.assertEqual(descriptions[('crossref', '317')]['capabilities'], ['sync'])
+        self.assertNotIn(('crossref', '317'), dict.fromkeys(
+            (description['kind'], description['key'])
+            for description in describe_handlers()))
+
+    def test_register(self):
+        """Registered handlers retrieve fulltexts"""
+        saved = []
+
+        def getter(doi, save_stream, session):  # pylint: disable=unused-argument
+            """Getter recording the DOI"""
+            saved.append(doi)
+
+        with mock.patch.dict('libfulltext.registry.CROSSREF_MEMBER_HANDLERS'), \
+                MockServer({'10.5555/1': MockDocument('Crossref', '1', b'%PDF')}), \
+                tempfile.TemporaryDirectory() as tmpdir:
+            register_crossref_handler('1', Handler('test', getter=getter))
+            get_fulltext('doi:10.5555/1', {"storage": {"fulltext": tmpdir}})
+        self.assertEqual(saved, ['10.5555/1'])
+        self.assertIsNone(get_crossref_handler('1'))
@@ -0,0 +1,53 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the preflight resolver module"""
+
+import os
+
+from .resolve import AVAILABILITY_AVAILABLE, AVAILABILITY_UNAVAILABLE, \
+    AVAILABILITY_UNRESOLVED, AVAILABILITY_UNSUPPORTED, resolve_fulltext, \
+    resolve_fulltexts
+from .test_fulltext import MOCK_DOCUMENTS, MockServerTestCase
+
+
+class ResolveTest(MockServerTestCase):
+    """Test resolving fulltexts against the mock server"""
+
+    def test_available(self):
+        """Available fulltexts are probed with HEAD requests, nothing is saved"""
+        result = resolve_fulltext('doi:10.1016/j.test.1', self.config)
+        self.assertEqual(result.availability, AVAILABILITY_AVAILABLE)
+        self.assertEqual(result.route['handler'], 'elsevier')
+        self.assertEqual(result.route['registration_agency'], 'Crossref')
+        self.assertEqual(result.http_status, 200)
+        self.assertEqual(result.size, len(b'%PDF-elsevier'))
+        self.assertEqual(self.server.methods, ['HEAD'])
+        self.assertFalse(os.path.exists(os.path.join(self.config["storage"]["fulltext"],
+                                                     'doi')))
+
+    def test_outcomes(self):
+        """Unavailable, unsupported and unknown fulltexts are told apart"""
+        self.config["routing"] = {"prefixes": False}
+        dois = list(MOCK_DOCUMENTS) + ['10.1103/PhysRevB.1.unknown']
+        results = list(resolve_fulltexts(['doi:' + doi for doi in dois] + ['x:1'],
+                                         self.config, workers=2))
+        self.assertEqual([result.prefixed_identifier for result in results],
+                         ['doi:' + doi for doi in dois] + ['x:1'])
+        availability = {result.prefixed_identifier: result.availability
+                        for result in results}
+        self.assertEqual(availability, {
+            'doi:10.1103/PhysRevB.1.1': AVAILABILITY_AVAILABLE,
+            'doi:10.1016/j.test.1': AVAILABILITY_AVAILABLE,
+            'doi:10.1007/test-1': AVAILABILITY_AVAILABLE,
+            'doi:10.1103/PhysRevB.1.404': AVAILABILITY_UNAVAILABLE,
+            'doi:10.5555/unknown': AVAILABILITY_UNSUPPORTED,
+            'doi:10.5281/zenodo.1': AVAILABILITY_UNSUPPORTED,
+            'doi:10.1103/PhysRevB.1.unknown': AVAILABILITY_UNRESOLVED,
+            'x:1': AVAILABILITY_UNSUPPORTED,
+        })
+        self.assertEqual(results[4].route, {'registration_agency': 'Crossref',
+                                            'member': '1',
+                                            'publisher': 'Mock Publisher'})
+        self.assertEqual(results[3].http_status, 404)
+        self.assertNotIn('GET', [method for method, path
+                                 in zip(self.server.methods, self.server.requests)
+                                 if not path.startswith(('/doiRA', '/crossref'))])
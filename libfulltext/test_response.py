@@ -0,0 +1,77 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the response functions"""
+
+import hashlib
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from .response import AtomicFileWriter, PartialFileLockedError
+
+
+class AtomicFileWriterTest(TestCase):
+    """Test AtomicFileWriter"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'fulltext.pdf')
+        with open(self.filename, 'wb') as file:
+            file.write(b'old')
+
+    def read(self):
+        """Content of the written file"""
+        with open(self.filename, 'rb') as file:
+            return file.read()
+
+    def test_commit(self):
+        """Committing replaces the file and reports size and hashes"""
+        with AtomicFileWriter(self.filename) as writer:
+            writer.write(b'%PDF')
+            self.assertEqual(self.read(), b'old')
+            writer.write(b'-1.4')
+            saved = writer.commit()
+
+        self.assertEqual(self.read(), b'%PDF-1.4')
+        self.assertEqual(saved, {'size': 8,
+                                 'sha1': hashlib.sha1(b'%PDF-1.4').hexdigest(),
+                                 'sha256': hashlib.sha256(b'%PDF-1.4').hexdigest()})
+        self.assertFalse(os.path.exists(writer.partial_filename))
+
+    def test_failure(self):
+        """A failed download leaves the previous file untouched"""
+        with self.assertRaises(IOError):
+            with AtomicFileWriter(self.filename) as writer:
+                writer.write(b'%PDF')
+                raise IOError('Connection lost')
+
+        self.assertEqual(self.read(), b'old')
+        self.assertFalse(os.path.exists(writer.partial_filename))
+
+    def test_concurrent_writer(self):
+        """A second writer of the same file fails without clobbering the first"""
+        with AtomicFileWriter(self.filename) as writer:
+            writer.write(b'%PDF')
+            with self.assertRaises(PartialFileLockedError):
+                AtomicFileWriter(self.filename)
+            writer.write(b'-1.4')
+            writer.commit()
+
+        self.assertEqual(self.read(), b'%PDF-1.4')
+
+    def test_fsync(self):
+        """The file is flushed to disk before it is renamed"""
+        replace = os.replace
+
+        def checked_replace(*args):
+            """os.replace checking that the file has been flushed"""
+            self.assertEqual(fsync.call_count, 1)
+            replace(*args)
+
+        with mock.patch('os.fsync') as fsync, mock.patch('os.replace', checked_replace):
+            with AtomicFileWriter(self.filename) as writer:
+                writer.write(b'%PDF')
+                writer.commit()
+            self.assertEqual(fsync.call_count, 2)
+
+        self.assertEqual(self.read(), b'%PDF')
@@ -0,0 +1,93 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the resumable download module"""
+
+import os
+import tempfile
+from unittest import TestCase
+
+import requests
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltext
+from .response import PARTIAL_SUFFIX
+from .resume import PARTIAL_INFO_SUFFIX, read_partials
+
+DOI = '10.1103/PhysRevB.1.1'
+CONTENT = b'%PDF-1.4' + bytes(256 * 400 - 15) + b'\n%%EOF\n'
+
+
+class ResumeTest(TestCase):
+    """Test resuming interrupted downloads with get_fulltext"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        # Chunks cut off by a closed connection are lost, hence the
+        # truncated bodies (halves of the remaining content) are multiples
+        # of the chunk size
+        self.config = {"storage": {"fulltext": tmpdir.name, "chunk_size": 256}}
+        self.path = os.path.join(tmpdir.name, 'doi', DOI, 'fulltext.pdf')
+
+    def assert_content(self, content):
+        """Assert the content of the saved fulltext, without partial files"""
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['fulltext.pdf'])
+
+    def test_resume(self):
+        """Interrupted downloads are continued with Range requests"""
+        with MockServer({DOI: MockDocument('Crossref', '16', CONTENT)}) as server:
+            server.truncate = 2
+            get_fulltext('doi:' + DOI, self.config)
+            self.assertEqual(server.statuses[-3:], [200, 206, 206])
+        self.assert_content(CONTENT)
+
+    def test_resume_later(self):
+        """Partial files are kept and continued by the next retrieval"""
+        with MockServer({DOI: MockDocument('Crossref', '16', CONTENT)}) as server:
+            server.truncate = 4
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                get_fulltext('doi:' + DOI, self.config)
+            self.assertFalse(os.path.exists(self.path))
+            partials = read_partials(os.path.dirname(self.path))
+            self.assertEqual(list(partials.values())[0]['offset'],
+                             len(CONTENT) - len(CONTENT) // 16)
+
+            get_fulltext('doi:' + DOI, self.config)
+            self.assertEqual(server.statuses[-1], 206)
+        self.assert_content(CONTENT)
+
+    def test_changed(self):
+        """Partial files of changed fulltexts are discarded"""
+        with MockServer({DOI: MockDocument('Crossref', '16', CONTENT)}) as server:
+            server.truncate = 4
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                get_fulltext('doi:' + DOI, self.config)
+        with MockServer({DOI: MockDocument('Crossref', '16', b'%PDF-2')}) as server:
+            get_fulltext('doi:' + DOI, self.config)
+            self.assertEqual(server.statuses[-1], 200)
+        self.assert_content(b'%PDF-2')
+
+    def test_encoded(self):
+        """Interrupted downloads with Content-Encoding are not resumed"""
+        with MockServer({DOI: MockDocument('Crossref', '16', CONTENT)}) as server:
+            server.gzip = True
+            server.truncate = 1
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                get_fulltext('doi:' + DOI, self.config)
+            self.assertEqual(read_partials(os.path.dirname(self.path)), {})
+
+            get_fulltext('doi:' + DOI, self.config)
+            self.assertEqual(server.statuses[-1], 200)
+        self.assert_content(CONTENT)
+
+    def test_disabled(self):
+        """Without resume retries, interrupted downloads are discarded"""
+        self.config["http"] = {"resume_retries": 0}
+        with MockServer({DOI: MockDocument('Crossref', '16', CONTENT)}) as server:
+            server.truncate = 1
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                get_fulltext('doi:' + DOI, self.config)
+        self.assertFalse(os.path.exists(self.path + PARTIAL_SUFFIX))
+        self.assertFalse(os.path.exists(self.path + PARTIAL_SUFFIX + PARTIAL_INFO_SUFFIX))
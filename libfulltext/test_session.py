@@ -0,0 +1,48 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the HTTP session module"""
+
+import tempfile
+from unittest import TestCase
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltexts
+from .session import create_session
+
+
+class CreateSessionTest(TestCase):
+    """Test create_session"""
+
+    config = {"http": {
+        "timeout": 5,
+        "pool_maxsize": 20,
+        "hosts": {"api.elsevier.com": {"pool_maxsize": 2, "retries": 0}},
+    }}
+
+    def test_defaults(self):
+        """Adapters for all hosts get the configured defaults"""
+        adapter = create_session(self.config).get_adapter('https://doi.org/doiRA/x')
+        self.assertEqual(adapter.timeout, 5)
+        self.assertEqual(adapter._pool_maxsize, 20)  # pylint: disable=W0212
+        self.assertEqual(adapter.max_retries.total, 3)
+
+    def test_host_overrides(self):
+        """Host sections override the defaults"""
+        adapter = create_session(self.config).get_adapter(
+            'https://api.elsevier.com/content/article/doi/x')
+        self.assertEqual(adapter.timeout, 5)
+        self.assertEqual(adapter._pool_maxsize, 2)  # pylint: disable=W0212
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_connection_reuse(self):
+        """Connections are reused across the retrievals of a batch"""
+        dois = ['10.1103/PhysRevB.{0}'.format(i) for i in range(10)]
+        documents = {doi: MockDocument('Crossref', '16', b'%PDF') for doi in dois}
+
+        with MockServer(documents) as server, tempfile.TemporaryDirectory() as tmpdir:
+            results = list(get_fulltexts(['doi:' + doi for doi in dois],
+                                         {"storage": {"fulltext": tmpdir}}))
+
+        self.assertEqual([result.error for result in results], [None] * 10)
+        self.assertEqual(len(server.requests), 10)
+        self.assertEqual(len(server.connections), 1)
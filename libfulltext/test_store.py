@@ -0,0 +1,105 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the content-addressed fulltext store module"""
+
+import hashlib
+import os
+import tempfile
+from unittest import TestCase
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltexts
+from .store import open_fulltext_store
+
+DOCUMENTS = {
+    '10.1103/PhysRevB.1.1': MockDocument('Crossref', '16', b'%PDF-same'),
+    '10.1103/PhysRevB.1.2': MockDocument('Crossref', '16', b'%PDF-same'),
+    '10.1103/PhysRevB.1.3': MockDocument('Crossref', '16', b'%PDF-other'),
+}
+
+
+class FulltextStoreTest(TestCase):
+    """Test storing fulltexts by content with get_fulltexts"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = tmpdir.name
+        self.config = {"storage": {"fulltext": tmpdir.name,
+                                   "store": {"enabled": True}}}
+
+    def fulltext_path(self, doi):
+        """Path of the fulltext of a DOI in the usual layout"""
+        return os.path.join(self.root, 'doi', doi, 'fulltext.pdf')
+
+    def retrieve(self, dois):
+        """Retrieve the fulltexts of DOIs from the mock server"""
+        with MockServer(DOCUMENTS):
+            results = list(get_fulltexts(['doi:' + doi for doi in dois], self.config))
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_deduplication(self):
+        """Identical fulltexts share one blob, also under DOI aliases"""
+        self.retrieve(['10.1103/PhysRevB.1.1', '10.1103/PhysRevB.1.2',
+                       '10.1103/PhysRevB.1.3', '10.1103/physrevb.1.1'])
+
+        same_sha256 = hashlib.sha256(b'%PDF-same').hexdigest()
+        with open_fulltext_store(self.config) as store:
+            blob_path = store.blob_path(same_sha256)
+            self.assertEqual(store.get('doi:10.1103/PHYSREVB.1.1'),
+                             {'fulltext.pdf': same_sha256})
+        for doi in ['10.1103/PhysRevB.1.1', '10.1103/PhysRevB.1.2']:
+            self.assertTrue(os.path.samefile(self.fulltext_path(doi), blob_path))
+        # The manifest records the alias as the same DOI, whose fulltext is
+        # unchanged, hence it is not saved again
+        self.assertFalse(os.path.exists(self.fulltext_path('10.1103/physrevb.1.1')))
+        self.assertEqual(os.stat(blob_path).st_nlink, 3)
+        self.assertEqual(len(os.listdir(os.path.dirname(blob_path))), 1)
+
+    def test_symlink(self):
+        """Files in the usual layout can be symlinks to the blobs"""
+        self.config["storage"]["store"]["link"] = "symlink"
+        self.retrieve(['10.1103/PhysRevB.1.1'])
+
+        path = self.fulltext_path('10.1103/PhysRevB.1.1')
+        self.assertTrue(os.path.islink(path))
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'%PDF-same')
+
+    def test_verify(self):
+        """Missing and corrupted blobs are found"""
+        self.retrieve(['10.1103/PhysRevB.1.1', '10.1103/PhysRevB.1.3'])
+
+        with open_fulltext_store(self.config) as store:
+            self.assertEqual(list(store.verify()), [])
+            corrupted = hashlib.sha256(b'%PDF-other').hexdigest()
+            with open(store.blob_path(corrupted), 'ab') as file:
+                file.write(b'garbage')
+            self.assertEqual(list(store.verify()), [corrupted])
+
+    def test_prune(self):
+        """Blobs no longer indexed are removed"""
+        self.retrieve(['10.1103/PhysRevB.1.1', '10.1103/PhysRevB.1.3'])
+
+        path = self.fulltext_path('10.1103/PhysRevB.1.3')
+        os.remove(path)
+        with open(path, 'wb') as file:
+            file.write(b'%PDF-new')
+        new = hashlib.sha256(b'%PDF-new').hexdigest()
+        old = hashlib.sha256(b'%PDF-other').hexdigest()
+        with open_fulltext_store(self.config) as store:
+            store.add('doi:10.1103/PhysRevB.1.3', 'fulltext.pdf', path,
+                      {'size': 8, 'sha256': new})
+            self.assertEqual(list(store.prune()), [old])
+            self.assertFalse(os.path.exists(store.blob_path(old)))
+            self.assertEqual(list(store.prune()), [])
+            self.assertEqual(list(store.verify()), [])
+
+    def test_disabled(self):
+        """Without store, fulltexts are plain files"""
+        del self.config["storage"]["store"]
+        self.retrieve(['10.1103/PhysRevB.1.1'])
+
+        self.assertIsNone(open_fulltext_store(self.config))
+        self.assertEqual(os.stat(self.fulltext_path('10.1103/PhysRevB.1.1')).st_nlink, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'store')))
@@ -0,0 +1,125 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the shared work queue module"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+
+from libfulltext_testing.mockserver import MockDocument, MockServer
+
+from .fulltext import get_fulltexts
+from .manifest import STATUS_COMPLETE, STATUS_FAILED
+from .workqueue import QUEUE_DEFERRED, QUEUE_LEASED, QUEUE_PENDING, WorkQueue
+
+
+def claim_all(path):
+    """Claim all items of a queue in a separate process"""
+    with WorkQueue(path) as queue:
+        identifiers = []
+        for prfid in queue.claimed(batch_size=3):
+            identifiers.append(prfid)
+            queue.finish(prfid, STATUS_COMPLETE)
+        return identifiers
+
+
+class WorkQueueTest(TestCase):
+    """Test WorkQueue"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'queue.sqlite')
+
+    def test_add(self):
+        """Identifiers are queued once per normalised form"""
+        with WorkQueue(self.path) as queue:
+            self.assertEqual(queue.add(['doi:10.1000/A', 'doi:10.1000/a', 'x:1']), 2)
+            self.assertEqual(queue.add(['x:1', 'x:2']), 1)
+            self.assertEqual(queue.counts(), {QUEUE_PENDING: 3})
+
+    def test_claim_finish(self):
+        """Claimed items are not claimed again and can be finished"""
+        with WorkQueue(self.path, node='a') as node_a, \
+                WorkQueue(self.path, node='b') as node_b:
+            node_a.add(['x:1', 'x:2', 'x:3'])
+            claimed_a = node_a.claim(2)
+            claimed_b = node_b.claim(2)
+            self.assertEqual(len(claimed_a), 2)
+            self.assertEqual(sorted(claimed_b),
+                             sorted({'x:1', 'x:2', 'x:3'} - set(claimed_a)))
+            self.assertEqual(node_b.claim(), [])
+
+            self.assertTrue(node_a.finish(claimed_a[0], STATUS_COMPLETE))
+            self.assertTrue(node_a.finish(claimed_a[1], STATUS_FAILED, 'error'))
+            # Items leased by another node are left to it
+            self.assertFalse(node_a.finish(claimed_b[0], STATUS_COMPLETE))
+            self.assertEqual(node_a.counts(), {STATUS_COMPLETE: 1, STATUS_FAILED: 1,
+                                               QUEUE_LEASED: 1})
+
+    def test_lease_expiry(self):
+        """Items of crashed nodes are claimed again once the lease expired"""
+        with WorkQueue(self.path, node='a', lease_seconds=10) as node_a, \
+                WorkQueue(self.path, node='b') as node_b:
+            node_a.add(['x:1'])
+            self.assertEqual(node_a.claim(), ['x:1'])
+            self.assertEqual(node_b.claim(), [])
+            with mock.patch('time.time', return_value=time.time() + 11):
+                self.assertEqual(node_b.claim(), ['x:1'])
+            self.assertFalse(node_a.finish('x:1', STATUS_COMPLETE))
+            self.assertTrue(node_b.finish('x:1', STATUS_COMPLETE))
+
+    def test_renewing(self):
+        """Leases renewed while working do not expire"""
+        with WorkQueue(self.path, node='a', lease_seconds=0.3) as node_a, \
+                WorkQueue(self.path, node='b') as node_b:
+            node_a.add(['x:1'])
+            self.assertEqual(node_a.claim(), ['x:1'])
+            with node_a.renewing():
+                time.sleep(0.6)
+                self.assertEqual(node_b.claim(), [])
+            self.assertTrue(node_a.finish('x:1', STATUS_COMPLETE))
+
+    def test_defer(self):
+        """Deferred items are claimed again after the given time"""
+        with WorkQueue(self.path, node='a') as queue:
+            queue.add(['x:1'])
+            self.assertEqual(queue.claim(), ['x:1'])
+            self.assertTrue(queue.defer('x:1', 10))
+            self.assertEqual(queue.counts(), {QUEUE_DEFERRED: 1})
+            self.assertEqual(queue.claim(), [])
+            with mock.patch('time.time', return_value=time.time() + 11):
+                self.assertEqual(queue.claim(), ['x:1'])
+            self.assertTrue(queue.finish('x:1', STATUS_COMPLETE))
+
+    def test_get_fulltexts(self):
+        """Without read-ahead, items are claimed as the workers take them"""
+        dois = ['10.1103/PhysRevB.3.{0}'.format(number) for number in range(20)]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                MockServer({doi: MockDocument('Crossref', '16', b'%PDF-1')
+                            for doi in dois}), \
+                WorkQueue(self.path) as queue:
+            queue.add('doi:' + doi for doi in dois)
+            results = get_fulltexts(queue.claimed(batch_size=1),
+                                    {"storage": {"fulltext": tmpdir},
+                                     "routing": {"prefixes": True, "prefetch": 0}})
+            for result in results:
+                self.assertTrue(queue.finish(result.prefixed_identifier,
+                                             result.status))
+                self.assertLessEqual(queue.counts().get(QUEUE_LEASED, 0), 2)
+            self.assertEqual(queue.counts(), {STATUS_COMPLETE: 20})
+
+    def test_processes(self):
+        """Processes working on one queue share the items without duplicates"""
+        identifiers = ['x:{0}'.format(i) for i in range(100)]
+        with WorkQueue(self.path) as queue:
+            queue.add(identifiers)
+
+        with multiprocessing.Pool(4) as pool:
+            claimed = pool.map(claim_all, [self.path] * 4)
+
+        all_claimed = [prfid for node_claimed in claimed for prfid in node_claimed]
+        self.assertEqual(sorted(all_claimed), sorted(identifiers))
+        with WorkQueue(self.path) as queue:
+            self.assertEqual(queue.counts(), {STATUS_COMPLETE: 100})
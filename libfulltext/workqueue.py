@@ -0,0 +1,250 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Shared work queue module
+
+Several nodes (processes or machines with a shared storage) retrieve the
+identifiers of one queue without duplicate work: each node claims items
+for a limited time (the lease) and records their outcome. Items whose
+lease expired, e.g. because the node crashed, are claimed again by others.
+While a node works, it renews its leases periodically (see renewing), such
+that items taking longer than the lease are not claimed by others.
+"""
+
+import contextlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from .store import normalise_identifier
+
+# Statuses of an item in the queue, besides STATUS_COMPLETE and STATUS_FAILED
+# of the manifest for finished items
+QUEUE_PENDING = 'pending'
+QUEUE_LEASED = 'leased'
+# Items put back for a later pass, claimable again once lease_expires passed
+QUEUE_DEFERRED = 'deferred'
+
+# Seconds for which claimed items are reserved for a node by default
+DEFAULT_LEASE_SECONDS = 600
+
+# Seconds to wait for another node holding the lock on the queue
+LOCK_TIMEOUT = 60
+
+
+class WorkQueue:
+    """SQLite-backed queue of prefixed identifiers shared between nodes
+
+    Identifiers are queued once per normalised form (see
+    normalise_identifier). SQLite serialises all writes with a lock on the
+    database file, which requires a shared file system with working POSIX
+    locks. A WorkQueue object must not be shared between threads.
+    """
+
+    def __init__(self, path, node=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Open or create a queue
+
+        Args:
+            path:          SQLite database file
+            node:          name of this node in the leases
+                           (default: host name and process ID)
+            lease_seconds: seconds for which claimed items are reserved
+        """
+        self.path = path
+        self.node = node or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.lease_seconds = lease_seconds
+        # Transactions are started explicitly (see _transaction)
+        self._connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT,
+                                           isolation_level=None)
+        with self._transaction():
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS items ('
+                'key TEXT PRIMARY KEY, identifier TEXT, status TEXT, node TEXT, '
+                'lease_expires REAL, attempts INTEGER, error TEXT)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS items_status ON items (status)'
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the underlying database"""
+        self._connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Transaction holding the write lock, committed unless an error is raised"""
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._connection.execute('COMMIT')
+
+    def add(self, prefixed_identifiers):
+        """Queue identifiers, those queued already are ignored
+
+        Args:
+            prefixed_identifiers: iterable of prefixed identifiers
+
+        Returns:
+            number of newly queued identifiers
+        """
+        with self._transaction():
+            before = self._connection.total_changes
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO items VALUES (?, ?, ?, NULL, NULL, 0, NULL)',
+                ((normalise_identifier(prfid), prfid, QUEUE_PENDING)
+                 for prfid in prefixed_identifiers)
+            )
+            return self._connection.total_changes - before
+
+    def claim(self, count=1):
+        """Lease pending items and items whose lease or deferral expired
+
+        Args:
+            count: maximum number of items to claim
+
+        Returns:
+            list of claimed prefixed identifiers (empty if there is no work)
+        """
+        now = time.time()
+        with self._transaction():
+            rows = self._connection.execute(
+                'SELECT key, identifier FROM items WHERE status = ? '
+                'OR (status IN (?, ?) AND lease_expires < ?) LIMIT ?',
+                (QUEUE_PENDING, QUEUE_LEASED, QUEUE_DEFERRED, now, count)
+            ).fetchall()
+            self._connection.executemany(
+                'UPDATE items SET status = ?, node = ?, lease_expires = ?, '
+                'attempts = attempts + 1 WHERE key = ?',
+                ((QUEUE_LEASED, self.node, now + self.lease_seconds, key)
+                 for key, _ in rows)
+            )
+        return [identifier for _, identifier in rows]
+
+    def claimed(self, batch_size=10):
+        """Claim items in batches until the queue is exhausted
+
+        Items are claimed lazily, once the preceding ones have been taken.
+        Consumers reading far ahead (like get_fulltexts with prefetching, see
+        "routing" in doc/config.md) hold leases on items they do not work on
+        yet, which may expire and be claimed by other nodes meanwhile.
+
+        Args:
+            batch_size: number of items claimed at once
+
+        Yields:
+            claimed prefixed identifiers
+        """
+        while True:
+            identifiers = self.claim(batch_size)
+            if not identifiers:
+                return
+            yield from identifiers
+
+    def renew(self):
+        """Extend the leases of all items claimed by this node
+
+        Returns:
+            number of renewed leases
+        """
+        with self._transaction():
+            cursor = self._connection.execute(
+                'UPDATE items SET lease_expires = ? WHERE status = ? AND node = ?',
+                (time.time() + self.lease_seconds, QUEUE_LEASED, self.node)
+            )
+            return cursor.rowcount
+
+    @contextlib.contextmanager
+    def renewing(self, interval=None):
+        """Renew the leases of this node periodically while in the context
+
+        The leases are renewed by a background thread with its own
+        connection to the queue, such that they do not expire while items
+        are being retrieved. Renewals failing because the queue is locked for
+        too long are retried at the next interval.
+
+        Args:
+            interval: seconds between renewals (default: a third of the lease)
+        """
+        if interval is None:
+            interval = self.lease_seconds / 3
+        stop = threading.Event()
+
+        def heartbeat():
+            """Renew the leases until stopped"""
+            with WorkQueue(self.path, self.node, self.lease_seconds) as queue:
+                while not stop.wait(interval):
+                    try:
+                        queue.renew()
+                    except sqlite3.OperationalError:
+                        pass
+
+        thread = threading.Thread(target=heartbeat, name='lease-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def finish(self, prefixed_identifier, status, error=None):
+        """Record the outcome of a claimed item
+
+        Items whose lease has been taken over by another node are left
+        to that node.
+
+        Args:
+            prefixed_identifier: claimed prefixed identifier
+            status:              STATUS_COMPLETE or STATUS_FAILED
+            error:               error message of a failed item
+
+        Returns:
+            True if the outcome was recorded
+        """
+        with self._transaction():
+            cursor = self._connection.execute(
+                'UPDATE items SET status = ?, lease_expires = NULL, error = ? '
+                'WHERE key = ? AND status = ? AND node = ?',
+                (status, error, normalise_identifier(prefixed_identifier),
+                 QUEUE_LEASED, self.node)
+            )
+            return cursor.rowcount == 1
+
+    def defer(self, prefixed_identifier, seconds):
+        """Put a claimed item back, to be claimed again after some time
+
+        The item was not attempted, e.g. because the circuit breaker of its
+        publisher is open (see breaker.py), hence the attempt is not counted.
+
+        Args:
+            prefixed_identifier: claimed prefixed identifier
+            seconds:             seconds before the item may be claimed again
+
+        Returns:
+            True if the item was put back
+        """
+        with self._transaction():
+            cursor = self._connection.execute(
+                'UPDATE items SET status = ?, node = NULL, lease_expires = ?, '
+                'attempts = attempts - 1 WHERE key = ? AND status = ? AND node = ?',
+                (QUEUE_DEFERRED, time.time() + seconds,
+                 normalise_identifier(prefixed_identifier), QUEUE_LEASED, self.node)
+            )
+            return cursor.rowcount == 1
+
+    def counts(self):
+        """Number of items per status
+
+        Returns:
+            dict mapping statuses to numbers of items
+        """
+        return dict(self._connection.execute(
+            'SELECT status, COUNT(*) FROM items GROUP BY status').fetchall())
@@ -0,0 +1,6 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""libfulltext_testing module
+
+Test support for libfulltext: the mock server of the tests and the
+benchmarks. It is not installed with libfulltext.
+"""
@@ -0,0 +1,258 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Benchmark module
+
+Measures the throughput, latency and memory usage of get_fulltexts against
+the local mock server (see mockserver.py), such that the retrieval
+pipeline can be benchmarked without network access, and the startup time
+of the get_fulltext command (see run_startup_benchmark).
+
+The mock server runs in a separate process, such that neither its threads
+nor its allocations count towards the measurements of the retrieval. The
+requests of the benchmarked session are redirected to it by transport
+adapters, the library itself is not patched.
+"""
+
+import collections
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from libfulltext.fulltext import get_fulltexts
+from libfulltext.metrics import Metrics
+from libfulltext.session import create_session
+
+from .mockserver import MockDocument, MockServerProcess, PUBLISHER_MEMBERS
+
+# Outcome of a benchmark run (see run_benchmark)
+#   dois:             number of retrieved DOIs
+#   workers:          number of concurrent retrievals
+#   failed:           number of failed retrievals
+#   seconds:          wall time of the whole batch
+#   dois_per_second:  throughput
+#   p50, p99:         percentiles of the seconds per retrieval
+#   peak_memory:      peak size of Python memory allocations in bytes, traced
+#                     with tracemalloc in a separate pass over the batch (the
+#                     tracing slows down the retrieval, so the other values
+#                     are measured without it)
+BenchmarkResult = collections.namedtuple('BenchmarkResult', [
+    'dois', 'workers', 'failed', 'seconds', 'dois_per_second', 'p50', 'p99',
+    'peak_memory',
+])
+
+# Startup times of a command line invocation (see run_startup_benchmark)
+#   case:     description of the invocation
+#   runs:     number of invocations
+#   p50, p99: percentiles of the seconds per invocation
+StartupResult = collections.namedtuple('StartupResult', ['case', 'runs', 'p50', 'p99'])
+
+# Seconds to wait for the daemon of run_startup_benchmark to listen
+DAEMON_TIMEOUT = 30
+
+
+def mock_documents(n_dois, payload_size):
+    """Documents with fulltexts of the APS mock endpoint
+
+    Args:
+        n_dois:       number of documents
+        payload_size: size of each fulltext in bytes
+
+    Returns:
+        dict mapping DOIs to MockDocument objects
+    """
+    content = b'%PDF' + b'0' * max(0, payload_size - 4)
+    return {'10.1103/Benchmark.{0}'.format(i):
+            MockDocument('Crossref', PUBLISHER_MEMBERS['aps'], content)
+            for i in range(n_dois)}
+
+
+def run_benchmark(n_dois, workers=1, latency=0,  # pylint: disable=R0913
+                  payload_size=1024 * 1024, error_rate=0, lookups=True):
+    """Retrieve a batch of DOIs from the mock server and measure the performance
+
+    The batch is retrieved twice, each time into an empty fulltext storage
+    and metadata cache: once timed and once tracing the memory allocations.
+
+    Args:
+        n_dois:       number of DOIs in the batch
+        workers:      number of concurrent retrievals
+        latency:      seconds the mock server waits before each response
+        payload_size: size of each fulltext in bytes
+        error_rate:   fraction of fulltext requests failing with a server error
+        lookups:      if False, DOIs are routed by their prefix, skipping the
+                      registration agency and CrossRef lookups
+
+    Returns:
+        BenchmarkResult
+    """
+    durations = []
+
+    def record_duration(event):
+        """Metrics sink collecting the duration of each retrieval"""
+        if event.stage == 'fulltext':
+            durations.append(event.seconds)
+
+    documents = mock_documents(n_dois, payload_size)
+    prefixed_ids = ['doi:' + doi for doi in documents]
+    with MockServerProcess(documents, latency=latency, error_rate=error_rate) as server:
+        start = time.perf_counter()
+        results = _retrieve(server, prefixed_ids, workers, lookups,
+                            metrics=Metrics([record_duration]))
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            _retrieve(server, prefixed_ids, workers, lookups)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    durations.sort()
+    return BenchmarkResult(
+        dois=n_dois,
+        workers=workers,
+        failed=sum(result.error is not None for result in results),
+        seconds=seconds,
+        dois_per_second=n_dois / seconds,
+        p50=percentile(durations, 50),
+        p99=percentile(durations, 99),
+        peak_memory=peak_memory,
+    )
+
+
+def _retrieve(server, prefixed_ids, workers, lookups,  # pylint: disable=R0913
+              metrics=None):
+    """Retrieve a batch from the mock server into an empty fulltext storage
+    and metadata cache
+
+    Returns:
+        list of FulltextResult
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = {"storage": {"fulltext": tmpdir},
+                  "routing": {"prefixes": not lookups},
+                  "http": {"pool_maxsize": max(10, workers), "retries": 0}}
+        session = create_session(config)
+        server.mount(session)
+        with session:
+            return list(get_fulltexts(prefixed_ids, config, workers=workers,
+                                      session=session, metrics=metrics))
+
+
+def run_startup_benchmark(script, runs=10):
+    """Measure the wall time of invocations of the get_fulltext command
+
+    Every invocation is a new interpreter. The retrievals use an identifier
+    with unknown prefix, which fails without network access, such that they
+    measure the imports and the opening of session, cache and manifest,
+    once in the process and once with a daemon (see daemon.py).
+
+    Args:
+        script: path of the get_fulltext command (bin/get_fulltext.py)
+        runs:   number of invocations per case
+
+    Raises:
+        subprocess.CalledProcessError: an invocation exited unexpectedly
+        RuntimeError: the daemon did not start
+    Returns:
+        list of StartupResult
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, 'config.yaml')
+        with open(config_path, 'w', encoding='utf-8') as file:
+            file.write('storage:\n  fulltext: {0}\n'
+                       .format(os.path.join(tmpdir, 'fulltext')))
+        ids_path = os.path.join(tmpdir, 'ids.txt')
+        with open(ids_path, 'w', encoding='utf-8') as file:
+            file.write('x:1\n')
+        socket_path = os.path.join(tmpdir, 'daemon.sock')
+        command = [sys.executable, script, '-c', config_path]
+        env['XDG_CACHE_HOME'] = os.path.join(tmpdir, 'cache')
+
+        # (case, arguments, with a new config cache per run, exit status)
+        cases = [
+            ('import libfulltext', [sys.executable, '-c', 'import libfulltext'],
+             False, 0),
+            ('--help', [sys.executable, script, '--help'], False, 0),
+            ('--list-handlers, cold config cache', command + ['--list-handlers'],
+             True, 0),
+            ('--list-handlers, warm config cache', command + ['--list-handlers'],
+             False, 0),
+            ('retrieve', command + ['-f', ids_path], False, 1),
+            ('retrieve with --connect',
+             command + ['-f', ids_path, '--connect', socket_path], False, 1),
+        ]
+
+        daemon = subprocess.Popen(command + ['--serve', socket_path], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + DAEMON_TIMEOUT
+            while not os.path.exists(socket_path):
+                if daemon.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('The daemon serving {0} did not start.'
+                                       .format(socket_path))
+                time.sleep(0.01)
+            return [_time_invocations(case, args, runs, returncode,
+                                      env, tmpdir if cold else None)
+                    for case, args, cold, returncode in cases]
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+def _time_invocations(case, args, runs, returncode,  # pylint: disable=R0913
+                      env, cold_cache_root):
+    """Run an invocation several times and measure its wall time
+
+    Args:
+        case:            description of the invocation
+        args:            command line
+        runs:            number of invocations
+        returncode:      expected exit status
+        env:             environment of the invocations
+        cold_cache_root: directory for a new config cache per run
+                         (None: use the cache of env)
+
+    Raises:
+        subprocess.CalledProcessError: an invocation exited unexpectedly
+    Returns:
+        StartupResult
+    """
+    durations = []
+    for run in range(runs):
+        if cold_cache_root is not None:
+            env = dict(env, XDG_CACHE_HOME=os.path.join(
+                cold_cache_root, 'cold-cache-{0}'.format(run)))
+        start = time.perf_counter()
+        # The exit status is checked below, it is not necessarily 0
+        process = subprocess.run(args, env=env, stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                 check=False)
+        durations.append(time.perf_counter() - start)
+        if process.returncode != returncode:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+    durations.sort()
+    return StartupResult(case, runs, percentile(durations, 50), percentile(durations, 99))
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile
+
+    Args:
+        sorted_values: values in ascending order
+        percent:       percentile between 0 and 100
+
+    Returns:
+        the percentile or None if there are no values
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
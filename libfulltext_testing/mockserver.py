@@ -0,0 +1,394 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Local stand-in for doi.org, api.crossref.org and the publisher APIs
+
+The mock server answers the requests of the complete retrieval chain
+(registration agency, CrossRef metadata and publisher fulltext), such that
+it can be exercised without network access. It also emulates the object
+and multipart upload requests of S3 (path-style, without authentication)
+for the buckets in its buckets attribute.
+
+MockServer points the endpoint URLs of the libfulltext modules to itself
+for the tests. MockServerProcess runs the server in a separate process
+instead, e.g. such that it does not compete for the GIL with the code under
+benchmark, and is reached through the transport adapters it mounts on a
+requests session, leaving the modules untouched.
+"""
+
+import collections
+import gzip
+import hashlib
+import http.server
+import importlib
+import json
+import multiprocessing
+import random
+import re
+import socketserver
+import threading
+import time
+from unittest import mock
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from requests.adapters import BaseAdapter
+
+# A document known to the mock server
+#   registration_agency:  as returned by the doi.org doiRA endpoint
+#   member:               CrossRef member ID of the publisher
+#   content:              bytes served as fulltext PDF (None: fulltext not found)
+MockDocument = collections.namedtuple('MockDocument',
+                                      ['registration_agency', 'member', 'content'])
+
+# CrossRef member IDs of the emulated publisher endpoints
+PUBLISHER_MEMBERS = {
+    'aps': '16',
+    'elsevier': '78',
+    'springer': '297',
+}
+
+# Module attributes holding endpoint URLs and the paths emulating them
+ENDPOINTS = [
+    ('libfulltext.doi.DOIRA_URL', '/doiRA/'),
+    ('libfulltext.doi.crossref.CROSSREF_WORKS_URL', '/crossref/v1/works/'),
+    ('libfulltext.doi.crossref.CROSSREF_WORKS_QUERY_URL', '/crossref/v1/works'),
+    ('libfulltext.doi.crossref.aps.APS_FULLTEXT_URL', '/aps/{0}'),
+    ('libfulltext.doi.crossref.elsevier.ELSEVIER_FULLTEXT_URL', '/elsevier/'),
+    ('libfulltext.doi.crossref.springer.SPRINGER_FULLTEXT_URL', '/springer/{0}.pdf'),
+]
+
+
+class MockServer:
+    """HTTP server emulating the services used by libfulltext
+
+    Used as a context manager, the server runs in a background thread and
+    the endpoint URLs of all libfulltext modules point to it.
+    """
+
+    def __init__(self, documents, latency=0, error_rate=0, seed=0):
+        """Create a mock server
+
+        Args:
+            documents:  dict mapping DOIs to MockDocument objects
+            latency:    seconds to wait before answering each request
+            error_rate: fraction of fulltext requests answered with
+                        500 Internal Server Error
+            seed:       seed for choosing the failing requests
+        """
+        self.documents = {doi.lower(): document for doi, document in documents.items()}
+        self.requests = []
+        # Methods of the requests (GET or HEAD)
+        self.methods = []
+        # Status codes of the responses
+        self.statuses = []
+        self.connections = set()
+        # Number of upcoming requests answered with 429 Too Many Requests
+        self.throttle = 0
+        # Number of upcoming fulltext responses whose connection is closed
+        # after half of the body
+        self.truncate = 0
+        # Send the fulltexts gzip-encoded (ranges refer to the encoded body)
+        self.gzip = False
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        # Emulated S3 buckets: dicts mapping keys to the object contents
+        self.buckets = {}
+        # Multipart uploads in progress: dicts mapping part numbers to contents
+        self.uploads = {}
+        # Sizes of all uploaded parts
+        self.part_sizes = []
+        self._server = None
+        self._patches = []
+
+    @property
+    def url(self):
+        """Base URL of the running server"""
+        return 'http://{0}:{1}'.format(*self._server.server_address)
+
+    def __enter__(self):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _MockRequestHandler)
+        self._server.mock = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        self._patches = _start_patches(self.url)
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MockServerProcess:
+    """MockServer running in a separate process
+
+    Its threads neither compete with this process for the GIL nor allocate
+    memory in it, but the recorded requests and the attributes controlling
+    the responses are not available. Requests reach it through sessions on
+    which its adapters are mounted (see mount).
+    """
+
+    def __init__(self, documents, latency=0, error_rate=0, seed=0):
+        """Create a mock server process (see MockServer for the arguments)"""
+        self._args = (documents, latency, error_rate, seed)
+        self._process = None
+        self.url = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=_serve, args=(self._args, sender),
+                                        daemon=True)
+        self._process.start()
+        sender.close()
+        with receiver:
+            try:
+                address = receiver.recv()
+            except EOFError as error:
+                self._process.join()
+                raise RuntimeError('The mock server process exited with status {0}.'
+                                   .format(self._process.exitcode)) from error
+        self.url = 'http://{0}:{1}'.format(*address)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
+
+    def mount(self, session):
+        """Send the requests of a session to the endpoints to the server
+
+        The requests keep their URLs, only the transport adapters of the
+        session (e.g. with their rate limits) send them to the server.
+
+        Args:
+            session: requests.Session
+        """
+        for target, path in ENDPOINTS:
+            module, name = target.rsplit('.', 1)
+            prefix = getattr(importlib.import_module(module), name).split('{', 1)[0]
+            session.mount(prefix, _RedirectingAdapter(
+                session.get_adapter(prefix), prefix,
+                self.url + path.split('{', 1)[0]))
+
+
+class _RedirectingAdapter(BaseAdapter):
+    """Transport adapter sending requests to another URL prefix"""
+
+    def __init__(self, adapter, prefix, target):
+        """Create adapter
+
+        Args:
+            adapter: adapter sending the redirected requests
+            prefix:  URL prefix of the requests
+            target:  URL prefix replacing it
+        """
+        super().__init__()
+        self.adapter = adapter
+        self.prefix = prefix
+        self.target = target
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send a request to the target, the response keeps the requested URL"""
+        url = request.url
+        request.url = self.target + url[len(self.prefix):]
+        try:
+            response = self.adapter.send(request, **kwargs)
+        finally:
+            request.url = url
+        response.url = url
+        return response
+
+    def close(self):
+        """The wrapped adapter is closed with its session"""
+
+
+def _start_patches(url):
+    """Point the endpoint URLs of all libfulltext modules to a mock server
+
+    Returns:
+        list of the started patches
+    """
+    patches = [mock.patch(target, url + path) for target, path in ENDPOINTS]
+    for patch in patches:
+        patch.start()
+    return patches
+
+
+def _serve(args, connection):
+    """Run a mock server until the process is terminated
+
+    Args:
+        args:       arguments of MockServer
+        connection: connection to which the server address is sent
+    """
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _MockRequestHandler)
+    server.mock = MockServer(*args)
+    connection.send(server.server_address)
+    connection.close()
+    server.serve_forever()
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """HTTP server handling each request in a separate thread"""
+    daemon_threads = True
+
+
+class _MockRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler dispatching to the emulated services"""
+
+    # Keep connections alive like the real services do
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer a GET request"""
+        mock_server = self.server.mock
+        mock_server.requests.append(self.path)
+        mock_server.methods.append(self.command)
+        mock_server.connections.add(self.client_address)
+        if mock_server.latency:
+            time.sleep(mock_server.latency)
+
+        if mock_server.throttle > 0:
+            mock_server.throttle -= 1
+            self._send(429, 'text/plain', b'Too Many Requests', {'Retry-After': '0'})
+            return
+
+        url = urlsplit(self.path)
+        service, _, doi = unquote(url.path).lstrip('/').partition('/')
+        if service in mock_server.buckets:
+            query = parse_qs(url.query, keep_blank_values=True)
+            self._answer_s3(mock_server.buckets[service], doi, query)
+            return
+        if service == 'crossref' and doi == 'v1/works':
+            self._send_works_query(parse_qs(url.query))
+            return
+        if service == 'crossref':
+            doi = doi[len('v1/works/'):]
+        elif service == 'springer' and doi.endswith('.pdf'):
+            doi = doi[:-len('.pdf')]
+        document = mock_server.documents.get(doi.lower())
+
+        if service == 'doiRA':
+            if document is None:
+                self._send_json([{'DOI': doi, 'status': 'DOI does not exist'}])
+            else:
+                self._send_json([{'DOI': doi, 'RA': document.registration_agency}])
+        elif service == 'crossref' and document is not None:
+            self._send_json({'status': 'ok', 'message': {
+                'DOI': doi, 'member': document.member, 'publisher': 'Mock Publisher'
+            }})
+        elif service in PUBLISHER_MEMBERS and mock_server.error_rate \
+                and mock_server.random.random() < mock_server.error_rate:
+            self._send(500, 'text/plain', b'Internal Server Error')
+        elif service in PUBLISHER_MEMBERS and document is not None \
+                and document.member == PUBLISHER_MEMBERS[service] \
+                and document.content is not None:
+            self._send_fulltext(service, document.content)
+        else:
+            self._send(404, 'text/plain', b'Not Found')
+
+    # Requests to the emulated S3 buckets are dispatched by do_GET
+    do_HEAD = do_PUT = do_POST = do_DELETE = do_GET
+
+    def _answer_s3(self, bucket, key, query):
+        """Answer an S3 object or multipart upload request"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        uploads = self.server.mock.uploads
+        if self.command == 'POST' and 'uploads' in query:
+            upload_id = str(len(self.server.mock.requests))
+            uploads[upload_id] = {}
+            self._send(200, 'application/xml', (
+                '<InitiateMultipartUploadResult><Key>{0}</Key>'
+                '<UploadId>{1}</UploadId></InitiateMultipartUploadResult>'
+            ).format(key, upload_id).encode())
+        elif self.command == 'PUT' and 'uploadId' in query:
+            uploads[query['uploadId'][0]][int(query['partNumber'][0])] = body
+            self.server.mock.part_sizes.append(len(body))
+            self._send(200, 'text/plain', b'',
+                       {'ETag': '"{0}"'.format(hashlib.md5(body).hexdigest())})
+        elif self.command == 'POST' and 'uploadId' in query:
+            parts = uploads.pop(query['uploadId'][0])
+            bucket[key] = b''.join(parts[number] for number in sorted(parts))
+            self._send(200, 'application/xml', (
+                '<CompleteMultipartUploadResult><Key>{0}</Key><ETag>"multipart"</ETag>'
+                '</CompleteMultipartUploadResult>'
+            ).format(key).encode())
+        elif self.command == 'DELETE' and 'uploadId' in query:
+            uploads.pop(query['uploadId'][0])
+            self._send(204, 'text/plain', b'')
+        elif self.command == 'PUT':
+            bucket[key] = body
+            self._send(200, 'text/plain', b'',
+                       {'ETag': '"{0}"'.format(hashlib.md5(body).hexdigest())})
+        elif key in bucket:
+            self._send(200, 'application/octet-stream', bucket[key])
+        else:
+            self._send(404, 'application/xml', b'<Error><Code>NoSuchKey</Code></Error>')
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Do not log requests to stderr"""
+
+    def _send_fulltext(self, service, content):
+        """Send a fulltext, honouring conditional and range requests"""
+        headers = {'ETag': '"{0}"'.format(hashlib.sha1(content).hexdigest()),
+                   'Accept-Ranges': 'bytes'}
+        if self.server.mock.gzip:
+            content = gzip.compress(content)
+            headers['Content-Encoding'] = 'gzip'
+        if service == 'elsevier':
+            headers['X-ELS-Status'] = 'OK'
+        if self.headers.get('If-None-Match') == headers['ETag']:
+            self._send(304, None, b'', headers)
+            return
+
+        status, offset = 200, 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match is not None and self.headers.get('If-Range', headers['ETag']) \
+                == headers['ETag'] and int(match.group(1)) < len(content):
+            status, offset = 206, int(match.group(1))
+            headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(
+                offset, len(content) - 1, len(content))
+
+        mock_server = self.server.mock
+        if mock_server.truncate > 0:
+            mock_server.truncate -= 1
+            self.close_connection = True
+            self._send(status, 'application/pdf', content[offset:], headers,
+                       length=(len(content) - offset) // 2)
+        else:
+            self._send(status, 'application/pdf', content[offset:], headers)
+
+    def _send_works_query(self, query):
+        """Answer a CrossRef works query filtered by DOIs"""
+        dois = [value[len('doi:'):] for value in query['filter'][0].split(',')
+                if value.startswith('doi:')]
+        documents = {doi: self.server.mock.documents.get(doi.lower()) for doi in dois}
+        items = [{'DOI': doi, 'member': document.member, 'publisher': 'Mock Publisher'}
+                 for doi, document in documents.items()
+                 if document is not None and document.registration_agency == 'Crossref']
+        self._send_json({'status': 'ok', 'message': {
+            'total-results': len(items), 'items': items
+        }})
+
+    def _send_json(self, data):
+        """Send a JSON response"""
+        self._send(200, 'application/json', json.dumps(data).encode())
+
+    def _send(self, status, content_type, body, headers=None, length=None):
+        """Send a response (without body and Content-Type for 304, without
+        body for HEAD requests)
+
+        Only the first length bytes of the body are sent if length is given,
+        although Content-Length announces the complete body.
+        """
+        self.server.mock.statuses.append(status)
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body[:length])
@@ -0,0 +1,86 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Prefix table module
+
+Generates libfulltext/doi/crossref/prefix_table.py, the DOI prefixes of
+the CrossRef members, from the tab-separated table
+doi2test/DOI-info_publisher_CRmemberID_prefixes.txt (with the columns
+publisher_name, crossref_memberID and crossref_prefixes), see
+bin/generate_prefix_table.py.
+"""
+
+import collections
+import os
+import re
+import textwrap
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Source table and generated module
+PREFIX_TABLE_PATH = os.path.join(_ROOT, 'doi2test',
+                                 'DOI-info_publisher_CRmemberID_prefixes.txt')
+PREFIX_MODULE_PATH = os.path.join(_ROOT, 'libfulltext', 'doi', 'crossref',
+                                  'prefix_table.py')
+
+# A CrossRef member in the prefix table
+#   member:    CrossRef member ID
+#   name:      name of the member
+#   prefixes:  tuple of the DOI prefixes registered by the member
+CrossrefMember = collections.namedtuple('CrossrefMember',
+                                        ['member', 'name', 'prefixes'])
+
+_MODULE_HEADER = '''\
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""DOI prefixes of CrossRef members
+
+Generated from doi2test/DOI-info_publisher_CRmemberID_prefixes.txt by
+bin/generate_prefix_table.py, do not edit.
+"""
+'''
+
+
+def read_prefix_table(path=PREFIX_TABLE_PATH):
+    """Read the CrossRef members from the prefix table
+
+    The prefixes of a member are separated by commas and/or whitespace.
+
+    Args:
+        path: tab-separated prefix table
+
+    Returns:
+        list of CrossrefMember in the order of the table
+    """
+    with open(path, encoding='utf-8') as table:
+        lines = [line.rstrip('\n') for line in table if line.strip()]
+
+    members = []
+    for line in lines[1:]:  # The first line holds the column names
+        name, member, prefixes = line.split('\t')
+        members.append(CrossrefMember(member.strip(), name.strip(),
+                                      tuple(re.split(r'[,\s]+', prefixes.strip()))))
+    return members
+
+
+def render_prefix_module(members):
+    """Render the source of the prefix table module
+
+    Args:
+        members: list of CrossrefMember
+
+    Returns:
+        source code as string
+    """
+    lines = [_MODULE_HEADER, '# Names of the CrossRef members',
+             'CROSSREF_MEMBER_NAMES = {']
+    lines += ["    '{0}': '{1}',".format(member.member, member.name)
+              for member in members]
+    lines += ['}', '', '# DOI prefixes registered by the CrossRef members',
+              'CROSSREF_MEMBER_PREFIXES = {']
+    for member in members:
+        lines += ['    # {0}'.format(member.name), "    '{0}': (".format(member.member)]
+        lines += textwrap.wrap(' '.join("'{0}',".format(prefix)
+                                        for prefix in member.prefixes),
+                               width=90, initial_indent=' ' * 8,
+                               subsequent_indent=' ' * 8)
+        lines.append('    ),')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,50 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the benchmark module"""
+
+import os
+from unittest import TestCase
+
+from .benchmark import percentile, run_benchmark, run_startup_benchmark
+
+
+class BenchmarkTest(TestCase):
+    """Test run_benchmark"""
+
+    def test_run_benchmark(self):
+        """All retrievals of a batch are measured"""
+        result = run_benchmark(8, workers=4, latency=0.01, payload_size=4096)
+        self.assertEqual((result.dois, result.workers, result.failed), (8, 4, 0))
+        self.assertGreater(result.dois_per_second, 0)
+        self.assertGreaterEqual(result.p50, 0.01)
+        self.assertGreaterEqual(result.p99, result.p50)
+        self.assertGreater(result.peak_memory, 4096)
+
+    def test_errors(self):
+        """Failing fulltext requests are counted"""
+        self.assertEqual(run_benchmark(4, payload_size=4, error_rate=1).failed, 4)
+
+    def test_percentile(self):
+        """Percentiles are nearest-rank"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertIsNone(percentile([], 50))
+
+
+class StartupBenchmarkTest(TestCase):
+    """Test run_startup_benchmark"""
+
+    def test_run_startup_benchmark(self):
+        """All invocations are measured, with and without daemon"""
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'bin', 'get_fulltext.py')
+        results = run_startup_benchmark(script, runs=1)
+        self.assertEqual([result.case for result in results], [
+            'import libfulltext', '--help', '--list-handlers, cold config cache',
+            '--list-handlers, warm config cache', 'retrieve', 'retrieve with --connect',
+        ])
+        for result in results:
+            self.assertEqual(result.runs, 1)
+            self.assertGreater(result.p50, 0)
+            self.assertEqual(result.p99, result.p50)
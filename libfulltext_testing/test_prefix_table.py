@@ -0,0 +1,23 @@
+# copyright © 2017 the libfulltext authors (see AUTHORS.md and LICENSE)
+"""Unit tests for the prefix table module"""
+
+from unittest import TestCase
+
+from libfulltext.doi.crossref.prefixes import get_prefix_crossref_member
+
+from .prefix_table import PREFIX_MODULE_PATH, read_prefix_table, render_prefix_module
+
+
+class PrefixTableTest(TestCase):
+    """Test the generated prefix table"""
+
+    def test_up_to_date(self):
+        """The generated module matches the prefix table"""
+        with open(PREFIX_MODULE_PATH, encoding='utf-8') as module:
+            self.assertEqual(module.read(), render_prefix_module(read_prefix_table()),
+                             'run bin/generate_prefix_table.py')
+
+    def test_separators(self):
+        """Prefixes separated by whitespace only are split as well"""
+        self.assertEqual(get_prefix_crossref_member('10.4065/x'), '78')
+        self.assertEqual(get_prefix_crossref_member('10.7424/x'), '78')
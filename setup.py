@@ -14,5 +14,7 @@ setup(name='libfulltext',
       description='Tools for downloading fulltexts of open access articles',
       url='https://github.com/andrenarchy/libfulltext',
       install_requires=['PyYAML (>=3)', 'requests (>=2)', "click (>=5)"],
+      extras_require={'async': ['aiohttp (>=3)'], 'extract': ['pdfminer.six'],
+                      's3': ['boto3']},
       classifiers=[],
       )